@@ -883,6 +883,8 @@ class CacheCheck:
         self.memoized = {}
         self.kwd_mark = object()     # sentinel for separating args from kwargs
         self.log = logging.getLogger(__name__)
+        # incremented on every cache change, allows dependent caches to detect outdated results
+        self.generation = 0
 
     def __get__(self, instance, cls=None):
         self._instance = instance
@@ -906,6 +908,7 @@ class CacheCheck:
             return self.memoized[key]
 
     def cache_clear(self, key=None):
+        self.generation += 1
         if key is None:
             self.memoized = {}
             self.log.debug("clearing cache")
@@ -1096,6 +1099,31 @@ class ACLResolver(Plugin):
                     else:
                         self.log.error('too many retries to verify checks %s' % not_done)
 
+    def topic_uses_options(self, topic):
+        """
+        Check if any of the loaded ACL actions that match the given topic defines
+        options. If not, the options given to :meth:`check` cannot influence its
+        result for this topic and can be skipped.
+
+        ============== =============
+        Key            Description
+        ============== =============
+        topic          The topic string, e.g. 'org.gosa.factory'
+        ============== =============
+
+        ``Return``: True if options are relevant
+        """
+        with self.lock:
+            acls = [acl for acl_set in (self.acl_sets or []) for acl in acl_set]
+            acls += [acl for role in (self.acl_roles or {}).values() for acl in role]
+
+            for acl in acls:
+                for act in acl.actions:
+                    if act['options'] and re.match(act['topic'], topic):
+                        return True
+
+            return False
+
     @Command(__help__=N_("Checks if user has admin rights"))
     def isAdmin(self, user):
         if user in self.admins:
@@ -1420,65 +1448,97 @@ class ACLResolver(Plugin):
                     self.log.debug("ACL check override active for %s/%s/%s" % (user, base, str(topic)))
                     return True
 
-            # Load default base if needed
-            if not base:
-                base = self.base
+            return self.__resolve(user, [(topic, acls)], options, base)[(topic, acls)]
 
-            # Collect all acls matching the where statement
-            allowed = False
-            reset = False
+    def check_all(self, user, checks, base=None):
+        """
+        Check many permissions for a given user and a base at once. In contrast to
+        calling :meth:`check` for each permission, the ACLs are walked through only once.
 
-            self.log.debug("checking ACL for %s/%s/%s" % (user, base, str(topic)))
+        ============== =============
+        Key            Description
+        ============== =============
+        user           The user we want to check for.
+        checks         List of (topic, acls) tuples, e.g. [('org.gosa.factory', 'r'), ('org.gosa.factory', 'w')]
+        base           The base we want to check acls in.
+        ============== =============
 
-            # Remove the first part of the dn, until we reach the ldap base.
-            orig_loc = base
-            while self.base in base and len(base):
+        ``Return``: dict of (topic, acls): permission
+        """
+        with self.lock:
+            # Admin users are allowed to do anything.
+            if user is None or self.isAdmin(user):
+                self.log.debug("ACL check override active for %s/%s" % (user, base))
+                return dict([(check, True) for check in checks])
 
-                # Check acls for each acl set.
-                if not self.acl_sets:
-                    base = ','.join(ldap.dn.explode_dn(base)[1::])
-                    continue
+            return self.__resolve(user, checks, None, base)
 
-                for acl_set in self.acl_sets:
+    def __resolve(self, user, checks, options=None, base=None):
+        # Load default base if needed
+        if not base:
+            base = self.base
 
-                    # Skip acls that do not match the current ldap base.
-                    if base != acl_set.base:
-                        continue
+        # Collect all acls matching the where statement
+        allowed = dict([(check, False) for check in checks])
+        pending = set(allowed.keys())
+        reset = set()
 
-                    # Check ACls
-                    for acl in acl_set:
+        self.log.debug("checking ACL for %s/%s/%s" % (user, base, ", ".join([str(topic) for topic, acls in pending])))
 
-                        (match, scope) = acl.match(user, topic, acls, orig_loc, options)
-                        if match:
+        # Remove the first part of the dn, until we reach the ldap base.
+        orig_loc = base
+        while self.base in base and len(base) and len(pending):
 
-                            self.log.debug("found matching ACL in '%s'" % base)
-                            if scope == ACL.RESET:
-                                self.log.debug("found ACL reset for topic '%s'" % topic)
-                                reset = True
-                            else:
+            # Check acls for each acl set.
+            if not self.acl_sets:
+                base = ','.join(ldap.dn.explode_dn(base)[1::])
+                continue
+
+            for acl_set in self.acl_sets:
+
+                # Skip acls that do not match the current ldap base.
+                if base != acl_set.base:
+                    continue
 
-                                if scope == ACL.PSUB:
-                                    self.log.debug("found permanent ACL for topic '%s'" % topic)
-                                    return True
+                # Check ACls
+                for acl in acl_set:
 
-                                elif scope == ACL.SUB:
-                                    if not reset:
-                                        self.log.debug("found ACL for topic '%s' (SUB)" % topic)
-                                        return True
-                                    else:
-                                        self.log.debug("ACL DO NOT match due to reset. (SUB)")
+                    for check in list(pending):
+                        topic, acls = check
+                        (match, scope) = acl.match(user, topic, acls, orig_loc, options)
+                        if not match:
+                            continue
+
+                        self.log.debug("found matching ACL in '%s'" % base)
+                        if scope == ACL.RESET:
+                            self.log.debug("found ACL reset for topic '%s'" % topic)
+                            reset.add(check)
+
+                        elif scope == ACL.PSUB:
+                            self.log.debug("found permanent ACL for topic '%s'" % topic)
+                            allowed[check] = True
+
+                        elif scope == ACL.SUB:
+                            if check not in reset:
+                                self.log.debug("found ACL for topic '%s' (SUB)" % topic)
+                                allowed[check] = True
+                            else:
+                                self.log.debug("ACL DO NOT match due to reset. (SUB)")
+
+                        elif scope == ACL.ONE and orig_loc == acl_set.base:
+                            if check not in reset:
+                                self.log.debug("found ACL for topic '%s' (ONE)" % topic)
+                                allowed[check] = True
+                            else:
+                                self.log.debug("ACL DO NOT match due to reset. (ONE)")
 
-                                elif scope == ACL.ONE and orig_loc == acl_set.base:
-                                    if not reset:
-                                        self.log.debug("found ACL for topic '%s' (ONE)" % topic)
-                                        return True
-                                    else:
-                                        self.log.debug("ACL DO NOT match due to reset. (ONE)")
+                        if allowed[check]:
+                            pending.remove(check)
 
-                # Remove the first part of the dn
-                base = ','.join([d for d in ldap.dn.explode_dn(base.encode('utf-8'), flags=ldap.DN_FORMAT_LDAPV3)[1::]])
+            # Remove the first part of the dn
+            base = ','.join([d for d in ldap.dn.explode_dn(base.encode('utf-8'), flags=ldap.DN_FORMAT_LDAPV3)[1::]])
 
-            return allowed
+        return allowed
 
     def list_acls(self):
         """
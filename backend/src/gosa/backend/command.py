@@ -30,6 +30,7 @@ via the :meth:`gosa.backend.command.CommandRegistry.dispatch` method
 """
 import re
 import logging
+from collections import OrderedDict
 
 from lxml import objectify, etree
 
@@ -38,7 +39,7 @@ import gettext
 
 from gosa.common.components.mqtt_proxy import MQTTServiceProxy
 from pkg_resources import resource_filename #@UnresolvedImport
-from threading import Event
+from threading import Event, Lock
 from inspect import getmembers, ismethod, getfullargspec
 from zope.interface import implementer
 from gosa.common.components import PluginRegistry, Command, no_login_commands
@@ -89,6 +90,16 @@ class CommandRegistry(Plugin):
         self.log = logging.getLogger(__name__)
         self.log.info("initializing command registry")
 
+        # precompiled dispatch information per command
+        self.__dispatch_plans = {}
+
+        # (user, command) -> permission, valid for one ACL cache generation,
+        # the least recently used entries are dropped when the limit is reached
+        self.__permission_cache = OrderedDict()
+        self.__permission_cache_size = 10000
+        self.__permission_generation = None
+        self.__permission_lock = Lock()
+
     @Command(__help__=N_("Returns the LDAP base"), type="READONLY")
     def getBase(self):
         """
@@ -226,50 +237,105 @@ class CommandRegistry(Plugin):
         # Check if the command is available
         if func not in self.commands:
             if self.env.mode == "proxy":
-                # try to execute command on GOsa-backend
+                # try to execute command on GOsa-backend, which also checks the permissions
                 self.log.debug("forward '%s' execution to GOsa backend" % func)
+                return self.dispatchRemote(user, session_id, func, *arg, **larg)
             else:
                 raise CommandInvalid(C.make_error("COMMAND_NOT_DEFINED", method=func))
 
+        plan = self.__get_dispatch_plan(func)
+
         # Check for permission (if user equals 'self' then this is an internal call)
-        if user != self and func not in self.getNoLoginMethods():
-            chk_options = dict(zip(self.commands[func]['sig'], arg))
-            chk_options.update(larg)
-            acl = PluginRegistry.getInstance("ACLResolver")
-            if not acl.check(user, "%s.%s.%s" % (self.env.domain, "command", func), "x", options=chk_options):
+        if user != self and not plan['no_login']:
+            if not self.__check_permission(user, func, plan, arg, larg):
                 raise CommandNotAuthorized(C.make_error("PERMISSION_EXEC", method=func))
 
-        # Convert to list
-        arg = list(arg)
-        orig_arg = arg.copy()
+        if plan['execute_locally'] is False:
+            return self.dispatchRemote(user, session_id, func, *arg, **larg)
 
-        # Check if call is interested in calling user ID, prepend it
-        if self.callNeedsUser(func):
-            if user != self:
-                arg.insert(0, user)
-            else:
-                arg.insert(0, None)
+        # Check if call is interested in calling user/session ID, prepend it
+        if plan['needs_user'] or plan['needs_session']:
+            arg = list(arg)
+            if plan['needs_session']:
+                arg.insert(0, session_id if user != self else None)
+            if plan['needs_user']:
+                arg.insert(0, user if user != self else None)
 
-        # Check if call is interested in calling session ID, prepend it
-        if self.callNeedsSession(func):
-            index = 1 if self.callNeedsUser(func) else 0
-            if user != self:
-                arg.insert(index, session_id)
-            else:
-                arg.insert(index, None)
+        self.log.debug("executing '%s' locally" % func)
+        return plan['method'](*arg, **larg)
+
+    def __get_dispatch_plan(self, func):
+        """
+        Return the precompiled dispatch information for a command. Plans are
+        built once in :meth:`serve` and rebuilt if the plugin instance has
+        been replaced in the meantime.
+        """
+        plan = self.__dispatch_plans.get(func)
+        if plan is None or PluginRegistry.modules.get(plan['clazz']) is not plan['instance']:
+            plan = self.__compile_dispatch_plan(func)
+            self.__dispatch_plans[func] = plan
+        return plan
+
+    def __compile_dispatch_plan(self, func):
+        (clazz, method_name) = self.path2method(self.commands[func]['path'])
+        instance = PluginRegistry.modules[clazz]
+        method = instance.__getattribute__(method_name)
+
+        return {
+            'clazz': clazz,
+            'instance': instance,
+            'method': method,
+            'needs_user': getattr(method, "needsUser", False),
+            'needs_session': getattr(method, "needsSession", False),
+            'execute_locally': self.env.mode != "proxy" or getattr(method, "type", "READWRITE") != "READWRITE",
+            'no_login': func in no_login_commands,
+            'acl_topic': "%s.%s.%s" % (self.env.domain, "command", func),
+            'sig': self.commands[func]['sig'],
+            'uses_options': None
+        }
+
+    def __check_permission(self, user, func, plan, arg, larg):
+        """
+        Check the permission to execute a command. If no ACL defines options for the
+        command topic, the result only depends on the user and is cached per user until
+        the ACL resolvers cache changes.
+        """
+        acl = PluginRegistry.getInstance("ACLResolver")
+        generation = getattr(acl.check, "generation", None)
+        if not isinstance(generation, int):
+            # no cache information available, always ask the resolver
+            chk_options = dict(zip(plan['sig'], arg))
+            chk_options.update(larg)
+            return acl.check(user, plan['acl_topic'], "x", options=chk_options)
 
-        # Handle function type (additive, first match, regular)
-        (clazz, method) = self.path2method(self.commands[func]['path'])
+        with self.__permission_lock:
+            if generation != self.__permission_generation:
+                self.__permission_cache.clear()
+                for p in self.__dispatch_plans.values():
+                    p['uses_options'] = None
+                self.__permission_generation = generation
 
-        method = PluginRegistry.modules[clazz].__getattribute__(method)
-        execute_locally = self.env.mode != "proxy" or getattr(method, "type", "READWRITE") != "READWRITE"
+        if plan['uses_options'] is None:
+            plan['uses_options'] = acl.topic_uses_options(plan['acl_topic'])
 
-        if execute_locally is True:
-            self.log.debug("executing '%s' locally" % func)
-            return method(*arg, **larg)
-        else:
-            # remove attached user session_id again
-            return self.dispatchRemote(user, session_id, func, *orig_arg, **larg)
+        if plan['uses_options'] is True:
+            chk_options = dict(zip(plan['sig'], arg))
+            chk_options.update(larg)
+            return acl.check(user, plan['acl_topic'], "x", options=chk_options)
+
+        key = (user, func)
+        with self.__permission_lock:
+            if key in self.__permission_cache:
+                self.__permission_cache.move_to_end(key)
+                return self.__permission_cache[key]
+
+        permitted = acl.check(user, plan['acl_topic'], "x")
+        with self.__permission_lock:
+            if generation == self.__permission_generation:
+                self.__permission_cache[key] = permitted
+                if len(self.__permission_cache) > self.__permission_cache_size:
+                    self.__permission_cache.popitem(last=False)
+        return permitted
 
     def dispatchRemote(self, user, session_id, func, *arg, **larg):
         """
@@ -313,10 +379,7 @@ class CommandRegistry(Plugin):
         if not func in self.commands:
             raise CommandInvalid(C.make_error("COMMAND_NOT_DEFINED", method=func))
 
-        (clazz, method) = self.path2method(self.commands[func]['path'])
-
-        method = PluginRegistry.modules[clazz].__getattribute__(method)
-        return getattr(method, name, False)
+        return self.__get_dispatch_plan(func)[name]
 
     def callNeedsUser(self, func):
         """
@@ -330,7 +393,7 @@ class CommandRegistry(Plugin):
 
         ``Return:`` success or failure
         """
-        return self.__call_needs(func, "needsUser")
+        return self.__call_needs(func, "needs_user")
 
     def callNeedsSession(self, func):
         """
@@ -344,7 +407,7 @@ class CommandRegistry(Plugin):
 
         ``Return:`` success or failure
         """
-        return self.__call_needs(func, "needsSession")
+        return self.__call_needs(func, "needs_session")
 
     def __del__(self):
         self.log.debug("shutting down command registry")
@@ -381,6 +444,11 @@ class CommandRegistry(Plugin):
 
                     self.commands[func] = info
 
+        # compile the dispatch information once
+        self.__dispatch_plans = {}
+        for func in self.commands:
+            self.__dispatch_plans[func] = self.__compile_dispatch_plan(func)
+
     def init_backend_proxy(self, mqtt):
         if self.env.mode == "proxy":
             # initializing MQTTServiceProxy to GOsa backend
@@ -9,6 +9,7 @@
 
 import uuid
 import datetime
+from threading import RLock
 from types import FunctionType
 
 from gosa.backend.components.workflow import Workflow
@@ -64,14 +65,35 @@ class JSONRPCObjectMapper(Plugin):
     _priority_ = 70
     __stack = None
     __inactivity_timeout = 10  # Number of minutes after which the object close announcement is sent
+    __closed_refs_limit = 10000
 
     def __init__(self):
         self.env = Environment.getInstance()
         self.__stack = {}
 
+        # secondary indexes of the stack: key -> {ref: item}
+        self.__refs_by_dn = {}
+        self.__refs_by_oid = {}
+        self.__refs_by_uuid = {}
+        self.__refs_by_user = {}
+        # refs closed by this backend, no need to look them up in the DB again
+        self.__closed_refs = {}
+        self.__stack_lock = RLock()
+
+        # OpenObject property changes waiting to be written: ref -> operation
+        self.__db_pending = {}
+        self.__db_lock = RLock()
+        # serializes the DB writes, so that older changes can not overtake newer ones
+        self.__db_write_lock = RLock()
+        self.__db_flush_interval = self.env.config.getint("backend.open-object-flush-interval", default=2)
+
     def serve(self):
         sched = PluginRegistry.getInstance("SchedulerService").getScheduler()
         sched.add_interval_job(self.__gc, minutes=self.__inactivity_timeout, tag='_internal', jobstore="ram")
+        sched.add_interval_job(self.flush_open_objects, seconds=self.__db_flush_interval, tag='_internal', jobstore="ram")
+
+    def stop(self):
+        self.flush_open_objects()
 
     @Command(__help__=N_("List available object OIDs"))
     def listObjectOIDs(self):
@@ -100,10 +122,8 @@ class JSONRPCObjectMapper(Plugin):
         if not self.__check_user(ref, user):
             raise ValueError(C.make_error("NOT_OBJECT_OWNER"))
 
-        with make_session() as session:
-            session.query(OpenObject).filter(OpenObject.ref == ref).delete()
-
-        del self.__stack[ref]
+        self.__remove_from_stack(ref)
+        self.__write_db_now(ref, {'delete': True})
 
     @Command(needsUser=True, __help__=N_("Prevent an object from being automatically closed by an inactivity timeout"))
     def continueObjectEditing(self, user, ref):
@@ -126,10 +146,7 @@ class JSONRPCObjectMapper(Plugin):
             raise ValueError(C.make_error("NOT_OBJECT_OWNER"))
 
         objdsc['last_interaction'] = datetime.datetime.now()
-        with make_session() as session:
-            obj = session.query(OpenObject).filter(OpenObject.ref == ref).one()
-            obj.last_interaction = objdsc['last_interaction']
-            session.commit()
+        self.__queue_db_update(ref, last_interaction=objdsc['last_interaction'])
 
         if 'mark_for_deletion' in objdsc:
             # as this object has been marked for deletion, we have to run the garbage collection
@@ -155,10 +172,7 @@ class JSONRPCObjectMapper(Plugin):
             # update session-id, which might have changed and is needed to inform the user about object closing
             if objdsc['session_id'] != session_id:
                 objdsc['session_id'] = session_id
-                with make_session() as session:
-                    obj = session.query(OpenObject).filter(OpenObject.ref == ref).one()
-                    obj.session_id = session_id
-                    session.commit()
+                self.__write_db_now(ref, {'update': {'session_id': session_id}})
             return True
 
         return False
@@ -200,14 +214,7 @@ class JSONRPCObjectMapper(Plugin):
         setattr(objdsc['object']['object'], name, value)
 
         if skip_db_update is False:
-            with make_session() as session:
-                obj = session.query(OpenObject).filter(OpenObject.ref == ref).one()
-                obj.last_interaction = objdsc['last_interaction']
-                if obj.data is None:
-                    obj.data = {name: value}
-                else:
-                    obj.data[name] = value
-                session.commit()
+            self.__queue_db_update(ref, data={name: value}, last_interaction=objdsc['last_interaction'])
 
     @Command(needsUser=True, __help__=N_("Get property from object on stack"))
     def getObjectProperty(self, user, ref, name):
@@ -296,14 +303,10 @@ class JSONRPCObjectMapper(Plugin):
         returns a diff - if any.
         """
         if ref not in self.__stack:
-            found = False
-            for r in self.__stack:
-                if self.__stack[r]['object']['uuid'] == ref:
-                    ref = r
-                    found = True
-                    break
-            if not found:
+            refs = self.__refs_by_uuid.get(ref)
+            if not refs:
                 return None
+            ref = next(iter(refs))
 
         if not self.__check_user(ref, user):
             raise ValueError(C.make_error("NOT_OBJECT_OWNER"))
@@ -516,12 +519,12 @@ class JSONRPCObjectMapper(Plugin):
             'properties': properties
         }
 
-        self.__stack[ref] = {
+        self.__add_to_stack(ref, {
             'user': user,
             'session_id': session_id,
             'object': objdsc,
             'created': datetime.datetime.now() if db_object is None else db_object.created
-        }
+        })
 
         # Build property dict
         propvals = {}
@@ -535,34 +538,135 @@ class JSONRPCObjectMapper(Plugin):
         result.update(propvals)
 
         if db_object is None:
-            # store in DB
-            with make_session() as session:
-                oo = OpenObject(
-                    ref=ref,
-                    uuid=obj.uuid,
-                    oid=oid,
-                    user=user,
-                    session_id=session_id,
-                    backend_uuid=self.env.core_uuid,
-                    created=self.__stack[ref]["created"],
-                    last_interaction=self.__stack[ref]["created"]
-                )
-                session.add(oo)
-                session.commit()
+            # store in DB, this row locks the object for the other backends
+            self.__write_db_now(ref, {'insert': dict(
+                ref=ref,
+                uuid=obj.uuid,
+                oid=oid,
+                user=user,
+                session_id=session_id,
+                backend_uuid=self.env.core_uuid,
+                created=self.__stack[ref]["created"],
+                last_interaction=self.__stack[ref]["created"]
+            )})
         elif db_object.data is not None:
             # apply changes to opened object
             for prop, value in db_object.data.items():
                 self.setObjectProperty(user, ref, prop, value, skip_db_update=True)
 
-
         return result
 
     def __check_user(self, ref, user):
-        for ref, item in self.__stack.items():
-            if item['user'] == user:
-                return True
+        return ref in self.__refs_by_user.get(user, {})
+
+    def __add_to_stack(self, ref, item):
+        """ add an item to the stack and maintain the indexes """
+        objdsc = item['object']
+        with self.__stack_lock:
+            if ref in self.__stack:
+                self.__remove_from_stack(ref)
+            self.__stack[ref] = item
+            self.__closed_refs.pop(ref, None)
+            for index, key in [(self.__refs_by_dn, objdsc['dn']),
+                               (self.__refs_by_oid, objdsc['oid']),
+                               (self.__refs_by_uuid, objdsc['uuid']),
+                               (self.__refs_by_user, item['user'])]:
+                if key is not None:
+                    if key not in index:
+                        index[key] = {}
+                    index[key][ref] = item
+
+    def __remove_from_stack(self, ref):
+        """ remove an item from the stack and its indexes """
+        with self.__stack_lock:
+            item = self.__stack.pop(ref, None)
+            if item is None:
+                return None
 
-        return False
+            objdsc = item['object']
+            for index, key in [(self.__refs_by_dn, objdsc['dn']),
+                               (self.__refs_by_oid, objdsc['oid']),
+                               (self.__refs_by_uuid, objdsc['uuid']),
+                               (self.__refs_by_user, item['user'])]:
+                if key in index:
+                    index[key].pop(ref, None)
+                    if len(index[key]) == 0:
+                        del index[key]
+
+            self.__closed_refs[ref] = True
+            if len(self.__closed_refs) > self.__closed_refs_limit:
+                # forget the oldest entry
+                del self.__closed_refs[next(iter(self.__closed_refs))]
+            return item
+
+    def __write_db_now(self, ref, op):
+        """
+        Write a change of the OpenObject row immediately. Used for the changes of
+        the lock (creating, deleting the row and changing its owner), which must be
+        visible to the other backends without delay.
+        """
+        with self.__db_write_lock:
+            if 'delete' in op:
+                with self.__db_lock:
+                    self.__db_pending.pop(ref, None)
+            self.__write_db_pending({ref: op})
+
+    def __queue_db_update(self, ref, data=None, **values):
+        """ queue a change of the objects property data and interaction time """
+        with self.__db_lock:
+            op = self.__db_pending.setdefault(ref, {})
+            op.setdefault('update', {}).update(values)
+            if data is not None:
+                op.setdefault('data', {}).update(data)
+
+    def flush_open_objects(self):
+        """
+        Write the queued property changes of the open objects to the database. This
+        is called periodically and whenever the database needs to be up to date.
+        """
+        with self.__db_write_lock:
+            with self.__db_lock:
+                if len(self.__db_pending) == 0:
+                    return
+                pending = self.__db_pending
+                self.__db_pending = {}
+
+            try:
+                self.__write_db_pending(pending)
+            except Exception as e:
+                self.env.log.error("writing the changes of the open objects %s failed: %s" % (", ".join(pending), str(e)))
+                self.__requeue_db_pending(pending)
+                raise
+
+    def __requeue_db_pending(self, pending):
+        """ put the changes of a failed flush back in front of the ones queued since then """
+        with self.__db_lock:
+            newer = self.__db_pending
+            self.__db_pending = pending
+            for ref, op in newer.items():
+                self.__queue_db_update(ref, data=op.get('data'), **op.get('update', {}))
+
+    def __write_db_pending(self, pending):
+        with make_session() as session:
+            deleted = [ref for ref, op in pending.items() if 'delete' in op]
+            if len(deleted):
+                session.query(OpenObject).filter(OpenObject.ref.in_(deleted)).delete(synchronize_session=False)
+
+            updated = [ref for ref, op in pending.items() if 'update' in op or 'data' in op]
+            if len(updated):
+                for obj in session.query(OpenObject).filter(OpenObject.ref.in_(updated)).all():
+                    op = pending[obj.ref]
+                    for key, value in op.get('update', {}).items():
+                        setattr(obj, key, value)
+                    if 'data' in op:
+                        # assign a new dict, in-place changes of JSON columns are not tracked
+                        obj.data = dict(obj.data or {}, **op['data'])
+
+            for op in pending.values():
+                if 'insert' in op:
+                    session.add(OpenObject(**op['insert']))
+
+            session.commit()
 
     def __get_object_type(self, oid):
         if not oid in ObjectRegistry.objects:
@@ -588,8 +692,9 @@ class JSONRPCObjectMapper(Plugin):
     def __get_ref(self, ref):
         if ref in self.__stack:
             return self.__stack[ref]
-        else:
+        elif ref not in self.__closed_refs:
             # check DB
+            self.flush_open_objects()
             with make_session() as session:
                 obj = session.query(OpenObject).filter(OpenObject.ref == ref).one_or_none()
                 if obj is not None:
@@ -604,16 +709,12 @@ class JSONRPCObjectMapper(Plugin):
         return None
 
     def __is_locked(self, value):
-        for ref, item in self.__stack.items():
-            if item['object']['oid'] == value or item['object']['dn'] == value:
-                return True
-
-        return False
+        return self.__get_lock(value) is not None
 
     def __get_lock(self, value):
-        for ref, item in self.__stack.items():
-            if item['object']['oid'] == value or item['object']['dn'] == value:
-                return item
+        items = self.__refs_by_dn.get(value) or self.__refs_by_oid.get(value)
+        if items:
+            return next(iter(items.values()))
 
         return None
 
@@ -641,9 +742,8 @@ class JSONRPCObjectMapper(Plugin):
                             finally:
                                 del item['countdown_job']
 
-                        del self.__stack[ref]
-                        with make_session() as session:
-                            session.query(OpenObject).filter(OpenObject.ref == ref).delete()
+                        self.__remove_from_stack(ref)
+                        self.__write_db_now(ref, {'delete': True})
 
                         event = e.Event(
                             e.ObjectCloseAnnouncement(
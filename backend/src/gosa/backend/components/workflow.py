@@ -1,12 +1,15 @@
 import copy
 import gettext
+import hashlib
 import os
 import sys
 import logging
 
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from json import loads
-from threading import Thread
+from threading import Lock
+from types import CodeType
 
 import pkg_resources
 from tornado import gen
@@ -62,6 +65,11 @@ class Workflow:
     __method_map = None
     __attribute_type = None
 
+    # compiled workflow scripts: workflow id -> (source hash, code object, referenced names)
+    __script_cache = {}
+    __script_lock = Lock()
+    __script_executor = None
+
     def __init__(self, _id, what=None, user=None, session_id=None):
         schema = etree.XMLSchema(file=resource_filename("gosa.backend", "data/workflow.xsd"))
         parser = objectify.makeparser(schema=schema)
@@ -223,8 +231,46 @@ class Workflow:
     def commit(self):
         self.check()
         with open(os.path.join(self._path, self.uuid, "workflow.py"), "r") as fscr:
-            thread = Thread(target=self._execute_embedded_script, args=(fscr.read(), ))
-            thread.start()
+            script = fscr.read()
+
+        # run in the shared script worker pool to keep long running scripts away from the RPC threads
+        Workflow.get_script_executor().submit(self._execute_embedded_script, script)
+
+    @classmethod
+    def get_script_executor(cls):
+        """ Return the worker pool used to execute workflow scripts """
+        with cls.__script_lock:
+            if cls.__script_executor is None:
+                workers = Environment.getInstance().config.getint("core.workflow-script-workers", default=4)
+                cls.__script_executor = ThreadPoolExecutor(max_workers=workers)
+            return cls.__script_executor
+
+    @classmethod
+    def compile_script(cls, workflow_id, script):
+        """
+        Compile a workflow script once per workflow and script content.
+
+        ``Return``: tuple of the code object and the set of global names used by the script
+        """
+        script_hash = hashlib.sha1(script.encode('utf-8')).hexdigest()
+        with cls.__script_lock:
+            cached = cls.__script_cache.get(workflow_id)
+            if cached is not None and cached[0] == script_hash:
+                return cached[1], cached[2]
+
+        code = compile(script, "workflow-%s" % workflow_id, "exec")
+
+        # collect the names used by the script and its nested functions/classes
+        names = set()
+        codes = [code]
+        while codes:
+            current = codes.pop()
+            names.update(current.co_names)
+            codes.extend(c for c in current.co_consts if isinstance(c, CodeType))
+
+        with cls.__script_lock:
+            cls.__script_cache[workflow_id] = (script_hash, code, names)
+        return code, names
 
     def get_id(self):
         find = objectify.ObjectPath("Workflow.Id")
@@ -493,6 +539,7 @@ class Workflow:
         log = logging.getLogger("%s.%s" % (__name__, self.uuid))
         try:
             log.info("start executing workflow script")
+            code, names = Workflow.compile_script(self.uuid, script)
             env = dict(data=self._get_data())
             dispatcher = PluginRegistry.getInstance('CommandRegistry')
 
@@ -501,14 +548,15 @@ class Workflow:
                     return dispatcher.dispatch(self.__user, self.__session_id, method, *args, **kwargs)
                 return call
 
-            # Add public calls
-            for method in dispatcher.getMethods():
-                env[method] = make_dispatch(method)
+            # Add public calls - only the ones used by the script
+            for method in names:
+                if dispatcher.hasMethod(method):
+                    env[method] = make_dispatch(method)
 
             # add logger
             env['log'] = log
 
-            exec(script, env)
+            exec(code, env)
 
             log.info("finished executing workflow script")
 
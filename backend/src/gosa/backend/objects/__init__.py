@@ -981,6 +981,7 @@ __import__('pkg_resources').declare_namespace(__name__)
 from gosa.backend.objects.proxy import ObjectProxy, ProxyException
 from gosa.backend.objects.factory import ObjectFactory
 from gosa.backend.objects.object import ObjectException, ObjectChanged
+from gosa.backend.objects.snapshot import ObjectSnapshot
 
 SCOPE_BASE = 0
 SCOPE_ONE = 1
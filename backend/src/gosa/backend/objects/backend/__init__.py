@@ -104,6 +104,15 @@ class ObjectBackend(object):
         """
         raise NotImplementedError(C.make_error("NOT_IMPLEMENTED", uuid, method="update"))
 
+    def update_values(self, changes):  # pragma: nocover
+        """
+        Update attribute values of many entries without loading them.
+
+        ``changes`` is a dict {dn: {attribute: {'type': backend type, 'replace': list or None,
+        'remove': list, 'add': list}}}. Returns the list of DNs that could not be updated.
+        """
+        raise NotImplementedError(C.make_error("NOT_IMPLEMENTED", method="update_values"))
+
     def exists(self, misc, needed=None):  # pragma: nocover
         """
         Check if an object with the given UUID or DN exists.
@@ -9,10 +9,13 @@
 import datetime
 import json
 import threading
+import time
+from collections import OrderedDict, deque
 
 from threading import Thread
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 from gosa.backend.routes.sse.main import SseHandler
@@ -57,7 +60,8 @@ In this example the URL for HTTP-requests would be <foreman-host>/api/hosts/<cn>
 # Register the errors handled  by us
 C.register_codes(dict(
     FOREMAN_OBJECT_NOT_FOUND=N_("The requested foreman object does not exist: '%(topic)s'"),
-    FOREMAN_COMMUNICATION_ERROR=N_("Foreman communication error type: '%(topic)s'")
+    FOREMAN_COMMUNICATION_ERROR=N_("Foreman communication error type: '%(topic)s'"),
+    FOREMAN_WRITE_QUEUE_FULL=N_("Too many pending foreman changes, please try again later")
 ))
 
 
@@ -69,6 +73,7 @@ class Foreman(ObjectBackend):
         self.log = getLogger(__name__)
         self.client = ForemanClient()
         self.e = EventMaker()
+        self.queue = ForemanWriteQueue(self.__write)
 
     def load(self, uuid, info, back_attrs=None, data=None, needed=None):
         """
@@ -104,20 +109,28 @@ class Foreman(ObjectBackend):
         self.log.debug("exists: %s" % misc)
         return False
 
+    def __write(self, operation):
+        """ Send a queued operation to foreman, called by the :class:`ForemanWriteQueue` workers """
+        if operation.method == "delete":
+            self.client.delete(operation.object_type, operation.object_id)
+
+        elif operation.method == "post":
+            result = self.client.post(operation.object_type, data=operation.payload)
+            self.log.debug("Response: %s" % result)
+
+        else:
+            result = self.client.put(operation.object_type, operation.object_id, data=operation.payload)
+            self.log.debug("Response: %s" % result)
+            if operation.restart is True:
+                self.log.info("Restarting host to trigger the build")
+                self.client.put("hosts/%s" % operation.object_id, "power", {"power_action": "reset"})
+
     def remove(self, uuid, data, params, needed=None, user=None):
         self.log.debug("remove: %s, %s, %s" % (uuid, data, params))
 
-        def runner():
-            try:
-                self.client.delete(self.get_foreman_type(needed, params), uuid)
-            except ForemanBackendException as ex:
-                ForemanClient.error_notify_user(ex, user)
-                raise ex
-
         # some changes (e.g. creating a host) trigger requests from foreman to gosa
-        # so we need to run this request in a non blocking thread
-        thread = Thread(target=runner)
-        thread.start()
+        # so we need to send this request from the write queue without blocking
+        self.queue.put(ForemanWriteOperation("delete", self.get_foreman_type(needed, params), uuid, user=user))
 
         return True
 
@@ -140,18 +153,9 @@ class Foreman(ObjectBackend):
         # finally send the update to foreman
         self.log.debug("creating '%s' with '%s' to foreman" % (params["type"], payload))
 
-        def runner():
-            try:
-                result = self.client.post(object_type, data=payload)
-                self.log.debug("Response: %s" % result)
-            except ForemanBackendException as ex:
-                ForemanClient.error_notify_user(ex, user)
-                raise ex
-
         # some changes (e.g. creating a host) trigger requests from foreman to gosa
-        # so we need to run this request in a non blocking thread
-        thread = Thread(target=runner)
-        thread.start()
+        # so we need to send this request from the write queue without blocking
+        self.queue.put(ForemanWriteOperation("post", object_type, uuid, payload=payload, user=user))
 
         return None
 
@@ -183,21 +187,9 @@ class Foreman(ObjectBackend):
         # finally send the update to foreman
         self.log.debug("sending update '%s' to foreman" % payload)
 
-        def runner():
-            try:
-                result = self.client.put(object_type, uuid, data=payload)
-                self.log.debug("Response: %s" % result)
-                if restart is True:
-                    self.log.info("Restarting host to trigger the build")
-                    self.client.put("hosts/%s" % uuid, "power", {"power_action": "reset"})
-            except ForemanBackendException as ex:
-                ForemanClient.error_notify_user(ex, user)
-                raise ex
-
         # some changes (e.g. changing the hostgroup) trigger requests from foreman to gosa
-        # so we need to run this request in a non blocking thread
-        thread = Thread(target=runner)
-        thread.start()
+        # so we need to send this request from the write queue without blocking
+        self.queue.put(ForemanWriteOperation("put", object_type, uuid, payload=payload, restart=restart, user=user))
 
     def is_uniq(self, attr, value, at_type):
         self.log.debug("is_uniq: %s, %s, %s" % (attr, value, at_type))
@@ -240,68 +232,366 @@ class Foreman(ObjectBackend):
         return payload
 
 
+class ForemanWriteOperation(object):
+    """
+    A write request to the foreman API, that is processed by the :class:`ForemanWriteQueue`.
+
+    :param method: HTTP method (put, post, delete)
+    :param object_type: foreman type (e.g. hosts)
+    :param object_id: foreman id of the object
+    :param payload: data to send
+    :param restart: reset the host after the update has been sent
+    :param user: user that is notified about errors
+    """
+
+    def __init__(self, method, object_type, object_id, payload=None, restart=False, user=None):
+        self.method = method
+        self.object_type = object_type
+        self.object_id = object_id
+        self.payload = payload
+        self.restart = restart
+        self.user = user
+        self.queued = time.time()
+
+    @property
+    def key(self):
+        # discovered hosts become hosts, so their operations must be ordered together
+        return "hosts" if self.object_type == "discovered_hosts" else self.object_type, str(self.object_id)
+
+    def merge(self, other):
+        """
+        Merge a following update of the same object into this one.
+
+        :return: True if the operations have been merged
+        """
+        if self.method != "put" or other.method != "put" or self.object_type != other.object_type or \
+                self.payload is None or other.payload is None or self.payload.keys() != other.payload.keys():
+            return False
+
+        for name, values in other.payload.items():
+            self.payload[name].update(values)
+        self.restart = self.restart or other.restart
+        if other.user is not None:
+            self.user = other.user
+        return True
+
+
+class ForemanWriteQueue(object):
+    """
+    Sends the write operations of the foreman backend with a bounded number of
+    worker threads.
+
+    * Operations of the same object are sent in the order they have been queued, never in parallel.
+    * Consecutive updates of the same object, that have not been sent yet, are merged into one request.
+    * Requests that failed due to connection problems or server errors are retried with an exponential backoff.
+
+    Keys for configuration section **foreman**
+
+    +--------------------+------------+-------------------------------------------------------------+
+    + Key                | Format     +  Description                                                |
+    +====================+============+=============================================================+
+    + write-workers      | Integer    + Number of concurrent write requests (default: 4)            |
+    +--------------------+------------+-------------------------------------------------------------+
+    + write-queue-size   | Integer    + Maximum number of pending operations (default: 1000)        |
+    +--------------------+------------+-------------------------------------------------------------+
+    + write-queue-timeout| Integer    + Seconds to wait for a free slot when the queue is full      |
+    +--------------------+------------+-------------------------------------------------------------+
+    + write-retries      | Integer    + Number of retries for failed requests (default: 3)          |
+    +--------------------+------------+-------------------------------------------------------------+
+
+    :param handler: function that sends a :class:`ForemanWriteOperation`
+    """
+    retry_delay = 1
+
+    def __init__(self, handler):
+        self.env = Environment.getInstance()
+        self.log = getLogger(__name__)
+        self.__handler = handler
+        self.workers = self.env.config.getint("foreman.write-workers", default=4)
+        self.size = self.env.config.getint("foreman.write-queue-size", default=1000)
+        self.timeout = self.env.config.getint("foreman.write-queue-timeout", default=30)
+        self.retries = self.env.config.getint("foreman.write-retries", default=3)
+
+        self.__condition = threading.Condition()
+        # pending operations per object, objects that are ready to be processed and the ones that are processed
+        self.__pending = OrderedDict()
+        self.__ready = deque()
+        self.__active = set()
+        self.__depth = 0
+        self.__threads = []
+        self.__latencies = deque(maxlen=1000)
+        self.__stats = {'queued': 0, 'coalesced': 0, 'processed': 0, 'failed': 0, 'retried': 0, 'max_depth': 0}
+
+    def __start_workers(self):
+        while len(self.__threads) < self.workers:
+            thread = Thread(target=self.__work, name="ForemanWriteQueue-%s" % len(self.__threads))
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def put(self, operation):
+        """
+        Queue an operation, blocks if the queue is full.
+
+        :raises ForemanBackendException: if there is no free slot after ``foreman.write-queue-timeout`` seconds
+        """
+        key = operation.key
+        with self.__condition:
+            self.__start_workers()
+            self.__stats['queued'] += 1
+
+            pending = self.__pending.get(key)
+            if pending is not None and len(pending) and pending[-1].merge(operation):
+                self.__stats['coalesced'] += 1
+                return
+
+            if not self.__condition.wait_for(lambda: self.__depth < self.size, timeout=self.timeout):
+                self.log.error("foreman write queue is full, dropping %s request for %s/%s" %
+                               (operation.method, operation.object_type, operation.object_id))
+                raise ForemanWriteQueueFull()
+
+            if key not in self.__pending:
+                self.__pending[key] = deque()
+            self.__pending[key].append(operation)
+            self.__depth += 1
+            self.__stats['max_depth'] = max(self.__stats['max_depth'], self.__depth)
+            if key not in self.__active and key not in self.__ready:
+                self.__ready.append(key)
+            self.__condition.notify_all()
+
+    def __work(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: len(self.__ready))
+                key = self.__ready.popleft()
+                operation = self.__pending[key].popleft()
+                self.__active.add(key)
+
+            success = self.__send(operation)
+
+            with self.__condition:
+                self.__active.discard(key)
+                self.__depth -= 1
+                self.__latencies.append(time.time() - operation.queued)
+                self.__stats['processed' if success else 'failed'] += 1
+                if len(self.__pending[key]):
+                    self.__ready.append(key)
+                else:
+                    del self.__pending[key]
+                self.__condition.notify_all()
+
+    def __send(self, operation):
+        attempt = 0
+        while True:
+            try:
+                self.__handler(operation)
+                return True
+            except Exception as ex:
+                if attempt < self.retries and self.__is_temporary(ex):
+                    delay = self.retry_delay * 2 ** attempt
+                    attempt += 1
+                    with self.__condition:
+                        self.__stats['retried'] += 1
+                    self.log.warning("%s request for %s/%s failed (%s), retrying in %ss" %
+                                     (operation.method, operation.object_type, operation.object_id, str(ex), delay))
+                    time.sleep(delay)
+                    continue
+
+                self.log.error("%s request for %s/%s failed: %s" %
+                               (operation.method, operation.object_type, operation.object_id, str(ex)))
+                if isinstance(ex, ForemanBackendException):
+                    ForemanClient.error_notify_user(ex, operation.user)
+                return False
+
+    @staticmethod
+    def __is_temporary(ex):
+        if isinstance(ex, requests.exceptions.RequestException):
+            return True
+        return isinstance(ex, ForemanBackendException) and ex.response is not None and \
+            (ex.response.status_code >= 500 or ex.response.status_code == 429)
+
+    def join(self, timeout=None):
+        """
+        Wait until all queued operations have been sent.
+
+        :return: False if the timeout has been reached
+        """
+        with self.__condition:
+            return self.__condition.wait_for(lambda: self.__depth == 0, timeout=timeout)
+
+    def get_statistics(self):
+        """
+        ``Return``: dict with the current queue depth, counters and the 50th/90th/99th percentile
+        of the time (ms) between queueing and finishing the operations
+        """
+        with self.__condition:
+            res = dict(self.__stats)
+            res['depth'] = self.__depth
+            res['active'] = len(self.__active)
+            latencies = sorted(self.__latencies)
+
+        for percentile in [50, 90, 99]:
+            value = None
+            if len(latencies):
+                value = round(latencies[max(0, -(-percentile * len(latencies) // 100) - 1)] * 1000, 3)
+            res['latency_p%s' % percentile] = value
+        return res
+
+
 class ForemanClientCache(object):
-    __cache = {}
+    """
+    Size bounded LRU cache for the responses of foreman GET requests.
+
+    Writes to an object drop the cached responses of the object, its sub resources and the list it belongs to.
+
+    Keys for configuration section **foreman**
+
+    +--------------------+------------+-------------------------------------------------------------+
+    + Key                | Format     +  Description                                                |
+    +====================+============+=============================================================+
+    + cache-size         | Integer    + Maximum number of cached responses (default: 1000)          |
+    +--------------------+------------+-------------------------------------------------------------+
+    + cache-ttl          | Integer    + Lifetime of cached responses in seconds (default: 3600)     |
+    +--------------------+------------+-------------------------------------------------------------+
+    + cache-ttl-<type>   | Integer    + Lifetime for a foreman resource, e.g. ``cache-ttl-hosts``   |
+    +--------------------+------------+-------------------------------------------------------------+
+    """
+    __cache = OrderedDict()
+    __stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
     lock = threading.Lock()
 
+    @staticmethod
+    def __get_id(object_type, object_id=None):
+        cache_id = object_type
+        if object_id is not None:
+            cache_id += "/%s" % object_id
+        return cache_id
+
+    @staticmethod
+    def get_ttl(object_type):
+        config = Environment.getInstance().config
+        default = config.getint("foreman.cache-ttl", default=3600)
+        return config.getint("foreman.cache-ttl-%s" % object_type.split("/")[0], default=default)
+
     @classmethod
     def get_cache(cls, method_name, object_type, object_id=None):
         if method_name == "get":
-            cache_id = object_type
-            if object_id is not None:
-                cache_id += "/%s" % object_id
-            if cache_id in cls.__cache:
-                if cls.__cache[cache_id]["expires"] > datetime.datetime.now():
-                    return cls.__cache[cache_id]["data"]
-                else:
-                    with cls.lock:
+            cache_id = cls.__get_id(object_type, object_id)
+            with cls.lock:
+                entry = cls.__cache.get(cache_id)
+                if entry is not None:
+                    if entry["expires"] > datetime.datetime.now():
+                        cls.__cache.move_to_end(cache_id)
+                        cls.__stats['hits'] += 1
+                        return entry["data"]
+                    else:
                         del cls.__cache[cache_id]
+                cls.__stats['misses'] += 1
         return None
 
     @classmethod
     def add_to_cache(cls, method_name, object_type, response, object_id=None):
         if method_name == "get":
-            cache_id = object_type
-            if object_id is not None:
-                cache_id += "/%s" % object_id
+            ttl = cls.get_ttl(object_type)
+            if ttl <= 0:
+                return
+
+            cache_id = cls.__get_id(object_type, object_id)
+            size = Environment.getInstance().config.getint("foreman.cache-size", default=1000)
             with cls.lock:
                 cls.__cache[cache_id] = {
-                    "expires": datetime.datetime.now() + datetime.timedelta(hours=1),
+                    "expires": datetime.datetime.now() + datetime.timedelta(seconds=ttl),
                     "data": response
                 }
+                cls.__cache.move_to_end(cache_id)
+                while len(cls.__cache) > size:
+                    cls.__cache.popitem(last=False)
+                    cls.__stats['evictions'] += 1
 
     @classmethod
     def delete_cache(cls, object_type, object_id=None):
-        cache_id = object_type
-        if object_id is not None:
-            cache_id += "/%s" % object_id
-        if cache_id in cls.__cache:
-            with cls.lock:
-                del cls.__cache[cache_id]
+        """
+        Drop the cached responses of an object including its sub resources and the cached list
+        of the object type. Changes of a sub resource (e.g. ``hosts/<id>/parameters``) also drop
+        the object they belong to.
+        """
+        with cls.lock:
+            drop = [object_type]
+            parts = object_type.split("/")
+            if len(parts) > 1:
+                drop.append("/".join(parts[:2]))
+            if object_id is not None:
+                cache_id = cls.__get_id(object_type, object_id)
+                drop.extend([x for x in cls.__cache.keys() if x == cache_id or x.startswith(cache_id + "/")])
+
+            for cache_id in drop:
+                if cache_id in cls.__cache:
+                    del cls.__cache[cache_id]
+                    cls.__stats['invalidations'] += 1
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.__cache.clear()
+
+    @classmethod
+    def get_statistics(cls):
+        with cls.lock:
+            res = dict(cls.__stats)
+            res['size'] = len(cls.__cache)
+        return res
 
 
 class ForemanClient(object):
-    """Client for the Foreman REST-API v2"""
+    """
+    Client for the Foreman REST-API v2
+
+    All clients of a foreman host share one keep-alive HTTP session. The number of
+    pooled connections (and therefore of concurrent requests) is limited by
+    ``foreman.pool-size``.
+    """
     headers = {'Accept': 'version=2,application/json', 'Content-type': 'application/json'}
     __cookies = None
     __cache = {}
+    __sessions = {}
+    __sessions_lock = threading.Lock()
 
     def __init__(self, url=None):
         self.env = Environment.getInstance()
         self.log = logging.getLogger(__name__)
         self.foreman_host = self.env.config.get("foreman.host") if url is None else url
 
+    def __get_session(self):
+        with ForemanClient.__sessions_lock:
+            if self.foreman_host not in ForemanClient.__sessions:
+                pool_size = self.env.config.getint("foreman.pool-size", default=10)
+                session = requests.Session()
+                # block instead of opening additional connections, when all pooled ones are in use
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                ForemanClient.__sessions[self.foreman_host] = session
+            return ForemanClient.__sessions[self.foreman_host]
+
+    @classmethod
+    def close_sessions(cls):
+        with cls.__sessions_lock:
+            for session in cls.__sessions.values():
+                session.close()
+            cls.__sessions.clear()
+
     def __authenticate(self, method, url, kwargs):
         kwargs["auth"] = HTTPBasicAuth(self.env.config.get("foreman.user"), self.env.config.get("foreman.password"))
         response = method(url, **kwargs)
         self.__cookies = response.cookies
         return response
 
-    def __request(self, method_name, object_type, object_id=None, data=None):
+    def __request(self, method_name, object_type, object_id=None, data=None, params=None):
         if self.foreman_host is None:
             return {}
 
-        cached = ForemanClientCache.get_cache(method_name, object_type, object_id=object_id)
+        # paginated requests are not cached
+        cached = ForemanClientCache.get_cache(method_name, object_type, object_id=object_id) if params is None else None
         if cached is not None:
             self.log.debug("using cached response for %s request of %s" % (method_name, object_type))
             return cached
@@ -310,7 +600,7 @@ class ForemanClient(object):
         if object_id is not None:
             url += "/%s" % object_id
 
-        method = getattr(requests, method_name)
+        method = getattr(self.__get_session(), method_name)
         data = dumps(data) if data is not None else None
         self.log.debug("sending %s request with %s to %s" % (method_name, data, url))
         kwargs = {
@@ -320,6 +610,8 @@ class ForemanClient(object):
             "cookies": self.__cookies,
             "timeout": 30
         }
+        if params is not None:
+            kwargs["params"] = params
         try:
             if self.__cookies is None:
                 response = self.__authenticate(method, url, kwargs)
@@ -333,13 +625,17 @@ class ForemanClient(object):
             # try to re-authenticate session might be timed out
             response = self.__authenticate(method, url, kwargs)
 
+        if method_name != "get":
+            # the cached responses of the object are outdated now
+            ForemanClientCache.delete_cache(object_type, object_id=object_id)
+
         if response.ok:
             data = response.json()
             self.log.debug("response %s" % data)
             # check for error
             if "error" in data:
                 raise ForemanBackendException(response, method=method_name)
-            else:
+            elif params is None:
                 ForemanClientCache.add_to_cache(method_name, object_type, data, object_id=object_id)
             return data
         else:
@@ -357,6 +653,34 @@ class ForemanClient(object):
     def get(self, object_type, object_id=None):
         return self.__request("get", object_type, object_id=object_id)
 
+    def iter_results(self, object_type, per_page=None):
+        """
+        Iterate over the results of a foreman list request (e.g. all hosts).
+        The pages are requested lazily while iterating.
+
+        :param object_type: foreman type (e.g. hosts, hostgroups)
+        :param per_page: number of results requested per page (default: ``foreman.per-page``)
+        """
+        if per_page is None:
+            per_page = self.env.config.getint("foreman.per-page", default=100)
+
+        page = 1
+        while True:
+            data = self.__request("get", object_type, params={"page": page, "per_page": per_page})
+            results = data.get("results", [])
+            for entry in results:
+                yield entry
+
+            # foreman might limit the page size
+            page_size = int(data.get("per_page") or per_page)
+            if "subtotal" in data:
+                done = page * page_size >= int(data["subtotal"])
+            else:
+                done = len(results) < page_size
+            if done or not len(results):
+                break
+            page += 1
+
     def delete(self, object_type, object_id):
         return self.__request("delete", object_type, object_id=object_id)
 
@@ -416,3 +740,12 @@ class ForemanBackendException(ObjectException):
 
     def __str__(self):
         return self.message
+
+
+class ForemanWriteQueueFull(ForemanBackendException):
+
+    def __init__(self):
+        self.exception = None
+        self.response = None
+        self.method = ""
+        self.message = C.make_error('FOREMAN_WRITE_QUEUE_FULL')
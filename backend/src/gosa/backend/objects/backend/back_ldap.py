@@ -12,6 +12,7 @@ import ldap.dn
 import ldap.filter
 import time
 import datetime
+from collections import OrderedDict
 from itertools import permutations
 from logging import getLogger
 
@@ -389,6 +390,42 @@ class LDAP(ObjectBackend):
             self.log.debug("saving entry '%s'" % tdn)
             return con.modify_s(tdn, mod_attrs)
 
+    def update_values(self, changes):
+        failed = []
+        with self.lock, self.lh.get_handle() as con:
+
+            # Send all modifications before waiting for the results
+            pending = OrderedDict()
+            for dn, attributes in changes.items():
+                mod_attrs = []
+                for attr, entry in attributes.items():
+                    cnv = getattr(self, "_convert_to_%s" % entry['type'].lower())
+
+                    if entry['replace'] is not None:
+                        if len(entry['replace']):
+                            mod_attrs.append((ldap.MOD_REPLACE, attr, [cnv(x) for x in entry['replace']]))
+                        else:
+                            mod_attrs.append((ldap.MOD_DELETE, attr, None))
+                        continue
+
+                    if len(entry['remove']):
+                        mod_attrs.append((ldap.MOD_DELETE, attr, [cnv(x) for x in entry['remove']]))
+                    if len(entry['add']):
+                        mod_attrs.append((ldap.MOD_ADD, attr, [cnv(x) for x in entry['add']]))
+
+                if len(mod_attrs):
+                    self.log.debug("modifying entry '%s': %s" % (dn, mod_attrs))
+                    pending[con.modify(dn, mod_attrs)] = dn
+
+            for msgid, dn in pending.items():
+                try:
+                    con.result(msgid)
+                except ldap.LDAPError as e:
+                    self.log.warning("modification of entry '%s' failed: %s" % (dn, str(e)))
+                    failed.append(dn)
+
+        return failed
+
     def uuid2dn(self, uuid):
         # Get DN of entry
         with self.lock, self.lh.get_handle() as con:
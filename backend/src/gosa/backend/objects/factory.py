@@ -42,7 +42,9 @@ Here are some examples on how to instantiate on new object:
 >>> person.commit()
 
 """
+import copy
 import gettext
+import hashlib
 
 import pkg_resources
 import os
@@ -53,6 +55,7 @@ import ldap
 import html
 
 from gosa.backend.objects.xml_parsing import XmlParsing
+from gosa.backend.objects.filter import FilterChain
 from lxml import etree, objectify
 from gosa.common import Environment
 from gosa.common.components import PluginRegistry
@@ -111,7 +114,11 @@ class ObjectFactory(object):
     __attribute_type = {}
     __object_types = {}
     __xml_objects_combined = None
+    __xml_objects_combined_string = None
+    __xml_object_schema = None
     __class_names = []
+    __search_aids = {}
+    __schema_hash = None
 
     def __init__(self):
         self.env = Environment.getInstance()
@@ -148,9 +155,10 @@ class ObjectFactory(object):
             """ % {b'object_types': object_types},
             schema_doc)
 
-        schema_root = etree.XML(schema_doc)
-        schema = etree.XMLSchema(schema_root)
-        self.__parser = objectify.makeparser(schema=schema)
+        # The validating parser is only required if the object definitions are not in the schema cache
+        self.__schema_doc = schema_doc
+        self.__parser = None
+        self.__schema_cache = self.env.config.get("backend.schema-cache")
 
         self.log.info("object factory initialized")
 
@@ -179,10 +187,15 @@ class ObjectFactory(object):
     def getObjectMethods(self, name):
         return list(getattr(self.__get_class(name), "__methods").keys())
 
-    def getXMLDefinitionsCombined(self):
+    def getXMLDefinitionsCombined(self, asString=False):
         """
         Returns a complete XML of all defined objects.
         """
+        if asString:
+            if self.__xml_objects_combined_string is None:
+                self.__xml_objects_combined_string = etree.tostring(self.__xml_objects_combined)
+            return self.__xml_objects_combined_string
+
         return self.__xml_objects_combined
 
     def getIndexedAttributes(self):
@@ -278,6 +291,12 @@ class ObjectFactory(object):
         if not objectType in self.__xml_defs:
             raise KeyError(C.make_error("OBJECT_TYPE_NOT_FOUND", type=objectType))
 
+        if objectType not in self.__search_aids:
+            self.__search_aids[objectType] = self.__build_search_aid(objectType)
+
+        return copy.deepcopy(self.__search_aids[objectType])
+
+    def __build_search_aid(self, objectType):
         res = {}
         find = objectify.ObjectPath("Object.Find.Aspect")
         if find.hasattr(self.__xml_defs[objectType]):
@@ -800,21 +819,96 @@ class ObjectFactory(object):
             xstr += "<Path>%s</Path>" % path
         xstr += "</Paths>"
 
+        combine_xsl = pkg_resources.resource_filename('gosa.backend', 'data/combine_objects.xsl') #@UndefinedVariable
+        object_schema_xsl = pkg_resources.resource_filename('gosa.backend', 'data/xml_object_schema.xsl') #@UndefinedVariable
+        self.__schema_hash = self.__get_schema_hash(schema_paths + [combine_xsl, object_schema_xsl])
+        self.__xml_objects_combined_string = None
+        self.__xml_object_schema = None
+        self.__search_aids.clear()
+
+        # Definitions in the schema cache have already been validated
+        combined = self.__read_schema_cache("objects")
+        if combined is not None:
+            self.log.info("loading object definitions from schema cache")
+            self.__xml_objects_combined = etree.ElementTree(etree.fromstring(combined))
+            self.__parse_schema(combined, validate=False)
+            return
+
         # Now combine all files into one single xml construct
         xml_doc = etree.parse(StringIO(xstr))
-        xslt_doc = etree.parse(pkg_resources.resource_filename('gosa.backend', 'data/combine_objects.xsl')) #@UndefinedVariable
+        xslt_doc = etree.parse(combine_xsl)
         transform = etree.XSLT(xslt_doc)
         self.__xml_objects_combined = transform(xml_doc)
-        self.__parse_schema(etree.tostring(self.__xml_objects_combined))
+        combined = etree.tostring(self.__xml_objects_combined)
+        self.__parse_schema(combined)
+        self.__write_schema_cache("objects", combined)
+
+    def __get_schema_hash(self, paths):
+        """
+        Hash of everything the parsed object definitions depend on: the definition files,
+        the XSLT/XSD files and the available attribute types.
+        """
+        checksum = hashlib.sha256()
+        checksum.update(self.__schema_doc)
+        for path in paths:
+            checksum.update(path.encode('utf-8'))
+            with open(path, 'rb') as f:
+                checksum.update(f.read())
+        return checksum.hexdigest()
+
+    def __get_schema_cache_file(self, name):
+        return os.path.join(self.__schema_cache, "%s-%s.xml" % (name, self.__schema_hash))
 
-    def __parse_schema(self, schema):
+    def __read_schema_cache(self, name):
+        if not self.__schema_cache:
+            return None
+
+        path = self.__get_schema_cache_file(name)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            self.log.warning("cannot read schema cache file %s: %s" % (path, str(e)))
+            return None
+
+    def __write_schema_cache(self, name, data):
+        if not self.__schema_cache:
+            return
+
+        path = self.__get_schema_cache_file(name)
+        try:
+            os.makedirs(self.__schema_cache, exist_ok=True)
+
+            # remove outdated versions
+            for f in os.listdir(self.__schema_cache):
+                if f.startswith("%s-" % name) and f.endswith(os.extsep + 'xml'):
+                    os.remove(os.path.join(self.__schema_cache, f))
+
+            tmp_path = "%s.tmp" % path
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.log.warning("cannot write schema cache file %s: %s" % (path, str(e)))
+
+    def __get_parser(self):
+        if self.__parser is None:
+            schema_root = etree.XML(self.__schema_doc)
+            schema = etree.XMLSchema(schema_root)
+            self.__parser = objectify.makeparser(schema=schema)
+        return self.__parser
+
+    def __parse_schema(self, schema, validate=True):
         """
         Parses a schema definition
         :meth:`gosa.backend.objects.factory.ObjectFactory.__parser`
         method.
         """
         try:
-            xml = objectify.fromstring(schema, self.__parser)
+            xml = objectify.fromstring(schema, self.__get_parser() if validate else None)
             find = objectify.ObjectPath("Objects.Object")
             if find.hasattr(xml):
                 for attr in find(xml):
@@ -967,13 +1061,13 @@ class ObjectFactory(object):
                         for entry in  prop['OutFilter'].iterchildren():
                             self.log.debug(" appending out-filter")
                             of = self.__xml_parsing.handleFilterChain(entry)
-                            out_f.append(of)
+                            out_f.append(FilterChain(of))
 
                     # Do we have a input filter definition?
                     if "InFilter" in prop.__dict__:
                         for entry in  prop['InFilter'].iterchildren():
                             self.log.debug(" appending in-filter")
-                            in_f.append(self.__xml_parsing.handleFilterChain(entry))
+                            in_f.append(FilterChain(self.__xml_parsing.handleFilterChain(entry)))
 
                     # Read and build up validators
                     if "Validators" in prop.__dict__:
@@ -1294,14 +1388,21 @@ class ObjectFactory(object):
         Returns a xml-schema definition that can be used to validate the
         xml-objects returned by 'asXML()'
         """
-        # Transform xml-combination into a useable xml-class representation
-        xmldefs = self.getXMLDefinitionsCombined()
-        xslt_doc = etree.parse(pkg_resources.resource_filename('gosa.backend', 'data/xml_object_schema.xsl')) #@UndefinedVariable
-        transform = etree.XSLT(xslt_doc)
+        if self.__xml_object_schema is None:
+            data = self.__read_schema_cache("object-schema")
+            if data is None:
+                # Transform xml-combination into a useable xml-class representation
+                xmldefs = self.getXMLDefinitionsCombined()
+                xslt_doc = etree.parse(pkg_resources.resource_filename('gosa.backend', 'data/xml_object_schema.xsl')) #@UndefinedVariable
+                transform = etree.XSLT(xslt_doc)
+                data = etree.tostring(transform(xmldefs))
+                self.__write_schema_cache("object-schema", data)
+            self.__xml_object_schema = data
+
         if not asString:
-            return transform(xmldefs)
+            return etree.ElementTree(etree.fromstring(self.__xml_object_schema))
         else:
-            return etree.tostring(transform(xmldefs))
+            return self.__xml_object_schema
 
     def getNamedI18N(self, templates, language=None):
         if not language:
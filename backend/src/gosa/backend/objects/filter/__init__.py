@@ -8,9 +8,12 @@
 # See the LICENSE file in the project's top-level directory for details.
 
 __import__('pkg_resources').declare_namespace(__name__)
+import logging
+import re
 import pkg_resources
 from gosa.common.utils import N_
 from gosa.common.error import GosaErrorHandler as C
+from gosa.backend.exceptions import ObjectException
 
 
 C.register_codes(dict(
@@ -46,3 +49,167 @@ class ElementFilter(object):
         Do not make copies of ourselves.
         """
         return self
+
+
+class FilterChain(dict):
+    """
+    A filter process list (see :meth:`gosa.backend.objects.xml_parsing.XmlParsing.build_filter`)
+    compiled into a list of steps.
+
+    The filter, condition and operator instances are bound to the steps and the
+    parameters containing placeholders are detected once, so executing the chain
+    does not need to interpret the process list for every value.
+
+    The chain is still a dict of the process list lines to stay compatible with
+    code inspecting the process list.
+    """
+    FILTER, CONDITION, JUMP, CONDITIONAL_JUMP, OPERATOR = range(5)
+    __placeholder = re.compile(r"%\(([^)]+)\)")
+
+    def __init__(self, process_list):
+        super(FilterChain, self).__init__(process_list)
+        self.__steps = []
+        self.__placeholders = set()
+
+        line = 1
+        while line in process_list:
+            entry = process_list[line]
+            line += 1
+
+            if 'filter' in entry:
+                self.__steps.append((FilterChain.FILTER, entry['filter'], type(entry['filter']).__name__) +
+                                    self.__compile_params(entry['params']))
+            elif 'condition' in entry:
+                self.__steps.append((FilterChain.CONDITION, entry['condition'], type(entry['condition']).__name__) +
+                                    self.__compile_params(entry['params']))
+            elif 'jump' in entry:
+                # process list lines start with 1, steps with 0
+                if entry['jump'] == 'conditional':
+                    self.__steps.append((FilterChain.CONDITIONAL_JUMP, entry['onTrue'] - 1, entry['onFalse'] - 1))
+                else:
+                    self.__steps.append((FilterChain.JUMP, entry['to'] - 1))
+            elif 'operator' in entry:
+                self.__steps.append((FilterChain.OPERATOR, entry['operator'], type(entry['operator']).__name__))
+            else:
+                self.__steps.append((None,))
+
+    def __compile_params(self, params):
+        """ returns the parameters and the indexes of the parameters that need placeholders to be filled in """
+        dynamic = []
+        for index, param in enumerate(params):
+            if isinstance(param, str) and "%" in param:
+                dynamic.append(index)
+                self.__placeholders.update(FilterChain.__placeholder.findall(param))
+        return params, tuple(dynamic)
+
+    def __get_placeholder_values(self, props):
+        res = {}
+        for name in self.__placeholders:
+            if name in props:
+                if props[name]['multivalue']:
+                    res[name] = props[name]['value']
+                elif props[name]['value'] and len(props[name]['value']):
+                    res[name] = props[name]['value'][0]
+                else:
+                    res[name] = None
+        return res
+
+    @staticmethod
+    def __fill_in(params, dynamic, values):
+        params = list(params)
+        for index in dynamic:
+            try:
+                params[index] = params[index] % values
+            except KeyError:
+                pass
+        return params
+
+    @staticmethod
+    def __check_result(props, keys, name):
+        # Check if the filter returned all expected property values.
+        for pk in keys:
+            if not all(k in props[pk] for k in ('backend', 'value', 'type')):
+                missing = ", ".join({'backend', 'value', 'type'} - set(props[pk].keys()))
+                raise ObjectException(C.make_error('FILTER_MISSING_KEY', key=missing, filter=name))
+
+            # Check if the returned value-type is list or None.
+            if type(props[pk]['value']) not in [list, type(None)]:
+                raise ObjectException(C.make_error('FILTER_NO_LIST', key=pk, filter=name, type=type(props[pk]['value'])))
+
+    def process(self, obj, key, props, log=None):
+        """
+        Execute the filter chain for the property ``key``.
+
+        :param obj: the object the properties belong to
+        :param key: name of the property the chain is defined for
+        :param props: all properties of the object
+        :param log: logger for debug output
+        :return: the processed properties
+        """
+        debug = log is not None and log.isEnabledFor(logging.DEBUG)
+        steps = self.__steps
+        values = self.__get_placeholder_values(props) if self.__placeholders else None
+        stack = []
+        last_filter = None
+        pos = 0
+
+        if debug:
+            log.debug(" -> FILTER STARTED (%s)" % key)
+
+        while pos < len(steps):
+            step = steps[pos]
+            kind = step[0]
+            pos += 1
+
+            if kind == FilterChain.FILTER:
+                params = FilterChain.__fill_in(step[3], step[4], values) if step[4] else step[3]
+                key, props = step[1].process(obj, key, props, *params)
+                last_filter = step[2]
+
+                # Ensure that the processed data is still valid.
+                # Filter may mess things up and then the next cannot process correctly.
+                if key not in props:
+                    raise ObjectException(C.make_error('FILTER_INVALID_KEY', key=key, filter=step[2]))
+                FilterChain.__check_result(props, [key], step[2])
+
+                if debug:
+                    log.debug("  %s: [Filter]  %s(%s) called " % (pos, step[2], ", ".join(["\"" + str(x) + "\"" for x in params])))
+
+            # A condition matches for something and returns a boolean value.
+            # We'll put this value on the stack for later use.
+            elif kind == FilterChain.CONDITION:
+                params = FilterChain.__fill_in(step[3], step[4], values) if step[4] else step[3]
+                stack.append(step[1].process(key, *params))
+
+                if debug:
+                    log.debug("  %s: [Condition] %s(%s) called " % (pos, step[2], ", ".join([str(x) for x in params])))
+
+            elif kind == FilterChain.CONDITIONAL_JUMP:
+                pos = step[1] if stack.pop() else step[2]
+
+                if debug:
+                    log.debug("  [Goto] %s ()" % pos)
+
+            elif kind == FilterChain.JUMP:
+                pos = step[1]
+
+                if debug:
+                    log.debug("  [Goto] %s ()" % pos)
+
+            # A comparator compares two values from the stack and then returns a single
+            #  boolean value.
+            elif kind == FilterChain.OPERATOR:
+                a = stack.pop()
+                b = stack.pop()
+                stack.append(step[1].process(a, b))
+
+                if debug:
+                    log.debug("  %s: [Condition] %s(%s, %s) called " % (pos, step[2], a, b))
+
+        # Filters may have touched other properties than the one they are defined for
+        if last_filter is not None:
+            FilterChain.__check_result(props, list(props.keys()), last_filter)
+
+        if debug:
+            log.debug(" <- FILTER ENDED")
+        return props
@@ -750,6 +750,26 @@ class ObjectIndex(Plugin):
             if hasattr(sys, '_called_from_test'):
                 self.post_process()
 
+    def get_foreign_backend_roots(self, dn, backend):
+        """
+        Find the objects stored in other backends than ``backend`` in the subtree of ``dn``.
+
+        :param dn: base DN of the subtree
+        :param backend: primary backend of the subtree
+        :return: dict with the topmost entry per foreign backend {backend: {'dn': ..., '_type': ...}}
+        """
+        roots = {}
+        with make_session() as session:
+            res = session.query(ObjectInfoIndex.dn, ObjectInfoIndex._type, ObjectInfoIndex._master_backend)\
+                .filter(or_(ObjectInfoIndex.dn == dn, ObjectInfoIndex.dn.like("%," + dn)))\
+                .filter(ObjectInfoIndex._master_backend != backend)\
+                .all()
+
+            for cdn, ctype, cbackend in res:
+                if cbackend not in roots or len(cdn) < len(roots[cbackend]['dn']):
+                    roots[cbackend] = {'dn': cdn, '_type': ctype}
+        return roots
+
     def get_last_modification(self, backend='LDAP'):
         with make_session() as session:
             res = session.query(ObjectInfoIndex._last_modified)\
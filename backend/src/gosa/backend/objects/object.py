@@ -26,7 +26,9 @@ import pkg_resources
 import os
 
 from collections import OrderedDict
+from collections.abc import MutableMapping
 from logging import getLogger
+from threading import RLock
 from zope.interface import Interface, implementer
 
 from gosa.backend.routes.sse.main import SseHandler
@@ -37,6 +39,8 @@ from gosa.common.utils import N_, is_uuid
 from gosa.common.components import PluginRegistry
 from gosa.common.error import GosaErrorHandler as C
 from gosa.backend.objects.backend.registry import ObjectBackendRegistry
+from gosa.backend.objects.filter import FilterChain
+from gosa.backend.objects.references import ReferenceUpdater
 from gosa.backend.exceptions import ObjectException, DNGeneratorError
 
 # Status
@@ -77,6 +81,169 @@ C.register_codes(dict(
 ))
 
 
+# Value types that can be shared between value lists without copying them
+IMMUTABLE_VALUE_TYPES = (str, bytes, int, float, bool, datetime.date, datetime.datetime, type(None))
+
+
+def copy_value(value):
+    """
+    Returns a copy of a property value list which is safe to keep as a snapshot
+    (e.g. the original value). Lists of immutable items only need a shallow copy,
+    everything else falls back to a deep copy.
+    """
+    if value is None:
+        return None
+    if all(isinstance(item, IMMUTABLE_VALUE_TYPES) for item in value):
+        return list(value)
+    return copy.deepcopy(value)
+
+
+class PropertyValues(MutableMapping):
+    """
+    Dictionary like container for the state of a single property of an object instance.
+
+    The static property definition (type, filters, validators, ...) is shared with the class
+    and all of its instances and is never modified. Keys written to an instance are
+    stored locally and shadow the shared definition.
+    """
+    __slots__ = ('_schema', '_local')
+
+    __removed = object()
+
+    def __init__(self, schema, local=None):
+        self._schema = schema
+        if local is None:
+            # values that are usually modified in place get their own copy
+            local = {
+                'value': [],
+                'in_value': [],
+                'backend': list(schema['backend']),
+            }
+        self._local = local
+
+    def __getitem__(self, key):
+        if key in self._local:
+            value = self._local[key]
+            if value is PropertyValues.__removed:
+                raise KeyError(key)
+            return value
+        return self._schema[key]
+
+    def __setitem__(self, key, value):
+        self._local[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._local[key] = PropertyValues.__removed
+
+    def __contains__(self, key):
+        if key in self._local:
+            return self._local[key] is not PropertyValues.__removed
+        return key in self._schema
+
+    def __iter__(self):
+        for key in self._schema:
+            if key in self:
+                yield key
+        for key in self._local:
+            if key not in self._schema and key in self:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __copy__(self):
+        return PropertyValues(self._schema, dict(self._local))
+
+    def __deepcopy__(self, memo):
+        local = copy.deepcopy(self._local, memo)
+        if 'values' not in local:
+            # the copied values may get modified (e.g. translated)
+            local['values'] = copy.deepcopy(self._schema['values'], memo)
+        res = PropertyValues(self._schema, local)
+        memo[id(self)] = res
+        return res
+
+
+class PopulateCache(object):
+    """
+    Caches the results of ``values_populate`` commands for all objects and users.
+
+    Entries expire after ``backend.populate-cache-ttl`` seconds, the TTL can be
+    adjusted per command in the ``[populate-cache]`` section (0 disables caching).
+    All entries are dropped when objects have been changed.
+    """
+    __cache = {}
+    __lock = RLock()
+    __subscribed = False
+
+    @staticmethod
+    def get_ttl(command):
+        config = Environment.getInstance().config
+        default = config.getint("backend.populate-cache-ttl", default=60)
+        return config.getint("populate-cache.%s" % command, default=default)
+
+    @staticmethod
+    def call(command, refresh=False):
+        """
+        Return the (cached) result of the populate command.
+
+        :param command: name of the populate command
+        :param refresh: skip the cached value and call the command
+        """
+        PopulateCache.__subscribe()
+        ttl = PopulateCache.get_ttl(command)
+
+        if ttl > 0 and refresh is False:
+            with PopulateCache.__lock:
+                if command in PopulateCache.__cache:
+                    expires, values = PopulateCache.__cache[command]
+                    if expires > time.time():
+                        return values
+
+        cr = PluginRegistry.getInstance('CommandRegistry')
+        values = cr.call(command)
+
+        if ttl > 0:
+            with PopulateCache.__lock:
+                PopulateCache.__cache[command] = (time.time() + ttl, values)
+        return values
+
+    @staticmethod
+    def clear(command=None):
+        with PopulateCache.__lock:
+            if command is None:
+                PopulateCache.__cache.clear()
+            elif command in PopulateCache.__cache:
+                del PopulateCache.__cache[command]
+
+    @staticmethod
+    def __subscribe():
+        if PopulateCache.__subscribed is False:
+            with PopulateCache.__lock:
+                if PopulateCache.__subscribed is False:
+                    zope.event.subscribers.append(PopulateCache.__handle_events)
+                    PopulateCache.__subscribed = True
+
+    @staticmethod
+    def __handle_events(event):
+        # populated values are mostly lists of other objects, so any change can affect them
+        if isinstance(event, ObjectChanged):
+            if event.reason.startswith("post "):
+                PopulateCache.clear()
+
+        elif isinstance(event, objectify.ObjectifiedElement):
+            if hasattr(event, "BackendChange"):
+                PopulateCache.clear()
+
+        elif event.__class__.__name__ == "IndexScanFinished":
+            PopulateCache.clear()
+
+
 class Object(object):
     """
     This class is the base class for all objects.
@@ -170,7 +337,9 @@ class Object(object):
         propsByBackend = OrderedDict()
         props = getattr(self, '__properties')
 
-        self.myProperties = copy.deepcopy(props)
+        # Only the instance specific parts of the properties are stored per object,
+        # the definitions are shared with the class.
+        self.myProperties = {key: PropertyValues(schema) for key, schema in props.items()}
         self.attributesInSaveOrder = self.__saveOrder()
 
         atypes = self._objectFactory.getAttributeTypes()
@@ -182,8 +351,7 @@ class Object(object):
                     self.myProperties[key]['values_populate'] and \
                     self.myProperties[key]['re_populate_on_update'] is False:
 
-                cr = PluginRegistry.getInstance('CommandRegistry')
-                values = cr.call(self.myProperties[key]['values_populate'])
+                values = PopulateCache.call(self.myProperties[key]['values_populate'])
                 if type(values).__name__ == "dict":
                     self.myProperties[key]['values'] = values
                 else:
@@ -268,12 +436,12 @@ class Object(object):
         for key in properties:
             if self.myProperties[key]['values_populate'] and \
                     (key == attribute or self.myProperties[key]['re_populate_on_update'] is True):
-                cr = PluginRegistry.getInstance('CommandRegistry')
-
                 if self.myProperties[key]['re_populate_on_update']:
+                    cr = PluginRegistry.getInstance('CommandRegistry')
                     values = cr.call(self.myProperties[key]['values_populate'], data)
                 else:
-                    values = cr.call(self.myProperties[key]['values_populate'])
+                    # explicitly requested update of this attribute
+                    values = PopulateCache.call(self.myProperties[key]['values_populate'], refresh=True)
 
                 if type(values).__name__ == "dict":
                     if self.myProperties[key]['values'] != values:
@@ -501,9 +669,9 @@ class Object(object):
 
             # Keep the initial value
             if keep is True:
-                self.myProperties[key]['last_value'] = self.myProperties[key]['orig_value'] = copy.deepcopy(self.myProperties[key]['value'])
+                self.myProperties[key]['last_value'] = self.myProperties[key]['orig_value'] = copy_value(self.myProperties[key]['value'])
             else:
-                self.myProperties[key]['last_value'] = copy.deepcopy(self.myProperties[key]['value'])
+                self.myProperties[key]['last_value'] = copy_value(self.myProperties[key]['value'])
 
     def inject_backend_data(self, data, force_update=False, raw=True):
         """
@@ -575,7 +743,7 @@ class Object(object):
             # If not already in removed state
             if len(self.myProperties[name]['value']) != 0:
                 self.myProperties[name]['status'] = STATUS_CHANGED
-                self.myProperties[name]['last_value'] = copy.deepcopy(self.myProperties[name]['value'])
+                self.myProperties[name]['last_value'] = self.myProperties[name]['value']
                 self.myProperties[name]['value'] = []
 
                 self.__update_population()
@@ -679,7 +847,7 @@ class Object(object):
             #    if not backendI.is_uniq(name, new_value):
             #        raise ObjectException(C.make_error('ATTRIBUTE_NOT_UNIQUE', name, value=value))
 
-            current = copy.deepcopy(self.myProperties[name]['value'])
+            current = copy_value(self.myProperties[name]['value'])
 
             # Assign the properties new value.
             self.myProperties[name]['value'] = new_value
@@ -1133,135 +1301,11 @@ class Object(object):
          run through the out-filter-process-list and thus will be transformed into a storable
          key, value pair.
         """
+        # Process lists are compiled by the ObjectFactory, compile the ones coming from elsewhere
+        if not isinstance(fltr, FilterChain):
+            fltr = FilterChain(fltr)
 
-        # Search for replaceable patterns in the process-list.
-        fltr = self.__fillInPlaceholders(fltr, prop)
-
-        # This is our process-line pointer it points to the process-list line
-        #  we're executing at the moment
-        lptr = 0
-
-        # Our filter result stack
-        stack = list()
-
-        # Log values
-        self.log.debug(" -> FILTER STARTED (%s)" % key)
-
-        # Process the list till we reach the end..
-        while (lptr + 1) in fltr:
-
-            # Get the current line and increase the process list pointer.
-            lptr += 1
-            curline = fltr[lptr]
-
-            # A filter is used to manipulate the 'value' or the 'key' or maybe both.
-            if 'filter' in curline:
-
-                # Build up argument list
-                args = [self, key, prop]
-                fname = type(curline['filter']).__name__
-                for entry in curline['params']:
-                    args.append(entry)
-
-                # Process filter and keep results
-                key, prop = (curline['filter']).process(*args)
-
-                # Ensure that the processed data is still valid.
-                # Filter may mess things up and then the next cannot process correctly.
-                if key not in prop:
-                    raise ObjectException(C.make_error('FILTER_INVALID_KEY',
-                        key=key, filter=fname))
-
-                # Check if the filter returned all expected property values.
-                for pk in prop:
-                    if not all(k in prop[pk] for k in ('backend', 'value', 'type')):
-                        missing = ", ".join({'backend', 'value', 'type'} - set(prop[pk].keys()))
-                        raise ObjectException(C.make_error('FILTER_MISSING_KEY', key=missing, filter=fname))
-
-                    # Check if the returned value-type is list or None.
-                    if type(prop[pk]['value']) not in [list, type(None)]:
-                        raise ObjectException(C.make_error('FILTER_NO_LIST',
-                            key=pk, filter=fname, type=type(prop[pk]['value'])))
-
-                self.log.debug("  %s: [Filter]  %s(%s) called " % (lptr, fname,
-                               ", ".join(["\"" + x + "\"" for x in curline['params']])))
-
-            # A condition matches for something and returns a boolean value.
-            # We'll put this value on the stack for later use.
-            elif 'condition' in curline:
-
-                # Build up argument list
-                args = [key] + curline['params']
-
-                # Process condition and keep results
-                stack.append((curline['condition']).process(*args))
-
-                fname = type(curline['condition']).__name__
-                self.log.debug("  %s: [Condition] %s(%s) called " % (lptr, fname, ", ".join(curline['params'])))
-
-            # Handle jump, for example if a condition has failed, jump over its filter-chain.
-            elif 'jump' in curline:
-
-                # Jump to <line> -1 because we will increase the line ptr later.
-                olptr = lptr
-                if curline['jump'] == 'conditional':
-                    if stack.pop():
-                        lptr = curline['onTrue'] - 1
-                    else:
-                        lptr = curline['onFalse'] - 1
-                else:
-                    lptr = curline['to'] - 1
-
-                self.log.debug("  %s: [Goto] %s ()" % (olptr, lptr))
-
-            # A comparator compares two values from the stack and then returns a single
-            #  boolean value.
-            elif 'operator' in curline:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append((curline['operator']).process(a, b))
-
-                fname = type(curline['operator']).__name__
-                self.log.debug("  %s: [Condition] %s(%s, %s) called " % (lptr, fname, a, b))
-
-            # Log current values
-            #self.log.debug("  result")
-            #for pkey in prop:
-            #    self.log.debug("   %s: %s" % (pkey, prop[pkey]['value']))
-
-        self.log.debug(" <- FILTER ENDED")
-        return prop
-
-    def __fillInPlaceholders(self, fltr, props):
-        """
-        This method fill in placeholder into in- and out-filters.
-        """
-
-        # Collect all property values
-        propList = {}
-        for key in props:
-            if props[key]['multivalue']:
-                propList[key] = props[key]['value']
-            else:
-                if props[key]['value'] and len(props[key]['value']):
-                    propList[key] = props[key]['value'][0]
-                else:
-                    propList[key] = None
-
-        # An inline function which replaces format string tokens
-        def _placeHolder(x):
-            try:
-                x = x % propList
-            except KeyError:
-                pass
-
-            return x
-
-        # Walk trough each line of the process list an replace placeholders.
-        for line in fltr:
-            if 'params' in fltr[line]:
-                fltr[line]['params'] = list(map(_placeHolder, fltr[line]['params']))
-        return fltr
+        return fltr.process(self, key, prop, self.log)
 
     def get_object_type_by_dn(self, dn):
         """
@@ -1309,6 +1353,11 @@ class Object(object):
         return res
 
     def update_refs(self, data):
+        # Plain value replacements are collected and written in bulk, everything else
+        # (and what cannot be written in bulk) is done by opening the referencing objects.
+        updater = ReferenceUpdater()
+        queued = {}
+
         for ref_attr, self_attr, value, refs, multivalue, mode, pattern in self.get_references(): #@UnusedVariable
 
             for ref in refs:
@@ -1318,100 +1367,136 @@ class Object(object):
                 if not self_attr in data:
                     continue
 
-                if mode == "inline" and multivalue is True:
-                    self.log.error("cannot replace multivalue attribute references inline")
-                    continue
+                if mode == "replace":
+                    o_value = data[self_attr]['orig']
+                    for o in (o_value if type(o_value) == list else [o_value]):
+                        updater.remove_value(ref, ref_attr, o)
+                    for n in (data[self_attr]['value'] if multivalue else data[self_attr]['value'][:1]):
+                        updater.add_value(ref, ref_attr, n)
+
+                    if (ref, ref_attr) not in queued:
+                        queued[(ref, ref_attr)] = []
+                    queued[(ref, ref_attr)].append((self_attr, multivalue, mode, pattern))
+                else:
+                    self.__update_ref(data, ref, ref_attr, self_attr, multivalue, mode, pattern)
 
-                # Load object and change value to the new one
-                c_obj = ObjectProxy(ref)
-                c_value = getattr(c_obj, ref_attr)
-                o_value = data[self_attr]['orig']
+        for ref, ref_attr, change in updater.apply(): #@UnusedVariable
+            for self_attr, multivalue, mode, pattern in queued[(ref, ref_attr)]:
+                self.__update_ref(data, ref, ref_attr, self_attr, multivalue, mode, pattern)
 
-                if mode == "replace":
-                    if type(c_value) == list:
-                        if type(o_value) == list:
-                            c_value = list(filter(lambda x: x not in o_value, c_value))
-                        else:
-                            c_value = list(filter(lambda x: x != o_value, c_value))
+    def __update_ref(self, data, ref, ref_attr, self_attr, multivalue, mode, pattern):
+        if mode == "inline" and multivalue is True:
+            self.log.error("cannot replace multivalue attribute references inline")
+            return
 
-                        if multivalue:
-                            c_value.extend(data[self_attr]['value'])
-                        else:
-                            c_value.append(data[self_attr]['value'][0])
+        # Load object and change value to the new one
+        c_obj = ObjectProxy(ref)
+        c_value = getattr(c_obj, ref_attr)
+        o_value = data[self_attr]['orig']
 
-                        setattr(c_obj, ref_attr, list(set(c_value)))
+        if mode == "replace":
+            if type(c_value) == list:
+                if type(o_value) == list:
+                    c_value = list(filter(lambda x: x not in o_value, c_value))
+                else:
+                    c_value = list(filter(lambda x: x != o_value, c_value))
 
-                    else:
-                        setattr(c_obj, ref_attr, data[self_attr]['value'][0])
+                if multivalue:
+                    c_value.extend(data[self_attr]['value'])
+                else:
+                    c_value.append(data[self_attr]['value'][0])
 
-                elif mode == "inline":
-                    replacements = []
-                    replacement = pattern["replace"].replace("###VALUE###", data[self_attr]['value'][0]) if pattern["replace"] is not None else data[self_attr]['value'][0]
+                setattr(c_obj, ref_attr, list(set(c_value)))
 
-                    if type(o_value) == list:
-                        for o in o_value:
-                            replacements.append((pattern["replace"].replace("###VALUE###", o) if pattern["replace"] is not None else o, replacement))
-                    else:
-                        replacements.append((pattern["replace"].replace("###VALUE###", o_value) if pattern["replace"] is not None else o_value, replacement))
+            else:
+                setattr(c_obj, ref_attr, data[self_attr]['value'][0])
 
-                    if type(c_value) == list:
-                        for i, c in enumerate(c_value):
-                            for r in replacements:
-                                c_value[i] = re.sub(r[0], r[1], c_value[i])
+        elif mode == "inline":
+            replacements = []
+            replacement = pattern["replace"].replace("###VALUE###", data[self_attr]['value'][0]) if pattern["replace"] is not None else data[self_attr]['value'][0]
 
-                        setattr(c_obj, ref_attr, list(set(c_value)))
-                    else:
-                        for r in replacements:
-                            c_value = re.sub(r[0], r[1], c_value)
+            if type(o_value) == list:
+                for o in o_value:
+                    replacements.append((pattern["replace"].replace("###VALUE###", o) if pattern["replace"] is not None else o, replacement))
+            else:
+                replacements.append((pattern["replace"].replace("###VALUE###", o_value) if pattern["replace"] is not None else o_value, replacement))
 
-                        setattr(c_obj, ref_attr, c_value)
+            if type(c_value) == list:
+                for i, c in enumerate(c_value):
+                    for r in replacements:
+                        c_value[i] = re.sub(r[0], r[1], c_value[i])
 
-                else:
-                    raise ObjectException(C.make_error('UNHANDLED_REFERENCE_MODE', mode=mode))
+                setattr(c_obj, ref_attr, list(set(c_value)))
+            else:
+                for r in replacements:
+                    c_value = re.sub(r[0], r[1], c_value)
 
-                c_obj.commit()
+                setattr(c_obj, ref_attr, c_value)
+
+        else:
+            raise ObjectException(C.make_error('UNHANDLED_REFERENCE_MODE', mode=mode))
+
+        c_obj.commit()
 
     def remove_refs(self, skip_backend_writes=[]):
+        updater = ReferenceUpdater(skip_backend_writes)
+        queued = {}
+
         for ref_attr, self_attr, value, refs, multivalue, mode, pattern in self.get_references(): #@UnusedVariable
 
             for ref in refs:
-                c_obj = ObjectProxy(ref)
-                c_value = getattr(c_obj, ref_attr)
-
                 if mode == "replace":
-                    if type(c_value) == list:
-                        if type(value) == list:
-                            c_value = list(filter(lambda x: x not in value, c_value))
-                        else:
-                            c_value = list(filter(lambda x: x != value, c_value))
-
-                        setattr(c_obj, ref_attr, c_value)
+                    for v in (value if type(value) == list else [value]):
+                        updater.remove_value(ref, ref_attr, v)
 
-                    else:
-                        setattr(c_obj, ref_attr, None)
-                elif mode == "inline":
-                    replacements = []
-                    if type(value) == list:
-                        for o in value:
-                            replacements.append((pattern["delete"].replace("###VALUE###", value) if pattern["delete"] is not None else value, ""))
-                    else:
-                        replacements.append((pattern["delete"].replace("###VALUE###", value) if pattern["delete"] is not None else value, ""))
+                    if (ref, ref_attr) not in queued:
+                        queued[(ref, ref_attr)] = []
+                    queued[(ref, ref_attr)].append((value, mode, pattern))
+                else:
+                    self.__remove_ref(ref, ref_attr, value, mode, pattern, skip_backend_writes)
 
-                    if type(c_value) == list:
-                        for i, c in enumerate(c_value):
-                            for r in replacements:
-                                c_value[i] = re.sub(r[0], r[1], c_value[i])
+        for ref, ref_attr, change in updater.apply(): #@UnusedVariable
+            for value, mode, pattern in queued[(ref, ref_attr)]:
+                self.__remove_ref(ref, ref_attr, value, mode, pattern, skip_backend_writes)
 
-                        setattr(c_obj, ref_attr, list(set(c_value)))
-                    else:
-                        for r in replacements:
-                            c_value = re.sub(r[0], r[1], c_value)
+    def __remove_ref(self, ref, ref_attr, value, mode, pattern, skip_backend_writes):
+        c_obj = ObjectProxy(ref)
+        c_value = getattr(c_obj, ref_attr)
 
-                        setattr(c_obj, ref_attr, c_value)
+        if mode == "replace":
+            if type(c_value) == list:
+                if type(value) == list:
+                    c_value = list(filter(lambda x: x not in value, c_value))
                 else:
-                    raise ObjectException(C.make_error('UNHANDLED_REFERENCE_MODE', mode=mode))
+                    c_value = list(filter(lambda x: x != value, c_value))
+
+                setattr(c_obj, ref_attr, c_value)
 
-                c_obj.commit(skip_backend_writes=skip_backend_writes)
+            else:
+                setattr(c_obj, ref_attr, None)
+        elif mode == "inline":
+            replacements = []
+            if type(value) == list:
+                for o in value:
+                    replacements.append((pattern["delete"].replace("###VALUE###", value) if pattern["delete"] is not None else value, ""))
+            else:
+                replacements.append((pattern["delete"].replace("###VALUE###", value) if pattern["delete"] is not None else value, ""))
+
+            if type(c_value) == list:
+                for i, c in enumerate(c_value):
+                    for r in replacements:
+                        c_value[i] = re.sub(r[0], r[1], c_value[i])
+
+                setattr(c_obj, ref_attr, list(set(c_value)))
+            else:
+                for r in replacements:
+                    c_value = re.sub(r[0], r[1], c_value)
+
+                setattr(c_obj, ref_attr, c_value)
+        else:
+            raise ObjectException(C.make_error('UNHANDLED_REFERENCE_MODE', mode=mode))
+
+        c_obj.commit(skip_backend_writes=skip_backend_writes)
 
     def get_dn_references(self):
         res = []
@@ -1428,35 +1513,45 @@ class Object(object):
 
     def update_dn_refs(self, new_dn, skip_backend_writes=[]):
         """ updates references to a changed DN """
+        updater = ReferenceUpdater(skip_backend_writes)
         for ref_attr, refs in self.get_dn_references():
             for ref in refs:
-                c_obj = ObjectProxy(ref)
-                c_value = getattr(c_obj, ref_attr)
+                updater.replace_value(ref, ref_attr, self.dn, new_dn)
 
-                if type(c_value) == list:
-                    c_value = list(filter(lambda x: x != self.dn, c_value))
-                    c_value.append(new_dn)
-                    setattr(c_obj, ref_attr, list(set(c_value)))
+        # Open the objects that cannot be updated in bulk
+        for ref, ref_attr, change in updater.apply(): #@UnusedVariable
+            c_obj = ObjectProxy(ref)
+            c_value = getattr(c_obj, ref_attr)
 
-                else:
-                    setattr(c_obj, ref_attr, new_dn)
+            if type(c_value) == list:
+                c_value = list(filter(lambda x: x != self.dn, c_value))
+                c_value.append(new_dn)
+                setattr(c_obj, ref_attr, list(set(c_value)))
+
+            else:
+                setattr(c_obj, ref_attr, new_dn)
 
-                c_obj.commit(skip_write_hooks=True, skip_backend_writes=skip_backend_writes)
+            c_obj.commit(skip_write_hooks=True, skip_backend_writes=skip_backend_writes)
 
     def remove_dn_refs(self, skip_backend_writes=[]):
+        updater = ReferenceUpdater(skip_backend_writes)
         for ref_attr, refs in self.get_dn_references():
             for ref in refs:
-                c_obj = ObjectProxy(ref)
-                c_value = getattr(c_obj, ref_attr)
+                updater.remove_value(ref, ref_attr, self.dn)
 
-                if type(c_value) == list:
-                    c_value = filter(lambda x: x != self.dn, c_value)
-                    setattr(c_obj, ref_attr, list(set(c_value)))
+        # Open the objects that cannot be updated in bulk
+        for ref, ref_attr, change in updater.apply(): #@UnusedVariable
+            c_obj = ObjectProxy(ref)
+            c_value = getattr(c_obj, ref_attr)
 
-                else:
-                    setattr(c_obj, ref_attr, None)
+            if type(c_value) == list:
+                c_value = filter(lambda x: x != self.dn, c_value)
+                setattr(c_obj, ref_attr, list(set(c_value)))
+
+            else:
+                setattr(c_obj, ref_attr, None)
 
-                c_obj.commit(skip_write_hooks=True, skip_backend_writes=skip_backend_writes)
+            c_obj.commit(skip_write_hooks=True, skip_backend_writes=skip_backend_writes)
 
     def remove(self, skip_backend_writes=[]):
         """
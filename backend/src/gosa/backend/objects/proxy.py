@@ -38,6 +38,7 @@ will list the available extension types for that specific object.
 
 """
 import copy
+import functools
 import gettext
 
 from datetime import datetime
@@ -50,6 +51,7 @@ import zope.event
 from lxml import etree, objectify
 from ldap.dn import dn2str, str2dn
 from logging import getLogger
+from threading import RLock
 
 from gosa.backend.routes.sse.main import SseHandler
 from gosa.backend.utils.ldap import normalize_dn
@@ -83,6 +85,142 @@ C.register_codes(dict(
     ))
 
 
+class LazyExtensions(dict):
+    """
+    Dictionary of the extension objects of an :class:`ObjectProxy`.
+
+    Active extensions can be added with a loader, which creates the extension
+    object on first access. Accessing the values (e.g. by ``items()`` or ``values()``)
+    loads all pending extensions, use :meth:`is_active` and :meth:`is_loaded` to
+    check an extensions state without loading it.
+
+    :param on_load: callback that is called with (name, extension) after an extension has been loaded
+    """
+
+    def __init__(self, on_load=None):
+        super(LazyExtensions, self).__init__()
+        self.__loaders = {}
+        self.__on_load = on_load
+
+    def add_lazy(self, name, loader):
+        super(LazyExtensions, self).__setitem__(name, None)
+        self.__loaders[name] = loader
+
+    def is_active(self, name):
+        """ Returns True if the extension is active, without loading it """
+        return name in self.__loaders or super(LazyExtensions, self).get(name) is not None
+
+    def is_loaded(self, name):
+        """ Returns True if the extension is active and has already been loaded """
+        return super(LazyExtensions, self).get(name) is not None
+
+    def load(self, name):
+        loader = self.__loaders.pop(name, None)
+        if loader is not None:
+            extension = loader()
+            super(LazyExtensions, self).__setitem__(name, extension)
+            if self.__on_load is not None:
+                self.__on_load(name, extension)
+
+    def load_all(self):
+        for name in list(self.__loaders):
+            self.load(name)
+
+    def __getitem__(self, name):
+        if name in self.__loaders:
+            self.load(name)
+        return super(LazyExtensions, self).__getitem__(name)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def __setitem__(self, name, value):
+        self.__loaders.pop(name, None)
+        super(LazyExtensions, self).__setitem__(name, value)
+
+    def __delitem__(self, name):
+        self.__loaders.pop(name, None)
+        super(LazyExtensions, self).__delitem__(name)
+
+    def values(self):
+        self.load_all()
+        return super(LazyExtensions, self).values()
+
+    def items(self):
+        self.load_all()
+        return super(LazyExtensions, self).items()
+
+
+class ACLMask(object):
+    """
+    The attributes a user is allowed to read and write and the methods the user
+    is allowed to execute on an object. The attribute permissions are resolved
+    at once when the mask is created, the method permissions when they are
+    needed for the first time.
+
+    A mask is outdated as soon as the ACLs have been changed, which is tracked by
+    :class:`gosa.backend.acl.ACLChanged` events and the check cache of the ACL resolver.
+
+    :param resolver: the ACL resolver
+    :param user: the user
+    :param dn: the DN of the object
+    :param attribute_types: dict of attribute name: type
+    """
+    __generation = 0
+    __subscribed = False
+    __lock = RLock()
+
+    def __init__(self, resolver, user, dn, attribute_types):
+        self.__resolver = resolver
+        self.user = user
+        self.dn = dn
+        self.generation = ACLMask.get_generation(resolver)
+        self.__domain = Environment.getInstance().domain
+
+        topics = dict([(attr, "%s.objects.%s.attributes.%s" % (self.__domain, attr_type, attr))
+                       for attr, attr_type in attribute_types.items()])
+        checks = [(topic, mode) for topic in topics.values() for mode in ["r", "w"]]
+        permissions = resolver.check_all(user, checks, base=dn)
+        self.__readable = set([attr for attr, topic in topics.items() if permissions[(topic, "r")]])
+        self.__writable = set([attr for attr, topic in topics.items() if permissions[(topic, "w")]])
+
+    def can_read(self, attr):
+        return attr in self.__readable
+
+    def can_write(self, attr):
+        return attr in self.__writable
+
+    def can_execute(self, method_type, method):
+        return self.__resolver.check(self.user, "%s.objects.%s.methods.%s" % (self.__domain, method_type, method), "x",
+                                     base=self.dn)
+
+    def is_valid(self, resolver, user, dn):
+        return self.__resolver is resolver and self.user == user and self.dn == dn and \
+            self.generation == ACLMask.get_generation(resolver)
+
+    @staticmethod
+    def get_generation(resolver):
+        ACLMask.__subscribe()
+        check_generation = getattr(resolver.check, "generation", None)
+        if not isinstance(check_generation, int):
+            check_generation = None
+        return ACLMask.__generation, check_generation
+
+    @staticmethod
+    def __subscribe():
+        if ACLMask.__subscribed is False:
+            with ACLMask.__lock:
+                if ACLMask.__subscribed is False:
+                    zope.event.subscribers.append(ACLMask.__handle_events)
+                    ACLMask.__subscribed = True
+
+    @staticmethod
+    def __handle_events(event):
+        if event.__class__.__name__ == "ACLChanged":
+            with ACLMask.__lock:
+                ACLMask.__generation += 1
+
+
 class ObjectProxy(object):
     _no_pickle_ = True
     dn = None
@@ -113,6 +251,8 @@ class ObjectProxy(object):
     __read_only = False
     __from_db_only = False
     __open_mode = None
+    __lazy_extensions = True
+    __acl_mask = None
 
     def __init__(self, _id, what=None, user=None, session_id=None,
                  data=None, read_only=False, skip_value_population=False, open_mode=None, from_db_only=False):
@@ -120,7 +260,7 @@ class ObjectProxy(object):
         self.__log = getLogger(__name__)
         self.__factory = ObjectFactory.getInstance()
         self.__base = None
-        self.__extensions = {}
+        self.__extensions = LazyExtensions(self.__extension_loaded)
         self.__initial_extension_state = {}
         self.__retractions = {}
         self.__attribute_map = {}
@@ -142,6 +282,8 @@ class ObjectProxy(object):
         # hooks that are triggered when the attribute change is committed
         self.__attribute_change_write_hooks = {}
         self.__open_mode = open_mode
+        # load extensions on first access
+        self.__lazy_extensions = self.__env.config.getboolean("backend.lazy-extensions", default=True)
 
         # Do we have a uuid when opening?
         dn_or_base = _id
@@ -192,17 +334,18 @@ class ObjectProxy(object):
         self.__base_type = base
         self.__base_mode = base_mode
         for extension in extensions:
-            self.__log.debug("loading %s extension for %s" % (extension, dn_or_base))
+            loader = functools.partial(self.__load_extension, extension,
+                                       data=data[extension] if data is not None and extension in data else None,
+                                       skip_value_population=skip_value_population)
+
+            if self.__lazy_extensions and open_mode != "delete":
+                # extensions are loaded on first access
+                self.__extensions.add_lazy(extension, loader)
+                self.__initial_extension_state[extension] = {"active": True, "allowed": True}
+                continue
+
             try:
-                self.__extensions[extension] = self.__factory.getObject(extension, self.__base.uuid,
-                                                                        data=data[extension] if data is not None and extension in data else None,
-                                                                        read_only=self.__read_only,
-                                                                        from_db_only=self.__from_db_only,
-                                                                        skip_value_population=skip_value_population)
-                self.__extensions[extension].dn = self.__base.dn
-                self.__extensions[extension].parent = self
-                self.__extensions[extension]._owner = self.__current_user
-                self.__extensions[extension]._session_id = self.__current_session_id
+                self.__extensions[extension] = loader()
                 self.__initial_extension_state[extension] = {"active": True, "allowed": True}
             except Exception as e:
                 if open_mode == "delete" and hasattr(e, "response") and getattr(e, "response").status_code == 404:
@@ -221,31 +364,29 @@ class ObjectProxy(object):
             self.__all_method_names = self.__all_method_names + self.__factory.getObjectMethods(obj)
 
         # Generate method mapping
-        for obj in [base] + [x for x in extensions if self.__extensions[x] is not None]:
+        for obj in [base] + [x for x in extensions if self.__extensions.is_active(x)]:
             for method in object_types[obj]['methods']:
                 if obj == self.__base.__class__.__name__:
                     self.__method_map[method] = getattr(self.__base, method)
                     self.__method_type_map[method] = self.__base_type
                     continue
                 if obj in self.__extensions:
-                    self.__method_map[method] = getattr(self.__extensions[obj], method)
+                    if self.__extensions.is_loaded(obj):
+                        self.__method_map[method] = getattr(self.__extensions[obj], method)
+                    else:
+                        self.__method_map[method] = self.__lazy_method(obj, method)
                     self.__method_type_map[method] = obj
 
-        for ext in all_extensions:
-            if self.__extensions[ext]:
-                props = self.__extensions[ext].getProperties()
-            else:
-                props = self.__factory.getObjectProperties(ext)
-
         # Generate read and write mapping for attributes
         self.__attribute_map = self.__factory.get_attributes_by_object(self.__base_type)
 
-        # Generate attribute to object-type mapping
+        # Generate attribute to object-type mapping, extensions that have not been loaded
+        # yet are served by the property definitions of the factory
         self.__property_map = self.__base.getProperties()
         for attr in [n for n, o in self.__property_map.items() if not o['foreign']]:
             self.__attributes.append(attr)
         for ext in all_extensions:
-            if self.__extensions[ext]:
+            if self.__extensions.is_loaded(ext):
                 props = self.__extensions[ext].getProperties()
             else:
                 props = self.__factory.getObjectProperties(ext)
@@ -265,6 +406,9 @@ class ObjectProxy(object):
         self.uuid = self.__base.uuid
         self.dn = self.__base.dn
 
+        if self.__current_user is not None:
+            self.__acl_mask = ACLMask(self.__acl_resolver, self.__current_user, self.dn, self.__attribute_type_map)
+
         self.populate_to_foreign_properties()
         self.__search_aid = PluginRegistry.getInstance("ObjectIndex").get_search_aid()
 
@@ -421,6 +565,48 @@ class ObjectProxy(object):
         else:
             return result
 
+    def __load_extension(self, extension, data=None, skip_value_population=False):
+        self.__log.debug("loading %s extension for %s" % (extension, self.__base.dn))
+        obj = self.__factory.getObject(extension, self.__base.uuid,
+                                       data=data,
+                                       read_only=self.__read_only,
+                                       from_db_only=self.__from_db_only,
+                                       skip_value_population=skip_value_population)
+        obj.dn = self.__base.dn
+        obj.parent = self
+        obj._owner = self.__current_user
+        obj._session_id = self.__current_session_id
+        return obj
+
+    def __extension_loaded(self, extension, obj):
+        """
+        Replaces the property definitions and methods of a lazy loaded extension
+        with the ones of the extension object.
+        """
+        props = obj.getProperties()
+        for attr in props:
+            if not props[attr]['foreign']:
+                self.__property_map[attr] = props[attr]
+
+        for method, method_type in self.__method_type_map.items():
+            if method_type == extension:
+                self.__method_map[method] = getattr(obj, method)
+
+        self.populate_to_foreign_properties(extension=extension)
+
+    def __lazy_method(self, extension, method):
+        def call(*args, **kwargs):
+            return getattr(self.__extensions[extension], method)(*args, **kwargs)
+        return call
+
+    def __get_acl_mask(self):
+        """
+        Returns the :class:`ACLMask` of the current user for this object.
+        """
+        if self.__acl_mask is None or not self.__acl_mask.is_valid(self.__acl_resolver, self.__current_user, self.dn):
+            self.__acl_mask = ACLMask(self.__acl_resolver, self.__current_user, self.dn, self.__attribute_type_map)
+        return self.__acl_mask
+
     def get_all_method_names(self):
         return self.__all_method_names
 
@@ -442,9 +628,13 @@ class ObjectProxy(object):
 
             # Tell the class that own the foreign property that it
             # has to use the source property data.
-            cur = self.__property_map[attr]
-            if ext in self.__extensions and self.__extensions[ext]:
-                self.__extensions[ext].set_foreign_value(attr, cur)
+            # Extensions that have not been loaded yet, get their values on load.
+            if ext in self.__extensions and self.__extensions.is_loaded(ext):
+                # the owner of the property must be loaded to get its current value
+                owner = self.__attribute_map[attr]['base']
+                if owner in self.__extensions:
+                    self.__extensions.load(owner)
+                self.__extensions[ext].set_foreign_value(attr, self.__property_map[attr])
 
     def repopulate_attribute_values(self, attribute_name):
         type = self.get_extension_off_attribute(attribute_name)
@@ -480,30 +670,21 @@ class ObjectProxy(object):
         attrs = None
         # Do we have read permissions for the requested attribute, method
         if self.__current_user:
-            def check_acl(self, attribute):
-                attr_type = self.__attribute_type_map[attribute]
-                topic = "%s.objects.%s.attributes.%s" % (self.__env.domain, attr_type, attribute)
-                result = self.__acl_resolver.check(self.__current_user, topic, "r", base=self.dn)
-                if self.__current_user not in self.__acl_resolver.admins:
-                    if result:
-                        self.__log.debug("User %s is allowed to access property %s!" % (self.__current_user, topic))
-                    else:
-                        self.__log.debug("User %s is NOT allowed to access property %s!" % (self.__current_user, topic))
-                return result
-
-            attrs = list(filter(lambda x: check_acl(self, x), self.__attributes))
+            mask = self.__get_acl_mask()
+            attrs = [x for x in self.__attributes if mask.can_read(x)]
         else:
             attrs = self.__attributes
 
         if detail:
+            # the details contain populated values of the extensions
+            self.__extensions.load_all()
+
             res = {}
             for attr in attrs:
                 readonly = self.__property_map[attr]['readonly']
-                attr_type = self.__attribute_type_map[attr]
-                topic = "%s.objects.%s.attributes.%s" % (self.__env.domain, attr_type, attr)
 
                 # check if user is allowed to edit this attribute, otherwise set it to readonly
-                if not readonly and not self.__acl_resolver.check(self.__current_user, topic, "w", base=self.dn):
+                if not readonly and self.__current_user and not self.__get_acl_mask().can_write(attr):
                     readonly = True
 
                 validator_information = {}
@@ -555,12 +736,8 @@ class ObjectProxy(object):
 
         # Do we have read permissions for the requested method
         if self.__current_user:
-            def check_acl(method):
-                attr_type = self.__method_type_map[method]
-                topic = "%s.objects.%s.methods.%s" % (self.__env.domain, attr_type, method)
-                return self.__acl_resolver.check(self.__current_user, topic, "x", base=self.dn)
-
-            return list(filter(lambda x: check_acl(x), self.__method_map.keys()))
+            mask = self.__get_acl_mask()
+            return [x for x in self.__method_map.keys() if mask.can_execute(self.__method_type_map[x], x)]
 
         return self.__method_map.keys()
 
@@ -615,12 +792,12 @@ class ObjectProxy(object):
         return self.__base.__class__.__name__
 
     def get_extension_types(self):
-        return dict([(e, i is not None) for e, i in self.__extensions.items()])
+        return dict([(e, self.__extensions.is_active(e)) for e in self.__extensions.keys()])
 
     def get_templates(self):
         res = {self.get_base_type(): self.__base.getTemplate()}
-        for name, ext in self.__extensions.items():
-            res[name] = ext.getTemplate() if ext else self._get_template(name)
+        for name in self.__extensions.keys():
+            res[name] = self.__extensions[name].getTemplate() if self.__extensions.is_loaded(name) else self._get_template(name)
         return res
 
     def _get_object_templates(self, obj):
@@ -694,7 +871,7 @@ class ObjectProxy(object):
         # Ensure that all precondition for this extension are fulfilled
         object_types = self.__factory.getObjectTypes()
         for required_extension in object_types[extension]['requires']:
-            if not required_extension in self.__extensions or self.__extensions[required_extension] is None:
+            if not required_extension in self.__extensions or not self.__extensions.is_active(required_extension):
                 raise ProxyException(C.make_error('OBJECT_EXTENSION_DEPENDS',
                                                   extension=extension,
                                                   missing=required_extension))
@@ -727,7 +904,7 @@ class ObjectProxy(object):
             del self.__retractions[extension]
         else:
             mode = "extend"
-            if self.__extensions[extension]:
+            if self.__extensions.is_active(extension):
                 mode = "update"
             self.__log.debug("creating new extension '%s' in '%s' mode%s" % (extension, mode, " with initial data" if data is not None
             else ""))
@@ -746,7 +923,7 @@ class ObjectProxy(object):
         self.populate_to_foreign_properties(extension)
 
     def is_extended_by(self, extension):
-        return extension in self.__extensions and self.__extensions[extension] is not None
+        return extension in self.__extensions and self.__extensions.is_active(extension)
 
     def retract(self, extension):
         """
@@ -755,13 +932,13 @@ class ObjectProxy(object):
         if not extension in self.__extensions:
             raise ProxyException(C.make_error('OBJECT_EXTENSION_NOT_ALLOWED', extension=extension))
 
-        if self.__extensions[extension] is None:
+        if not self.__extensions.is_active(extension):
             raise ProxyException(C.make_error('OBJECT_NO_SUCH_EXTENSION', extension=extension))
 
         # Collect all extensions that are required due to dependencies..
         oTypes = self.__factory.getObjectTypes()
         for ext in self.__extensions:
-            if self.__extensions[ext]:
+            if self.__extensions.is_active(ext):
                 if extension in oTypes[ext]['requires']:
                     raise ProxyException(C.make_error('OBJECT_EXTENSION_IN_USE', extension=extension, origin=ext))
 
@@ -897,7 +1074,7 @@ class ObjectProxy(object):
                     ctype = child['_type']
 
                     # Don't handle objects that already have been moved
-                    if cdn in root_elements.values():
+                    if cdn in [root['dn'] for root in root_elements.values()]:
                         continue
 
                     # These objects have been moved automatically. Open
@@ -947,8 +1124,8 @@ class ObjectProxy(object):
         # Check ACLs
         # We need the 'd' right for the current base-object and all its active extensions to be able to remove it.
         if self.__current_user is not None:
-            required_acl_objects = [self.__base_type] + [ext for ext, item in self.__extensions.items() if
-                                                         item is not None]
+            required_acl_objects = [self.__base_type] + [ext for ext in self.__extensions.keys() if
+                                                         self.__extensions.is_active(ext)]
             for ext_type in required_acl_objects:
                 topic = "%s.objects.%s" % (self.__env.domain, ext_type)
                 if not self.__acl_resolver.check(self.__current_user, topic, "d", base=self.dn):
@@ -1017,29 +1194,13 @@ class ObjectProxy(object):
 
         # Get primary backend of the object to be moved
         p_backend = getattr(self.__base, '_backend')
-
-        # Traverse tree and find different backends
-        foreign_backends = {}
         index = PluginRegistry.getInstance("ObjectIndex")
-        children = index.search({"dn": [self.__base.dn, "%," + self.__base.dn]},
-            {'dn': 1, '_type': 1})
-
-        # Note all elements with different backends
-        for v in children:
-            cdn = v['dn']
-            ctype = v['_type']
-
-            cback = self.__factory.getObjectTypes()[ctype]['backend']
-            if cback != p_backend:
-                if not cback in foreign_backends:
-                    foreign_backends[cback] = []
-                foreign_backends[cback].append(cdn)
-
-        # Only keep the first per backend that is close to the root
-        root_elements = {}
-        for fbe, fdns in foreign_backends.items():
-            fdns.sort(key=len)
-            root_elements[fbe] = fdns[0]
+
+        # The subtree is only relevant if the commit moves the object, which is the
+        # case if one of the RDN attributes has been changed.
+        subtree = None
+        if self.__base_mode != "create" and self.__rdn_changed():
+            subtree = self.__get_subtree(old_base, p_backend)
 
         # Handle retracts
         for idx in list(self.__retractions.keys()):
@@ -1081,9 +1242,15 @@ class ObjectProxy(object):
         # Did the commit result in a move?
         if self.__base_mode != "create" and self.dn != self.__base.dn:
 
+            if subtree is None:
+                # the index still contains the subtree with the old DNs
+                subtree = self.__get_subtree(old_base, p_backend)
+            children, root_elements = subtree
+
             if children:
                 # Move additional backends if needed
-                for fbe, fdn in root_elements.items():
+                for fbe, root in root_elements.items():
+                    fdn = root['dn']
 
                     # Get new base of child
                     new_child_dn = fdn[:len(fdn) - len(old_base)] + self.__base.dn
@@ -1092,7 +1259,7 @@ class ObjectProxy(object):
                     # Select objects with different base and trigger a move, the
                     # primary backend move will be triggered and do a recursive
                     # move for that backend.
-                    obj = self.__factory.getObject(children[fdn], fdn)
+                    obj = self.__factory.getObject(root['_type'], fdn)
                     obj.move(new_child_base)
 
                 # Update all DN references
@@ -1102,7 +1269,7 @@ class ObjectProxy(object):
                     ctype = entry['_type']
 
                     # Don't handle objects that already have been moved
-                    if cdn in root_elements.values():
+                    if cdn in [root['dn'] for root in root_elements.values()]:
                         continue
 
                     # These objects have been moved automatically. Open
@@ -1118,6 +1285,9 @@ class ObjectProxy(object):
 
         changed_props = []
 
+        # References of the hooks are collected and written in bulk
+        updater = ReferenceUpdater(skip_backend_writes)
+
         for name, settings in save_props.items():
             if self.__base_mode == "update":
                 if not self.__is_equal(settings['value'], settings['orig_value']):
@@ -1146,10 +1316,8 @@ class ObjectProxy(object):
                             query["extension"] = hook["notified_obj"]
                         res = index.search(query, {"dn": 1})
                         for x in res:
-                            obj = ObjectProxy(x["dn"])
-                            self.__log.debug("removing reference to %s from %s.%s" % (self.dn, obj.dn, hook["notified_obj_attribute"]))
-                            setattr(obj, hook["notified_obj_attribute"], None)
-                            obj.commit(skip_backend_writes=skip_backend_writes)
+                            self.__log.debug("removing reference to %s from %s.%s" % (self.dn, x["dn"], hook["notified_obj_attribute"]))
+                            updater.set_value(x["dn"], hook["notified_obj_attribute"], None)
 
                     if len(add):
                         query = {"dn": {"in_": add}}
@@ -1159,16 +1327,42 @@ class ObjectProxy(object):
                             query["extension"] = hook["notified_obj"]
                         res = index.search(query, {"dn": 1})
                         for x in res:
-                            obj = ObjectProxy(x["dn"])
-                            self.__log.debug("adding reference to %s to %s.%s" % (self.dn, obj.dn, hook["notified_obj_attribute"]))
-                            setattr(obj, hook["notified_obj_attribute"], self.dn)
-                            obj.commit(skip_backend_writes=skip_backend_writes)
+                            self.__log.debug("adding reference to %s to %s.%s" % (self.dn, x["dn"], hook["notified_obj_attribute"]))
+                            updater.set_value(x["dn"], hook["notified_obj_attribute"], self.dn)
+
+        # Open the objects that cannot be updated in bulk
+        for dn, attribute, change in updater.apply():
+            obj = ObjectProxy(dn)
+            setattr(obj, attribute, change['set'][0] if len(change['set']) else None)
+            obj.commit(skip_backend_writes=skip_backend_writes)
 
         zope.event.notify(ObjectChanged("post object %s" % self.__base_mode, self.__base, changed_props=changed_props))
 
     def __is_equal(self, val1, val2):
         return (val1 is None or val1 == []) and (val2 is None or val2 == []) or val1 == val2
 
+    def __rdn_changed(self):
+        """
+        Check if one of the attributes used in the RDN of the object has been changed.
+        """
+        rdn_attributes = [x[0].lower() for x in str2dn(self.__base.dn, flags=ldap.DN_FORMAT_LDAPV3)[0]]
+        for attr in self.__attributes:
+            if attr.lower() in rdn_attributes and attr in self.__attribute_map and self.is_changed(attr):
+                return True
+        return False
+
+    def __get_subtree(self, dn, backend):
+        """
+        Collect the objects of the subtree below ``dn`` and the topmost entries
+        per foreign backend.
+
+        :return: tuple (children, root elements per foreign backend)
+        """
+        index = PluginRegistry.getInstance("ObjectIndex")
+        root_elements = index.get_foreign_backend_roots(dn, backend)
+        children = index.search({"dn": [dn, "%," + dn]}, {'dn': 1, '_type': 1})
+        return children, root_elements
+
     def is_changed(self, attribute_name):
         """
         Return True if the attribute value has been changed
@@ -1196,8 +1390,8 @@ class ObjectProxy(object):
             # Check permissions
             # To execute a method the 'x' permission is required.
             attr_type = self.__method_type_map[name]
-            topic = "%s.objects.%s.methods.%s" % (self.__env.domain, attr_type, name)
-            if self.__current_user is not None and not self.__acl_resolver.check(self.__current_user, topic, "x", base=self.dn):
+            if self.__current_user is not None and not self.__get_acl_mask().can_execute(attr_type, name):
+                topic = "%s.objects.%s.methods.%s" % (self.__env.domain, attr_type, name)
                 self.__log.debug("user '%s' has insufficient permissions to execute %s on %s, required is %s:%s" % (
                     self.__current_user, name, self.dn, topic, "x"))
                 raise ACLException(C.make_error('PERMISSION_ACCESS', topic, target=self.dn))
@@ -1216,9 +1410,9 @@ class ObjectProxy(object):
             raise AttributeError(C.make_error('ATTRIBUTE_NOT_FOUND', name))
 
         # Do we have read permissions for the requested attribute
-        attr_type = self.__attribute_type_map[name]
-        topic = "%s.objects.%s.attributes.%s" % (self.__env.domain, attr_type, name)
-        if self.__current_user is not None and not self.__acl_resolver.check(self.__current_user, topic, "r", base=self.dn):
+        if self.__current_user is not None and not self.__get_acl_mask().can_read(name):
+            attr_type = self.__attribute_type_map[name]
+            topic = "%s.objects.%s.attributes.%s" % (self.__env.domain, attr_type, name)
             self.__log.debug("user '%s' has insufficient permissions to read %s on %s, required is %s:%s" % (
                 self.__current_user, name, self.dn, topic, "r"))
             raise ACLException(C.make_error('PERMISSION_ACCESS', topic, target=self.dn))
@@ -1248,10 +1442,10 @@ class ObjectProxy(object):
         # If we try to modify object specific properties then check acls
         if self.__attribute_map and name in self.__attribute_map and self.__current_user is not None:
 
-            # Do we have read permissions for the requested attribute, method
-            attr_type = self.__attribute_type_map[name]
-            topic = "%s.objects.%s.attributes.%s" % (self.__env.domain, attr_type, name)
-            if not self.__acl_resolver.check(self.__current_user, topic, "w", base=self.dn):
+            # Do we have write permissions for the requested attribute
+            if not self.__get_acl_mask().can_write(name):
+                attr_type = self.__attribute_type_map[name]
+                topic = "%s.objects.%s.attributes.%s" % (self.__env.domain, attr_type, name)
                 self.__log.debug("user '%s' has insufficient permissions to write %s on %s, required is %s:%s" % (
                     self.__current_user, name, self.dn, topic, "w"))
                 raise ACLException(C.make_error('PERMISSION_ACCESS', topic, target=self.dn))
@@ -1342,7 +1536,10 @@ class ObjectProxy(object):
         if self.__base.modifyTimestamp:
             res['_last_changed'] = time.mktime(self.__base.modifyTimestamp.timetuple())
 
-        res['_extensions'] = [k for k in self.__extensions.keys() if self.__extensions[k]]
+        res['_extensions'] = [k for k in self.__extensions.keys() if self.__extensions.is_active(k)]
+
+        # all property values are required
+        self.__extensions.load_all()
 
         props = self.__property_map
         for propname in self.__property_map:
@@ -1376,7 +1573,7 @@ class ObjectProxy(object):
             raise ACLException(C.make_error('PERMISSION_ACCESS', topic, target=self.dn))
 
         # Get the xml definitions combined for all objects.
-        xmldefs = etree.tostring(self.__factory.getXMLDefinitionsCombined())
+        xmldefs = self.__factory.getXMLDefinitionsCombined(asString=True)
 
         # Create a document wich contains all necessary information to create
         # xml reprentation of our own.
@@ -1395,11 +1592,14 @@ class ObjectProxy(object):
         # Create a list of extensions and their properties
         exttag = etree.Element("extensions")
         for name in self.__extensions.keys():
-            if self.__extensions[name]:
+            if self.__extensions.is_active(name):
                 ext = etree.Element("extension")
                 ext.text = name
                 exttag.append(ext)
 
+        # all property values are required
+        self.__extensions.load_all()
+
         props = self.__property_map
         for propname in self.__property_map:
             # only index attributes that are required for searching
@@ -1455,3 +1655,4 @@ class ObjectProxy(object):
 
 from .factory import ObjectFactory
 from .object import ObjectChanged, Object, STATUS_CHANGED
+from .references import ReferenceUpdater
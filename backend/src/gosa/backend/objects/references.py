@@ -0,0 +1,215 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+"""
+The reference updater collects changes of reference attributes (e.g. the members
+of a group) for many objects and writes them directly to the backends, instead
+of opening and committing every single referencing object.
+
+    >>> updater = ReferenceUpdater()
+    >>> updater.replace_value("cn=Group,ou=groups,dc=example,dc=net", "member", old_dn, new_dn)
+    >>> for dn, attribute, change in updater.apply():
+    >>>     ... # handle the remaining changes the usual way
+"""
+from collections import OrderedDict
+from logging import getLogger
+
+import zope.event
+from ldap.dn import str2dn
+import ldap
+
+from gosa.common.components import PluginRegistry
+from gosa.backend.objects.backend import ObjectBackend
+from gosa.backend.objects.backend.registry import ObjectBackendRegistry
+
+
+class ReferenceUpdater(object):
+    """
+    Collects value changes of reference attributes and applies them in bulk.
+
+    A change is only written directly to the backend if the object does not need
+    to process it: the attribute must be a plain (string) attribute stored in a
+    single backend without filters, validators, dependencies or update hooks.
+    All other changes are returned by :meth:`apply` and need to be
+    handled by opening the object.
+
+    :param skip_backend_writes: list of backends that must not be written to
+    """
+    direct_types = ["String", "UnicodeString"]
+
+    def __init__(self, skip_backend_writes=None):
+        self.log = getLogger(__name__)
+        self.__skip_backend_writes = skip_backend_writes or []
+        self.__changes = OrderedDict()
+
+    def __get_change(self, dn, attribute):
+        if dn not in self.__changes:
+            self.__changes[dn] = OrderedDict()
+        if attribute not in self.__changes[dn]:
+            self.__changes[dn][attribute] = {'set': None, 'remove': [], 'add': []}
+        return self.__changes[dn][attribute]
+
+    def set_value(self, dn, attribute, value):
+        """ Replace the complete value of the attribute (None removes the attribute) """
+        change = self.__get_change(dn, attribute)
+        change['set'] = [value] if value is not None else []
+        change['remove'] = []
+        change['add'] = []
+
+    def replace_value(self, dn, attribute, old_value, new_value):
+        """ Replace a single value of the attribute """
+        self.remove_value(dn, attribute, old_value)
+        self.add_value(dn, attribute, new_value)
+
+    def remove_value(self, dn, attribute, value):
+        change = self.__get_change(dn, attribute)
+        if change['set'] is not None:
+            change['set'] = [x for x in change['set'] if x != value]
+        elif value in change['add']:
+            change['add'].remove(value)
+        elif value not in change['remove']:
+            change['remove'].append(value)
+
+    def add_value(self, dn, attribute, value):
+        change = self.__get_change(dn, attribute)
+        if change['set'] is not None:
+            if value not in change['set']:
+                change['set'].append(value)
+        elif value in change['remove']:
+            change['remove'].remove(value)
+        elif value not in change['add']:
+            change['add'].append(value)
+
+    @staticmethod
+    def __get_factory():
+        # imported here to avoid a circular import, the factory depends on the objects
+        from gosa.backend.objects.factory import ObjectFactory
+        return ObjectFactory.getInstance()
+
+    def __get_direct_backend(self, entry, attribute, change, hooks):
+        """
+        Returns the backend name and type the change can be written to directly, or None.
+        """
+        factory = self.__get_factory()
+
+        # The attribute is defined by the base type or an active extension
+        attrs = factory.get_attributes_by_object(entry['_type'])
+        if attribute not in attrs or attrs[attribute]['base'] is None:
+            return None
+        owner = attrs[attribute]['base']
+        if owner != entry['_type'] and owner not in entry['_extensions']:
+            return None
+
+        props = factory.getObjectProperties(owner)
+        prop = props[attribute]
+        if prop['foreign'] or prop['readonly'] or prop['auto'] or len(prop['in_filter']) or len(prop['out_filter']) \
+                or prop['validator'] or len(prop['backend']) != 1 or prop['type'] not in self.direct_types \
+                or prop['backend_type'] != prop['type']:
+            return None
+
+        # Removing the last value of mandatory attributes must be checked by the object
+        if prop['mandatory'] and (change['set'] == [] or (change['set'] is None and len(change['remove']) and not len(change['add']))):
+            return None
+
+        # Other attributes of the base type or any active extension might be calculated
+        # from this one or have update hooks for it
+        for object_type in [entry['_type']] + list(entry['_extensions']):
+            for other in factory.getObjectProperties(object_type).values():
+                if attribute in other['depends_on']:
+                    return None
+
+            if object_type not in hooks:
+                hooks[object_type] = factory.getUpdateHooks(object_type)
+            if attribute in hooks[object_type]:
+                return None
+
+        # RDN changes are moves
+        if attribute.lower() in [x[0].lower() for x in str2dn(entry['dn'], flags=ldap.DN_FORMAT_LDAPV3)[0]]:
+            return None
+
+        backend = prop['backend'][0]
+        if backend in self.__skip_backend_writes:
+            return None
+        be = ObjectBackendRegistry.getBackend(backend)
+        if type(be).update_values is ObjectBackend.update_values:
+            return None
+
+        return backend, prop['backend_type']
+
+    def apply(self):
+        """
+        Write all collected changes that can be written directly to the backends
+        and trigger one index update per changed object.
+
+        :return: list of (dn, attribute, change) tuples, that have not been written
+        """
+        from gosa.backend.objects.object import ObjectChanged
+
+        remaining = []
+        if not len(self.__changes):
+            return remaining
+
+        index = PluginRegistry.getInstance("ObjectIndex")
+        entries = {}
+        for entry in index.search({'dn': {'in_': list(self.__changes.keys())}}, {'dn': 1, '_type': 1, '_uuid': 1}):
+            entries[entry['dn']] = entry
+
+        # Collect the backend modifications
+        hooks = {}
+        direct = {}
+        for dn, attributes in self.__changes.items():
+            entry = entries.get(dn)
+            for attribute, change in attributes.items():
+                # Nothing left to do (e.g. a value has been replaced by itself)
+                if change['set'] is None and not len(change['remove']) and not len(change['add']):
+                    continue
+
+                target = None
+                if entry is not None:
+                    target = self.__get_direct_backend(entry, attribute, change, hooks)
+
+                if target is None:
+                    remaining.append((dn, attribute, change))
+                    continue
+
+                backend, backend_type = target
+                if backend not in direct:
+                    direct[backend] = OrderedDict()
+                if dn not in direct[backend]:
+                    direct[backend][dn] = {}
+                direct[backend][dn][attribute] = {
+                    'type': backend_type,
+                    'replace': change['set'],
+                    'remove': change['remove'],
+                    'add': change['add']}
+
+        # Write the modifications in one batch per backend
+        updated = OrderedDict()
+        for backend, changes in direct.items():
+            be = ObjectBackendRegistry.getBackend(backend)
+            failed = be.update_values(changes)
+            self.log.debug("updated references of %s objects in backend %s" % (len(changes) - len(failed), backend))
+
+            for dn, attributes in changes.items():
+                if dn in failed:
+                    for attribute in attributes:
+                        remaining.append((dn, attribute, self.__changes[dn][attribute]))
+                else:
+                    if dn not in updated:
+                        updated[dn] = []
+                    updated[dn].extend(attributes.keys())
+
+        # Update the index and inform the clients
+        for dn, attributes in updated.items():
+            entry = entries[dn]
+            zope.event.notify(ObjectChanged("post object update", dn=dn, uuid=entry['_uuid'], orig_dn=dn,
+                                            o_type=entry['_type'], changed_props=attributes))
+
+        self.__changes.clear()
+        return remaining
@@ -0,0 +1,233 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+"""
+Object snapshots are read-only views of indexed objects. They are served
+straight from the object index and are much cheaper than opening an
+:class:`gosa.backend.objects.proxy.ObjectProxy`, if only indexed attribute
+values are required.
+
+    >>> snapshots = ObjectSnapshot.load(["cn=Frank Reich,ou=people,dc=example,dc=net", uuid], user="admin")
+    >>> snapshots[uuid].sn
+    'Reich'
+    >>> snapshots[uuid].asJSON()
+    >>> ObjectSnapshot.query({'_type': 'Device', 'deviceUUID': {'in_': [...]}}, attributes=["deviceStatus"])
+"""
+import time
+from collections import OrderedDict
+
+from gosa.common import Environment
+from gosa.common.components import PluginRegistry
+from gosa.common.error import GosaErrorHandler as C
+from gosa.common.utils import is_uuid
+from gosa.backend.exceptions import ConversationNotSupported
+
+
+class ObjectSnapshot(object):
+    """
+    Read-only view of an indexed object. The attribute names are the same as
+    used by :meth:`gosa.backend.objects.proxy.ObjectProxy.asJSON`, reading an
+    attribute returns the same value as the ObjectProxy does.
+
+    Snapshots should be created by :meth:`ObjectSnapshot.load` or :meth:`ObjectSnapshot.query`.
+    """
+
+    def __init__(self, entry, values, single_valued):
+        self.dn = entry['dn']
+        self.uuid = entry['_uuid']
+        self.__entry = entry
+        self.__values = values
+        self.__single_valued = single_valued
+
+    def get_base_type(self):
+        return self.__entry['_type']
+
+    def get_extensions(self):
+        return self.__entry['_extensions']
+
+    def is_extended_by(self, extension):
+        return extension in self.__entry['_extensions']
+
+    def get_parent_dn(self):
+        return self.__entry.get('_parent_dn')
+
+    def get_adjusted_parent_dn(self):
+        return self.__entry.get('_adjusted_parent_dn')
+
+    def get_attributes(self):
+        return list(self.__values.keys())
+
+    def get(self, name, default=None):
+        if name not in self.__values:
+            return default
+
+        value = self.__values[name]
+        if name in self.__single_valued:
+            return value[0] if len(value) else None
+        return value
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        if name not in self.__values:
+            raise AttributeError(C.make_error('ATTRIBUTE_NOT_FOUND', name))
+        return self.get(name)
+
+    def asJSON(self):
+        res = dict(self.__entry)
+        res.update(self.__values)
+        return res
+
+    @staticmethod
+    def query(query, user=None, attributes=None):
+        """
+        Load the snapshots of the objects matching an index query.
+
+        ========== ============
+        Parameter  Description
+        ========== ============
+        query      Query for :meth:`gosa.backend.objects.index.ObjectIndex.search`
+        user       Only return the attributes and objects this user is allowed to read
+        attributes List of attribute names to load (default: all)
+        ========== ============
+
+        ``Return``: list of :class:`ObjectSnapshot`, objects that are not readable are skipped
+        """
+        properties = dict([(x, 1) for x in ["dn"] + list(attributes)]) if attributes is not None else None
+        index = PluginRegistry.getInstance("ObjectIndex")
+        converter = _SnapshotConverter(user, attributes)
+
+        res = []
+        for entry in index.search(query, properties):
+            snapshot = converter.convert(entry)
+            if snapshot is not None:
+                res.append(snapshot)
+        return res
+
+    @staticmethod
+    def load(ids, user=None, attributes=None):
+        """
+        Load the snapshots of many objects with one index query.
+
+        ========== ============
+        Parameter  Description
+        ========== ============
+        ids        List of DNs and/or UUIDs
+        user       Only return the attributes and objects this user is allowed to read
+        attributes List of attribute names to load (default: all)
+        ========== ============
+
+        ``Return``: dict of id: :class:`ObjectSnapshot`, objects that are unknown or not readable are skipped
+        """
+        res = OrderedDict()
+        uuids = [x for x in ids if is_uuid(x)]
+        dns = [x for x in ids if not is_uuid(x)]
+
+        query = {}
+        if len(dns):
+            query['dn'] = {'in_': dns}
+        if len(uuids):
+            query['uuid'] = {'in_': uuids}
+        if not len(query):
+            return res
+        if len(query) > 1:
+            query = {'or_': query}
+
+        snapshots = {}
+        for snapshot in ObjectSnapshot.query(query, user=user, attributes=attributes):
+            snapshots[snapshot.dn] = snapshot
+            snapshots[snapshot.uuid] = snapshot
+
+        for _id in ids:
+            if _id in snapshots:
+                res[_id] = snapshots[_id]
+
+        return res
+
+
+class _SnapshotConverter(object):
+    """
+    Converts index entries into typed and ACL filtered snapshots. The type and
+    ACL lookups are cached per object type.
+    """
+
+    def __init__(self, user, attributes=None):
+        from gosa.backend.objects.factory import ObjectFactory
+        self.env = Environment.getInstance()
+        self.factory = ObjectFactory.getInstance()
+        self.atypes = self.factory.getAttributeTypes()
+        self.object_types = self.factory.getObjectTypes()
+        self.acl_resolver = PluginRegistry.getInstance("ACLResolver")
+        self.user = user if user is not None and not self.acl_resolver.isAdmin(user) else None
+        self.attributes = set(attributes) if attributes is not None else None
+        self.__owners = {}
+        self.__types = {}
+
+    def get_owner(self, object_type, attr):
+        if object_type not in self.__owners:
+            self.__owners[object_type] = self.factory.getAttributeTypeMap(object_type)
+        return self.__owners[object_type].get(attr)
+
+    def get_types(self, owner):
+        """ ``Return``: dict of attribute name: (type, multivalue flag) """
+        if owner not in self.__types:
+            self.__types[owner] = dict([(name, (prop['type'], prop['multivalue'])) for name, prop in
+                                        self.factory.getObjectProperties(owner).items()])
+        return self.__types[owner]
+
+    def can_read(self, dn, topic):
+        return self.user is None or self.acl_resolver.check(self.user, topic, "r", base=dn)
+
+    def convert(self, entry):
+        object_type = entry['_type']
+        if not self.can_read(entry['dn'], "%s.objects.%s" % (self.env.domain, object_type)):
+            return None
+
+        meta = {}
+        values = {}
+        single_valued = set()
+        for key, value in entry.items():
+            if key == "dn" or key.startswith("_"):
+                meta[key] = value
+                continue
+
+            # attributes without owner (e.g. of the search object) are checked for the base type
+            owner = self.get_owner(object_type, key) or object_type
+            if not self.can_read(entry['dn'], "%s.objects.%s.attributes.%s" % (self.env.domain, owner, key)):
+                continue
+
+            attr_type, multivalue = self.get_types(owner).get(key, (None, True))
+            if attr_type is not None and attr_type not in ["String", "UnicodeString"]:
+                try:
+                    value = self.atypes[attr_type].convert_from("UnicodeString", value)
+                except (ConversationNotSupported, ValueError):
+                    pass
+            values[key] = value
+            if not multivalue:
+                single_valued.add(key)
+
+        # attributes without values are not indexed, but they exist like in the ObjectProxy
+        for owner in [object_type] + list(entry.get('_extensions', [])):
+            for key, (attr_type, multivalue) in self.get_types(owner).items():
+                if key in values or (self.attributes is not None and key not in self.attributes):
+                    continue
+                if not self.can_read(entry['dn'], "%s.objects.%s.attributes.%s" % (self.env.domain, owner, key)):
+                    continue
+                values[key] = []
+                if not multivalue:
+                    single_valued.add(key)
+
+        # same format as ObjectProxy.asJSON
+        if meta.get('_last_changed') is not None:
+            meta['_last_changed'] = time.mktime(meta['_last_changed'].timetuple())
+        if object_type in self.object_types:
+            meta['_invisible'] = self.object_types[object_type]['invisible']
+
+        return ObjectSnapshot(meta, values, single_valued)
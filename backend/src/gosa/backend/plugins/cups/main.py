@@ -24,6 +24,7 @@ from zope.interface import implementer
 from gosa.backend.components.httpd import get_server_url
 from gosa.backend.exceptions import EntryNotFound
 from gosa.backend.objects import ObjectProxy
+from gosa.backend.plugins.cups.route import PPDHandler
 from gosa.common.error import GosaErrorHandler as C
 from gosa.common import Environment
 from gosa.common.components import Plugin, Command, PluginRegistry
@@ -121,6 +122,9 @@ class CupsClient(Plugin):
                     # no entry -> delete file if it has not been changed in the last hour
                     self.log.debug("deleting obsolete PPD file: %s" % ppd_file)
                     os.unlink(ppd_file)
+                    # compressed copy served by the PPDHandler
+                    if os.path.exists("%s.gz" % ppd_file):
+                        os.unlink("%s.gz" % ppd_file)
 
     @Command(__help__=N_("Write a general PPD file to the cups pool"))
     def uploadPPD(self, obj, data):
@@ -248,9 +252,12 @@ class CupsClient(Plugin):
                 if len(res) == 0:
                     # delete file
                     os.unlink(custom_ppd_file)
+                    if os.path.exists("%s.gz" % custom_ppd_file):
+                        os.unlink("%s.gz" % custom_ppd_file)
 
             with open(new_file, "w") as f:
                 f.write(result)
+            PPDHandler.compress(new_file)
 
             return {
                 "gotoPrinterPPD": ["%s/ppd/modified/%s.ppd" % (get_server_url(), hash)],
@@ -6,18 +6,110 @@
 #  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
 #
 # See the LICENSE file in the project's top-level directory for details.
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from uuid import uuid4
+
+from tornado.ioloop import IOLoop
+
 from gosa.common import Environment
 from gosa.common.hsts_request_handler import HSTSStaticFileHandler
 
 
 class PPDHandler(HSTSStaticFileHandler):
+    """
+    Serves the PPD files from the ``cups.spool`` directory.
+
+    * The ETag is the SHA-256 hash of the file and is only computed again when the file changes,
+      requests with a matching ``If-None-Match`` header are answered with ``304 Not Modified``.
+    * Clients accepting gzip get the compressed copy stored next to the PPD file. The copy is
+      created by :meth:`compress` when the PPD is written, a missing or outdated copy is created
+      in a worker thread while the request is answered uncompressed.
+    * The files are streamed in chunks and never read into memory as a whole.
+    """
     dir = None
+    # absolute path -> ((mtime, size), etag)
+    __etags = {}
+    # absolute paths currently compressed in a worker thread
+    __compressing = set()
+    __lock = threading.Lock()
 
     def initialize(self):
         env = Environment.getInstance()
         self.dir = env.config.get("cups.spool", default="/tmp/spool")
+        self.gzip = False
         super(PPDHandler, self).initialize(self.dir)
 
-    def get(self, path, include_body=True):
-        self.set_header("Content-Type", "application/vnd.cups-ppd")
-        super(PPDHandler, self).get(path, include_body)
+    def get_content_type(self):
+        return "application/vnd.cups-ppd"
+
+    def validate_absolute_path(self, root, absolute_path):
+        absolute_path = super(PPDHandler, self).validate_absolute_path(root, absolute_path)
+        if absolute_path is not None and "gzip" in self.request.headers.get("Accept-Encoding", ""):
+            compressed = "%s.gz" % absolute_path
+            if os.path.exists(compressed) and os.path.getmtime(compressed) >= os.path.getmtime(absolute_path):
+                self.gzip = True
+                return compressed
+            self.compress_later(absolute_path)
+        return absolute_path
+
+    @classmethod
+    def compress_later(cls, absolute_path):
+        """ Create the compressed copy of a file in a worker thread, the IOLoop is not blocked """
+        with cls.__lock:
+            if absolute_path in cls.__compressing:
+                return
+            cls.__compressing.add(absolute_path)
+
+        def done(future):
+            with cls.__lock:
+                cls.__compressing.discard(absolute_path)
+
+        IOLoop.current().run_in_executor(None, cls.compress, absolute_path).add_done_callback(done)
+
+    @staticmethod
+    def compress(absolute_path):
+        """
+        Write the gzip compressed copy of a file, which is served to clients accepting gzip.
+        Must be called whenever a PPD file in the spool directory is written.
+
+        ``Return:`` path of the compressed copy or None if it could not be written
+        """
+        compressed = "%s.gz" % absolute_path
+        temp_file = "%s.%s" % (compressed, uuid4().hex)
+        try:
+            with open(absolute_path, "rb") as source, gzip.open(temp_file, "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.replace(temp_file, compressed)
+        except OSError as e:
+            logging.getLogger(__name__).error("cannot compress PPD file %s: %s" % (absolute_path, str(e)))
+            if os.path.exists(temp_file):
+                os.unlink(temp_file)
+            return None
+        return compressed
+
+    def compute_etag(self):
+        stat = os.stat(self.absolute_path)
+        version = (stat.st_mtime, stat.st_size)
+        with self.__lock:
+            cached = self.__etags.get(self.absolute_path)
+
+        if cached is None or cached[0] != version:
+            hasher = hashlib.sha256()
+            with open(self.absolute_path, "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    hasher.update(chunk)
+            cached = (version, '"%s"' % hasher.hexdigest())
+            with self.__lock:
+                self.__etags[self.absolute_path] = cached
+
+        return cached[1]
+
+    def set_extra_headers(self, path):
+        self.set_header("Vary", "Accept-Encoding")
+        if self.gzip is True:
+            self.set_header("Content-Encoding", "gzip")
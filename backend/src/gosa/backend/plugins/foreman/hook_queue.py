@@ -0,0 +1,267 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+"""
+The hook queue decouples the processing of foreman hook events from the HTTP
+request that delivered them. Events are stored in the database until they
+have been applied, so they survive a restart of the backend. Events that could
+not be applied are kept and processed again after the next restart.
+"""
+import datetime
+import time
+from collections import OrderedDict, deque
+from logging import getLogger
+from threading import Condition, Lock, Thread
+
+import sqlalchemy
+from sqlalchemy import Column, String, Integer, DateTime, Sequence, JSON
+
+from gosa.backend.lock import GlobalLock
+from gosa.common import Environment
+from gosa.common.env import declarative_base, make_session
+
+Base = declarative_base()
+
+
+class ForemanHookEvent(Base):
+    __tablename__ = 'foreman-hook-events'
+
+    id = Column(Integer, Sequence('foreman_hook_event_id_seq'), primary_key=True, nullable=False)
+    key = Column(String)
+    data = Column(JSON)
+    received = Column(DateTime)
+
+    def __repr__(self):  # pragma: nocover
+        return "<ForemanHookEvent(id='%s', key='%s', received='%s')>" % (self.id, self.key, self.received)
+
+
+class ForemanHookQueueFull(Exception):
+    pass
+
+
+class ForemanHookQueue(object):
+    """
+    Bounded queue of foreman hook events, that are processed by worker threads.
+
+    * Events of the same object are processed in the order they have been received, never in parallel.
+    * A pending ``after_commit`` event is dropped, when a newer ``after_commit`` or ``after_destroy``
+      event for the same object arrives, as foreman always sends the complete object. The ``after_commit``
+      event foreman sends after an ``after_destroy`` event is kept, as the handler skips it.
+    * No event is processed while the index is scanned or ``blocked`` returns True (e.g. during a
+      full sync), the workers wait until the events can be applied.
+
+    Keys for configuration section **foreman**
+
+    +------------------+------------+-------------------------------------------------------------+
+    + Key              | Format     +  Description                                                |
+    +==================+============+=============================================================+
+    + hook-workers     | Integer    + Number of threads processing hook events (default: 2)       |
+    +------------------+------------+-------------------------------------------------------------+
+    + hook-queue-size  | Integer    + Maximum number of pending hook events (default: 10000)      |
+    +------------------+------------+-------------------------------------------------------------+
+
+    :param handler: function that processes the event data
+    :param blocked: optional function, the events are not processed while it returns True
+    :param keep: optional function, pending events it returns True for are never dropped
+                 (e.g. the events the handler is going to skip)
+    """
+    superseded_events = ["after_commit"]
+    superseding_events = ["after_commit", "after_destroy"]
+
+    def __init__(self, handler, blocked=None, keep=None):
+        self.env = Environment.getInstance()
+        self.log = getLogger(__name__)
+        self.__handler = handler
+        self.__blocked = blocked
+        self.__keep = keep
+        self.workers = self.env.config.getint("foreman.hook-workers", default=2)
+        self.size = self.env.config.getint("foreman.hook-queue-size", default=10000)
+
+        self.__condition = Condition()
+        # serializes the producers, so that the database is not written while holding the condition
+        self.__put_lock = Lock()
+        self.__pending = OrderedDict()
+        self.__ready = deque()
+        # key: data of the event that is being processed
+        self.__active = {}
+        self.__depth = 0
+        self.__threads = []
+        self.__started = False
+        self.__latencies = deque(maxlen=1000)
+        self.__stats = {'received': 0, 'superseded': 0, 'processed': 0, 'failed': 0, 'max_depth': 0}
+
+    @staticmethod
+    def get_key(data):
+        """ Identifies the object the event belongs to """
+        object_type = list(data["data"].keys())[0] if isinstance(data.get("data"), dict) and len(data["data"]) == 1 else ""
+        if object_type == "discovered_host":
+            object_type = "host"
+        return "%s/%s" % (object_type, data.get("object"))
+
+    def start(self):
+        """ Start the workers and re-queue the events that have not been processed before the last shutdown """
+        with self.__condition:
+            if self.__started is True:
+                return
+
+            try:
+                Base.metadata.create_all(self.env.getDatabaseEngine("backend-database"), tables=[ForemanHookEvent.__table__])
+            except (sqlalchemy.exc.ProgrammingError, sqlalchemy.exc.IntegrityError):
+                # already exists
+                pass
+
+            with make_session() as session:
+                for event in session.query(ForemanHookEvent).order_by(ForemanHookEvent.id):
+                    self.__append(event.key, event.id, event.data, time.mktime(event.received.timetuple()))
+            if self.__depth > 0:
+                self.log.info("re-queued %s unprocessed foreman hook events" % self.__depth)
+
+            for i in range(self.workers):
+                thread = Thread(target=self.__work, name="ForemanHookQueue-%s" % i)
+                thread.daemon = True
+                thread.start()
+                self.__threads.append(thread)
+            self.__started = True
+
+    def __append(self, key, event_id, data, received):
+        if key not in self.__pending:
+            self.__pending[key] = deque()
+        self.__pending[key].append((event_id, data, received))
+        self.__depth += 1
+        self.__stats['max_depth'] = max(self.__stats['max_depth'], self.__depth)
+        if key not in self.__active and key not in self.__ready:
+            self.__ready.append(key)
+
+    def __get_superseded(self, key, data):
+        """ Returns the pending events of the object that are outdated by the given event """
+        if data.get("event") not in self.superseding_events:
+            return []
+
+        if self.__active.get(key, {}).get("event") == "after_destroy":
+            # the next after_commit event is skipped after the object has been removed
+            return []
+
+        res = []
+        for entry in self.__pending.get(key, []):
+            if entry[1].get("event") == "after_destroy":
+                # keep the after_commit events that follow the removal
+                break
+            if entry[1].get("event") in self.superseded_events and (self.__keep is None or not self.__keep(entry[1])):
+                res.append(entry)
+        return res
+
+    def put(self, data):
+        """
+        Queue a hook event.
+
+        :raises ForemanHookQueueFull: if ``foreman.hook-queue-size`` events are pending
+        """
+        self.start()
+        key = self.get_key(data)
+
+        with self.__put_lock:
+            with self.__condition:
+                self.__stats['received'] += 1
+
+                # drop the pending events that are outdated by this one
+                pending = self.__pending.get(key, [])
+                superseded = self.__get_superseded(key, data)
+
+                if self.__depth - len(superseded) >= self.size:
+                    raise ForemanHookQueueFull()
+
+                for entry in superseded:
+                    pending.remove(entry)
+                self.__depth -= len(superseded)
+                self.__stats['superseded'] += len(superseded)
+                superseded = [x[0] for x in superseded]
+
+            with make_session() as session:
+                if len(superseded):
+                    session.query(ForemanHookEvent).filter(ForemanHookEvent.id.in_(superseded)).delete(synchronize_session=False)
+                event = ForemanHookEvent(key=key, data=data, received=datetime.datetime.now())
+                session.add(event)
+                session.commit()
+                event_id = event.id
+
+            with self.__condition:
+                self.__append(key, event_id, data, time.time())
+                self.__condition.notify_all()
+
+    def __is_blocked(self):
+        return GlobalLock.exists("scan_index") or (self.__blocked is not None and self.__blocked() is True)
+
+    def __work(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: len(self.__ready))
+                key = self.__ready.popleft()
+                event_id, data, received = self.__pending[key].popleft()
+                self.__active[key] = data
+
+            while self.__is_blocked():
+                # wait until the index is ready and the sync is done, the key is kept
+                # active, so that the events of this object stay in order
+                time.sleep(1)
+
+            success = True
+            try:
+                self.__handler(data)
+            except Exception as e:
+                success = False
+                self.log.error("Error during webhook processing, keeping foreman hook event %s until the next start: %s" %
+                               (event_id, str(e)))
+
+            if success is True:
+                try:
+                    # older events of this object that have failed are outdated now
+                    with make_session() as session:
+                        session.query(ForemanHookEvent).filter(ForemanHookEvent.key == key, ForemanHookEvent.id <= event_id)\
+                            .delete(synchronize_session=False)
+                        session.commit()
+                except Exception as e:
+                    self.log.error("cannot remove processed foreman hook event %s: %s" % (event_id, str(e)))
+
+            with self.__condition:
+                del self.__active[key]
+                self.__depth -= 1
+                self.__latencies.append(time.time() - received)
+                self.__stats['processed' if success else 'failed'] += 1
+                if len(self.__pending[key]):
+                    self.__ready.append(key)
+                else:
+                    del self.__pending[key]
+                self.__condition.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Wait until all queued events have been processed.
+
+        :return: False if the timeout has been reached
+        """
+        with self.__condition:
+            return self.__condition.wait_for(lambda: self.__depth == 0, timeout=timeout)
+
+    def get_statistics(self):
+        """
+        ``Return``: dict with the current queue depth, counters and the 50th/90th/99th percentile
+        of the time (ms) between receiving and processing the events
+        """
+        with self.__condition:
+            res = dict(self.__stats)
+            res['depth'] = self.__depth
+            res['active'] = len(self.__active)
+            latencies = sorted(self.__latencies)
+
+        for percentile in [50, 90, 99]:
+            value = None
+            if len(latencies):
+                value = round(latencies[max(0, -(-percentile * len(latencies) // 100) - 1)] * 1000, 3)
+            res['latency_p%s' % percentile] = value
+        return res
@@ -11,8 +11,10 @@ import collections
 import datetime
 import hashlib
 import logging
+import time
 import uuid
 import sys
+from threading import RLock
 
 import ldap
 from ldap.dn import dn2str, str2dn
@@ -40,6 +42,8 @@ from gosa.common.utils import N_, generate_random_key, cache_return
 from gosa.common.components import PluginRegistry
 from gosa.common.gjson import loads, dumps
 from base64 import b64encode as encode
+from gosa.backend.objects.backend.registry import ObjectBackendRegistry
+from gosa.backend.plugins.foreman.hook_queue import ForemanHookQueue, ForemanHookQueueFull
 from gosa.backend.objects.backend.back_foreman import Foreman as ForemanBackend, ForemanClient, ForemanBackendException, ForemanClientCache
 
 C.register_codes(dict(
@@ -53,6 +57,68 @@ C.register_codes(dict(
 ))
 
 
+def get_payload_hash(filtered_payload):
+    """ Hash of the foreman attributes of an object, used to detect changes """
+    dump = ""
+    for key in sorted(filtered_payload):
+        dump += "%s=%s," % (key, filtered_payload[key])
+    md5s = hashlib.md5()
+    md5s.update(dump.encode('utf-8'))
+    return md5s.hexdigest()
+
+
+class PayloadHashes(object):
+    """
+    In-memory cache of the payload hashes stored in the ``Schema`` table (type ``<uuid>|Foreman``).
+    """
+    __hashes = {}
+    __lock = RLock()
+
+    @staticmethod
+    def get(uuid):
+        return PayloadHashes.get_many([uuid]).get(uuid)
+
+    @staticmethod
+    def get_many(uuids):
+        """ ``Return``: dict of uuid: hash for all uuids that have a stored hash """
+        with PayloadHashes.__lock:
+            missing = [x for x in uuids if x not in PayloadHashes.__hashes]
+            if len(missing):
+                for uuid in missing:
+                    PayloadHashes.__hashes[uuid] = None
+
+                keys = ['%s|Foreman' % x for x in missing]
+                with make_session() as session:
+                    for i in range(0, len(keys), 500):
+                        for schema in session.query(Schema).filter(Schema.type.in_(keys[i:i + 500])):
+                            PayloadHashes.__hashes[schema.type[:-len("|Foreman")]] = schema.hash
+
+            return {x: PayloadHashes.__hashes[x] for x in uuids if PayloadHashes.__hashes[x] is not None}
+
+    @staticmethod
+    def set(uuid, hash):
+        with PayloadHashes.__lock:
+            with make_session() as session:
+                session.merge(Schema(type='%s|Foreman' % uuid, hash=hash))
+                session.commit()
+            PayloadHashes.__hashes[uuid] = hash
+
+    @staticmethod
+    def remove(uuids):
+        with PayloadHashes.__lock:
+            with make_session() as session:
+                session.query(Schema).filter(Schema.type.in_(['%s|Foreman' % x for x in uuids])).delete(synchronize_session=False)
+                session.commit()
+            for uuid in uuids:
+                PayloadHashes.__hashes[uuid] = None
+
+    @staticmethod
+    def clear():
+        """ Drop the cached values, e.g. after the hashes have been changed in the database """
+        with PayloadHashes.__lock:
+            PayloadHashes.__hashes = {}
+
+
 @implementer(IInterfaceHandler)
 class Foreman(Plugin):
     """
@@ -93,6 +159,7 @@ class Foreman(Plugin):
             self.type_bases["ForemanHostGroup"] = self.env.base
 
         self.__marked_hosts = {}
+        self.sync_statistics = {}
         if self.env.config.get("foreman.host") is None:
             self.log.warning("no foreman host configured")
         else:
@@ -150,17 +217,27 @@ class Foreman(Plugin):
         """
         if event.__class__.__name__ == "IndexScanFinished":
             self.log.info("index scan finished, triggered foreman sync")
-            self.__full_sync()
+            # the objects might have been changed without the hooks, so every object is updated
+            self.__full_sync(force=True)
 
-    def __full_sync(self):
+        elif event.__class__.__name__ == "ObjectChanged" and event.reason in ["post update", "post remove"] and \
+                event.uuid is not None and event.o_type in self.factory.getObjectTypes():
+            # the object might not match the last applied foreman data anymore, hook events and syncs
+            # store the hash again after their own changes have been committed
+            if "Foreman" in self.factory.getObjectBackendProperties(event.o_type) and PayloadHashes.get(event.uuid) is not None:
+                PayloadHashes.remove([event.uuid])
+
+    def __full_sync(self, force=False):
         Foreman.syncing = True
         try:
+            # the index might have dropped the stored hashes
+            PayloadHashes.clear()
             self.create_container()
 
             self.sync_release_names()
 
-            self.sync_type("ForemanHostGroup")
-            self.sync_type("ForemanHost")
+            self.sync_type("ForemanHostGroup", force=force)
+            self.sync_type("ForemanHost", force=force)
 
             # read discovered hosts
             self.sync_type("ForemanHost", "discovered_hosts")
@@ -178,6 +255,7 @@ class Foreman(Plugin):
             sobj = PluginRegistry.getInstance("SchedulerService")
             sobj.getScheduler().add_date_job(self.__full_sync,
                                              datetime.datetime.now() + datetime.timedelta(minutes=self.__sync_retry_interval),
+                                             kwargs={"force": force},
                                              tag='_internal', jobstore='ram')
             self.__sync_retry_interval *= min(2, 60)
 
@@ -201,8 +279,18 @@ class Foreman(Plugin):
             ou = ObjectProxy(self.type_bases["ForemanHostGroup"], "GroupContainer")
             ou.commit()
 
-    def sync_type(self, object_type, foreman_type=None):
-        """ sync foreman objects, request data from foreman API and apply those values to the object """
+    def sync_type(self, object_type, foreman_type=None, force=False):
+        """
+        sync foreman objects, request data from foreman API and apply those values to the object
+
+        Unless ``force`` is set, objects whose foreman data has not changed since it has been applied the last
+        time (by a sync or a hook event) and that have not been changed in GOsa since then are skipped without
+        opening them. The changed objects are applied one after another, as opening and committing them
+        is not thread-safe.
+
+        :return: dict with the number of synced, skipped, changed and removed objects and the duration (seconds)
+        """
+        start = time.time()
         index = PluginRegistry.getInstance("ObjectIndex")
         backend_attributes = self.factory.getObjectBackendProperties(object_type)
 
@@ -213,47 +301,86 @@ class Foreman(Plugin):
         if foreman_type is None:
             foreman_type = backend_attributes["Foreman"]["type"]
 
-        new_data = self.client.get(foreman_type)
-        found_ids = []
-
         uuid_attribute = backend_attributes["Foreman"]["_uuidSourceAttribute"] \
             if '_uuidSourceAttribute' in backend_attributes["Foreman"] else backend_attributes["Foreman"]["_uuidAttribute"]
-
-        for data in new_data["results"]:
-            found_ids.append(str(data[uuid_attribute]))
-            self.log.debug(">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>")
-            self.log.debug(">>> START syncing foreman object of type '%s' with id '%s'" % (object_type, data[uuid_attribute]))
-            foreman_object, delay_update = self.get_object(object_type, data[uuid_attribute], data=data)
-            if foreman_type == "discovered_hosts":
-                # add status to data
-                if not foreman_object.is_extended_by("ForemanHost"):
-                    foreman_object.extend("ForemanHost")
-                foreman_object.status = "discovered"
-                self.update_type(object_type, foreman_object, data, uuid_attribute)
-            else:
-                self.update_type(object_type, foreman_object, data, uuid_attribute)
-            self.log.debug("<<< DONE syncing foreman object of type '%s' with id '%s'" % (object_type, data[uuid_attribute]))
-            self.log.debug("<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<")
+        id_attribute = backend_attributes["Foreman"]["_uuidAttribute"]
 
         types = self.factory.getObjectTypes()[object_type]
         base_type = object_type if types["base"] is True else types["extends"][0]
 
-        # delete not existing ones
         query = {'_type': base_type}
         if base_type != object_type:
             query["extension"] = object_type
-
-        if len(found_ids):
-            query[backend_attributes["Foreman"]["_uuidAttribute"]] = {'not_in_': found_ids}
         if foreman_type == "discovered_hosts":
             query["status"] = "discovered"
 
-        res = index.search(query, {'dn': 1})
+        # existing objects by their foreman id
+        known = {}
+        for entry in index.search(query, {'dn': 1, id_attribute: 1}):
+            for oid in entry.get(id_attribute, []):
+                known[str(oid)] = entry
 
-        for entry in res:
+        # hashes of the last applied foreman data, discovered hosts are always updated as their data
+        # is modified during the sync
+        hashes = {}
+        if foreman_type != "discovered_hosts" and force is False and len(known):
+            hashes = PayloadHashes.get_many([x['_uuid'] for x in known.values()])
+
+        properties = self.factory.getObjectProperties(object_type)
+        backend_props = [k for k, v in properties.items() if "Foreman" in v["backend"]]
+        stats = {"synced": 0, "skipped": 0, "changed": 0, "removed": 0}
+        found_ids = set()
+
+        for data in self.client.iter_results(foreman_type):
+            oid = str(data[uuid_attribute])
+            found_ids.add(oid)
+            stats["synced"] += 1
+
+            payload_hash = get_payload_hash({k: v for (k, v) in data.items() if k in backend_props})
+            entry = known.get(oid)
+            if entry is not None and hashes.get(entry['_uuid']) == payload_hash:
+                self.log.debug("skipping foreman object of type '%s' with id '%s': no change detected" % (object_type, oid))
+                stats["skipped"] += 1
+                continue
+
+            stats["changed"] += 1
+            self.__sync_object(object_type, foreman_type, uuid_attribute, data, payload_hash)
+
+        # delete not existing ones
+        removed = set()
+        for oid, entry in known.items():
+            if oid in found_ids or entry['dn'] in removed:
+                continue
+            removed.add(entry['dn'])
             foreman_object = ObjectProxy(entry['dn'], open_mode="delete")
             self.log.debug("removing %s '%s'" % (base_type, foreman_object.dn))
             foreman_object.remove(skip_backend_writes=["Foreman"])
+            stats["removed"] += 1
+
+        if len(removed):
+            PayloadHashes.remove([x['_uuid'] for x in known.values() if x['dn'] in removed])
+
+        stats["duration"] = round(time.time() - start, 3)
+        self.log.info("synced %s foreman %s in %ss: %s changed, %s skipped, %s removed" %
+                      (stats["synced"], foreman_type, stats["duration"], stats["changed"], stats["skipped"], stats["removed"]))
+        self.sync_statistics[foreman_type] = stats
+        return stats
+
+    def __sync_object(self, object_type, foreman_type, uuid_attribute, data, payload_hash):
+        self.log.debug(">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>")
+        self.log.debug(">>> START syncing foreman object of type '%s' with id '%s'" % (object_type, data[uuid_attribute]))
+        foreman_object, delay_update = self.get_object(object_type, data[uuid_attribute], data=data)
+        if foreman_type == "discovered_hosts":
+            # add status to data
+            if not foreman_object.is_extended_by("ForemanHost"):
+                foreman_object.extend("ForemanHost")
+            foreman_object.status = "discovered"
+        self.update_type(object_type, foreman_object, data, uuid_attribute)
+
+        if foreman_type != "discovered_hosts" and foreman_object.uuid is not None:
+            PayloadHashes.set(foreman_object.uuid, payload_hash)
+        self.log.debug("<<< DONE syncing foreman object of type '%s' with id '%s'" % (object_type, data[uuid_attribute]))
+        self.log.debug("<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<")
 
     def get_object(self, object_type, oid, create=True, data=None, read_only=False, from_db_only=False):
         backend_attributes = self.factory.getObjectBackendProperties(object_type)
@@ -458,12 +585,13 @@ class Foreman(Plugin):
         Proxies can query their replicated database for them
         """
         if self.client:
-            data = self.client.get("operatingsystems")
-            if "results" in data:
+            # fetch all pages before the database is cleared
+            results = list(self.client.iter_results("operatingsystems"))
+            if self.client.foreman_host is not None:
                 # clear Database
                 with make_session() as session:
                     session.query(Cache).filter((Cache.key.ilike("foreman.operating_system.%"))).delete(synchronize_session='fetch')
-                    for entry in data["results"]:
+                    for entry in results:
                         self.sync_release_name(entry, session)
                     session.commit()
 
@@ -554,17 +682,14 @@ class Foreman(Plugin):
     def __get_hostgroup_key_values(self, path):
         res = {}
         if self.client:
-            data = self.client.get(path)
-
-            if "results" in data:
-                for entry in data["results"]:
-                    name = entry["name"]
-                    parent_id = entry["parent_id"]
-                    while parent_id is not None:
-                        pdata = self.client.get("hostgroups", object_id=parent_id)
-                        name = "%s/%s" % (pdata["name"], name)
-                        parent_id = pdata["parent_id"]
-                    res[entry["id"]] = {"value": name}
+            for entry in self.client.iter_results(path):
+                name = entry["name"]
+                parent_id = entry["parent_id"]
+                while parent_id is not None:
+                    pdata = self.client.get("hostgroups", object_id=parent_id)
+                    name = "%s/%s" % (pdata["name"], name)
+                    parent_id = pdata["parent_id"]
+                res[entry["id"]] = {"value": name}
         return res
 
     @Command(__help__=N_("Get available foreman operating systems."))
@@ -602,11 +727,8 @@ class Foreman(Plugin):
     def __get_key_values(self, type, key_name="id", value_format="{name}"):
         res = {}
         if self.client:
-            data = self.client.get(type)
-
-            if "results" in data:
-                for entry in data["results"]:
-                    res[entry[key_name]] = {"value": value_format.format(**entry)}
+            for entry in self.client.iter_results(type):
+                res[entry[key_name]] = {"value": value_format.format(**entry)}
         return res
 
     @Command(__help__=N_("Get discovered hosts as search key(dn): value(cn) pairs."))
@@ -714,6 +836,20 @@ class Foreman(Plugin):
                 self.log.error("Error requesting foreman setting %s: %s" % (setting_id, e.message))
                 return None
 
+    @Command(__help__=N_("Get statistics of the foreman backend"), type="READONLY")
+    def getForemanStatistics(self):
+        """
+        ``Return:`` dict with the statistics of the foreman write and hook queues, the client cache and the last sync of each type
+        """
+        backend = ObjectBackendRegistry.getBackend("Foreman")
+        res = {"write-queue": backend.queue.get_statistics(), "sync": self.sync_statistics,
+               "client-cache": ForemanClientCache.get_statistics()}
+
+        receiver = PluginRegistry.getInstance("WebhookRegistry").get_handler("application/vnd.foreman.hookevent+json")
+        if receiver is not None:
+            res["hook-queue"] = receiver.queue.get_statistics()
+        return res
+
     def __run_host_command(self, host_id, command, data):
         if self.client:
             self.client.put("hosts/%s" % host_id, command, data)
@@ -922,27 +1058,19 @@ class ForemanRealmReceiver(object):
 class ForemanHookReceiver(object):
     """ Webhook handler for foreman hook events (Content-Type: application/vnd.foreman.hookevent+json) """
     skip_next_event = {}
-    _queued_requests = []
 
     def __init__(self):
         self.type = N_("Foreman hook event")
         self.env = Environment.getInstance()
         self.log = logging.getLogger(__name__)
         self.index = PluginRegistry.getInstance("ObjectIndex")
-
-    def process_queue(self):
-        if Foreman.syncing is True:
-            # still syncing
-            self.log.info("GOsa is currently syncing with Foreman, cannot process the queue now. Waiting 10 seconds...")
-            sobj = PluginRegistry.getInstance("SchedulerService")
-            sobj.getScheduler().add_date_job(self.process_queue,
-                                             datetime.datetime.now() + datetime.timedelta(seconds=10),
-                                             tag='_internal', jobstore='ram')
-            return
-        queue = self._queued_requests
-        self._queued_requests = []
-        for data in queue:
-            self._handle_data(data)
+        # events received during a sync are applied after it
+        self.queue = ForemanHookQueue(self._handle_data, blocked=lambda: Foreman.syncing, keep=self.is_skipped)
+        try:
+            # process the events that have been received before the last shutdown
+            self.queue.start()
+        except Exception as e:
+            self.log.warning("cannot start foreman hook queue yet: %s" % str(e))
 
     def handle_request(self, request_handler):
         if GlobalLock.exists("scan_index"):
@@ -952,58 +1080,52 @@ class ForemanHookReceiver(object):
             return
         data = loads(request_handler.request.body)
         try:
-            # respond before processing to avoid blocking
-            request_handler.finish()
-            self._handle_data(data)
-        except Exception as e:
-            self.log.error("Error during webhook processing: %s" % str(e))
+            # the events are processed by the queue workers to avoid blocking
+            self.queue.put(data)
+        except ForemanHookQueueFull:
+            self.log.error("foreman hook queue is full, rejecting '%s' event for '%s'" % (data.get("event"), data.get("object")))
+            request_handler.set_status(503)
+            request_handler.finish(dumps({
+                "error": "Too many pending events, please try again later"
+            }))
+            return
+        request_handler.finish()
 
     def check_for_change(self, uuid, hash, save_if_changed=True):
         """ Check if the incoming data contains a change we are interested in"""
         changed = False
-        with make_session() as session:
-            hash_entry = session.query(Schema).get('%s|Foreman' % uuid)
-            if hash_entry is None:
-                self.log.debug("no hash entry for UUID: %s" % uuid)
-                changed = True
-            else:
-                self.log.debug("hash entry for UUID %s: %s == %s" % (uuid, hash_entry.hash, hash))
-                changed = hash_entry.hash != hash
+        stored_hash = PayloadHashes.get(uuid)
+        if stored_hash is None:
+            self.log.debug("no hash entry for UUID: %s" % uuid)
+            changed = True
+        else:
+            self.log.debug("hash entry for UUID %s: %s == %s" % (uuid, stored_hash, hash))
+            changed = stored_hash != hash
 
         if save_if_changed is True and changed is True:
             self._save_hash(uuid, hash)
         return changed
 
     def __to_hash(self, filtered_payload):
-        dump = ""
-        for key in sorted(filtered_payload):
-            dump += "%s=%s," % (key, filtered_payload[key])
-        md5s = hashlib.md5()
-        md5s.update(dump.encode('utf-8'))
-        return md5s.hexdigest()
+        return get_payload_hash(filtered_payload)
 
     def _save_hash(self, uuid, hash):
-        with make_session() as session:
-            schema = Schema(type='%s|Foreman' % uuid, hash=hash)
-            session.add(schema)
-            session.commit()
+        PayloadHashes.set(uuid, hash)
+
+    @staticmethod
+    def is_skipped(data):
+        """ Check if the event has been marked for skipping """
+        return data.get("event") in ForemanHookReceiver.skip_next_event and \
+            data.get("object") in ForemanHookReceiver.skip_next_event[data["event"]]
 
     def _handle_data(self, data):
         foreman = PluginRegistry.getInstance("Foreman")
 
-        if Foreman.syncing is True:
-            self.log.error("GOsa is currently syncing with Foreman, all requests are blocked")
-            if len(self._queued_requests) == 0:
-                # add callback
-                foreman.add_after_sync_callback(self.process_queue)
-            self._queued_requests.append(data)
-            return
-
         if self.env.config.get("foreman.event-log") is not None:
             with open(self.env.config.get("foreman.event-log"), "a") as f:
                 f.write("%s,\n" % dumps(data, indent=4, sort_keys=True))
 
-        if data["event"] in ForemanHookReceiver.skip_next_event and data["object"] in ForemanHookReceiver.skip_next_event[data["event"]]:
+        if self.is_skipped(data):
             ForemanHookReceiver.skip_next_event[data["event"]].remove(data["object"])
             self.log.info("skipped '%s' event for object: '%s'" % (data["event"], data["object"]))
             return
@@ -1050,6 +1172,12 @@ class ForemanHookReceiver(object):
         backend_props = [k for k in factory.getObjectProperties(object_type).keys() if "Foreman" in factory.getObjectProperties(object_type)[k]["backend"]]
         filtered_payload = {k: v for (k, v) in payload_data.items() if k in backend_props}
 
+        # the cached foreman responses for this object are outdated
+        if uuid_attribute is not None and uuid_attribute in payload_data:
+            ForemanClientCache.delete_cache("%ss" % foreman_type, object_id=payload_data[uuid_attribute])
+            if foreman_type == "discovered_host":
+                ForemanClientCache.delete_cache("hosts", object_id=payload_data[uuid_attribute])
+
         backend_data = {}
         delay_update = False
         object_uuid = None
@@ -1088,12 +1216,12 @@ class ForemanHookReceiver(object):
                         if len(res):
                             self.log.debug("update received for existing host with dn: %s" % res[0]["dn"])
                             object_uuid = res[0]["_uuid"]
-                            if self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=True) is True:
+                            if self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=False) is True:
                                 host = ObjectProxy(res[0]["dn"], from_db_only=True)
                             else:
                                 self.log.debug("skipping update for %s: no change detected" % res[0]["dn"])
                                 return
-                    elif self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=True) is False:
+                    elif self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=False) is False:
                         self.log.debug("skipping update for %s: no change detected" % host.dn)
                         return
 
@@ -1122,19 +1250,16 @@ class ForemanHookReceiver(object):
                         if len(res):
                             self.log.debug("update received for existing host with dn: %s" % res[0]["dn"])
                             object_uuid = res[0]["_uuid"]
-                            if self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=True) is True:
+                            if self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=False) is True:
                                 host = ObjectProxy(res[0]["dn"], from_db_only=True)
                             else:
                                 self.log.debug("skipping update for %s: no change detected" % res[0]["dn"])
                                 return
 
-                    elif self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=True) is False:
+                    elif self.check_for_change(object_uuid, filtered_payload_hash, save_if_changed=False) is False:
                         self.log.debug("skipping update for %s: no change detected" % host.dn)
                         return
 
-            # clear foreman client cache for this value
-            ForemanClientCache.delete_cache(object_type, object_id=payload_data[uuid_attribute])
-
             foreman_object, skip_this = foreman.get_object(object_type, payload_data[uuid_attribute], data=payload_data, create=host is None, from_db_only=True)
             if foreman_object and host:
                 if foreman_object.uuid != host.uuid:
@@ -1168,6 +1293,10 @@ class ForemanHookReceiver(object):
                                 update_data=update,
                                 delay_update=delay_update)
 
+            # the change has been committed, delayed updates are not applied yet
+            if foreman_type != "discovered_host" and delay_update is False and foreman_object.uuid is not None:
+                self._save_hash(foreman_object.uuid, filtered_payload_hash)
+
             if foreman_type == "host" and old_build_state is True and foreman_object.build is False and \
                     foreman_object.status == "ready":
                 # send notification
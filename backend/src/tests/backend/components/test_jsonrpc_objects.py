@@ -7,11 +7,14 @@
 #
 # See the LICENSE file in the project's top-level directory for details.
 
+from threading import Thread, Event
 from unittest import mock, TestCase
 
 import datetime
 from gosa.backend.components.jsonrpc_objects import JSONRPCObjectMapper, ObjectRegistry
+from gosa.backend.objects.index import OpenObject
 from gosa.common.components import PluginRegistry
+from gosa.common.env import make_session
 from tests.GosaTestCase import *
 
 
@@ -259,3 +262,67 @@ class JSONRPCObjectMapperTestCase(TestCase):
             assert m_scheduler.getScheduler.return_value.unschedule_job.called
             assert not m_scheduler.getScheduler.return_value.add_date_job.called
             assert m_command.sendEvent.called
+
+    def test_failed_flush(self):
+        mapper = self.mapper
+        mapper.flush_open_objects()
+        mapper._JSONRPCObjectMapper__queue_db_update("ref1", data={'cn': "test"})
+        mapper._JSONRPCObjectMapper__queue_db_update("ref2", last_interaction="before")
+
+        with mock.patch("gosa.backend.components.jsonrpc_objects.make_session", side_effect=Exception("db down")):
+            with pytest.raises(Exception):
+                mapper.flush_open_objects()
+
+        # the failed changes are kept and later changes are merged into them
+        mapper._JSONRPCObjectMapper__queue_db_update("ref1", data={'mark': True})
+        mapper._JSONRPCObjectMapper__queue_db_update("ref2", last_interaction="after")
+        pending = mapper._JSONRPCObjectMapper__db_pending
+        assert pending["ref1"] == {'update': {}, 'data': {'cn': "test", 'mark': True}}
+        assert pending["ref2"] == {'update': {'last_interaction': "after"}}
+        mapper._JSONRPCObjectMapper__db_pending = {}
+
+    def test_lock_write_through(self):
+        res = self.openObject('admin', 'session-uuid', 'object', 'cn=Frank Reich,ou=people,dc=example,dc=net')
+        ref = res["__jsonclass__"][1][1]
+
+        # the lock is visible to the other backends without a flush
+        with make_session() as session:
+            assert session.query(OpenObject).filter(OpenObject.ref == ref).count() == 1
+
+        self.closeObject('admin', ref)
+        with make_session() as session:
+            assert session.query(OpenObject).filter(OpenObject.ref == ref).count() == 0
+
+    def test_serialized_flush(self):
+        mapper = self.mapper
+        mapper.flush_open_objects()
+        written = []
+        started = Event()
+        release = Event()
+
+        def write(pending):
+            written.append(pending)
+            if len(written) == 1:
+                started.set()
+                release.wait(5)
+
+        with mock.patch.object(mapper, "_JSONRPCObjectMapper__write_db_pending", side_effect=write):
+            mapper._JSONRPCObjectMapper__queue_db_update("ref1", last_interaction="first")
+            first = Thread(target=mapper.flush_open_objects)
+            first.start()
+            started.wait(5)
+
+            mapper._JSONRPCObjectMapper__queue_db_update("ref1", last_interaction="second")
+            second = Thread(target=mapper.flush_open_objects)
+            second.start()
+
+            # the second flush waits until the first one has been written
+            second.join(0.1)
+            assert second.is_alive()
+            assert len(written) == 1
+
+            release.set()
+            first.join()
+            second.join()
+
+        assert [x["ref1"]['update']['last_interaction'] for x in written] == ["first", "second"]
@@ -15,4 +15,19 @@ class WorkflowTestCase(TestCase):
     def setUp(self):
         super(WorkflowTestCase, self).setUp()
 
+    def test_compile_script(self):
+        script = "def helper():\n    return getBase()\n\nlog.info(helper())\n"
+        code, names = Workflow.compile_script("test-workflow", script)
+        # names used in nested functions are found too
+        assert 'getBase' in names
+        assert 'log' in names
+
+        # same content -> cached code object
+        code2, names2 = Workflow.compile_script("test-workflow", script)
+        assert code2 is code
+
+        # changed content -> recompiled
+        code3, names3 = Workflow.compile_script("test-workflow", script + "getBase()\n")
+        assert code3 is not code
+
     # TODO add tests
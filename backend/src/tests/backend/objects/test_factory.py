@@ -7,7 +7,11 @@
 #
 # See the LICENSE file in the project's top-level directory for details.
 
+import os
+import tempfile
 import unittest
+from unittest import mock
+from gosa.common import Environment
 from tests.GosaTestCase import *
 from gosa.backend.objects.factory import *
 
@@ -199,3 +203,25 @@ class ObjectBackendTestCase(unittest.TestCase):
     # def test_getXmlSchema(self):
     #     assert self.obj.getXMLSchema('User') is not None
     #     assert self.obj.getXMLSchema('Unknown') is None
+
+    def test_schema_cache(self):
+        config = Environment.getInstance().config
+        get = config.get
+
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(config, "get", side_effect=lambda path, *args, **kwargs:
+                                  cache_dir if path == "backend.schema-cache" else get(path, *args, **kwargs)):
+            factory = ObjectFactory()
+            schema = factory.getXMLObjectSchema(True)
+            files = sorted(os.listdir(cache_dir))
+            assert len(files) == 2
+            assert files[0].startswith("object-schema-")
+            assert files[1].startswith("objects-")
+
+            # the second factory is loaded from the cache
+            with mock.patch("gosa.backend.objects.factory.etree.XSLT") as m:
+                cached = ObjectFactory()
+                assert cached.getXMLObjectSchema(True) == schema
+                assert cached.getXMLSchema('User') is not None
+                assert cached.getObjectSearchAid('User')['search'] == factory.getObjectSearchAid('User')['search']
+                assert not m.called
@@ -165,6 +165,13 @@ class ObjectIndexTestCase(TestCase):
         assert len(res) == 1
         assert 'cn=Frank Reich,ou=people,dc=example,dc=net' in res[0]['dn']
 
+    def test_get_foreign_backend_roots(self):
+        # the test data is stored in LDAP only
+        assert self.obj.get_foreign_backend_roots("ou=people,dc=example,dc=net", "LDAP") == {}
+
+        res = self.obj.get_foreign_backend_roots("ou=people,dc=example,dc=net", "Unknown")
+        assert res["LDAP"]["dn"] == "ou=people,dc=example,dc=net"
+
     def test_backend_change_processor(self):
 
         e = EventMaker()
@@ -450,3 +450,22 @@ class ObjectTestCase(TestCase):
 
             assert res['homePhone']['value'][0] == '023456'
             assert res['uidNumber']['value'][0] == 999
+
+    def test_populate_cache(self):
+        PopulateCache.clear()
+        with mock.patch("gosa.backend.objects.object.PluginRegistry.getInstance") as m:
+            m.return_value.call.return_value = ["a", "b"]
+            assert PopulateCache.call("getTestValues") == ["a", "b"]
+            assert PopulateCache.call("getTestValues") == ["a", "b"]
+            assert m.return_value.call.call_count == 1
+
+            # refreshing bypasses the cache
+            PopulateCache.call("getTestValues", refresh=True)
+            assert m.return_value.call.call_count == 2
+
+            # changed objects invalidate the cache (only deliver the event to the cache)
+            subscribers = [x for x in zope.event.subscribers if getattr(x, "__qualname__", "").startswith("PopulateCache.")]
+            with mock.patch.object(zope.event, "subscribers", subscribers):
+                zope.event.notify(ObjectChanged("post object update", dn="cn=test", uuid="1", orig_dn="cn=test", o_type="User"))
+            PopulateCache.call("getTestValues")
+            assert m.return_value.call.call_count == 3
@@ -8,9 +8,11 @@
 # See the LICENSE file in the project's top-level directory for details.
 
 from unittest import mock
+import zope.event
 
 from gosa.backend.objects.backend.registry import ObjectBackendRegistry
 from gosa.backend.objects.index import ObjectInfoIndex
+from gosa.backend.acl import ACLChanged
 from gosa.common.env import make_session
 from tests.GosaTestCase import *
 from gosa.backend.objects.proxy import *
@@ -114,6 +116,34 @@ class ObjectProxyTestCase(GosaTestCase):
         assert 'lock' in res
         assert 'unlock' in res
 
+    def test_acl_mask(self):
+        mocked_resolver = mock.MagicMock()
+        allowed = ["net.example.objects.User.attributes.uid"]
+
+        def check_all(user, checks, base):
+            return dict([((topic, mode), topic in allowed) for topic, mode in checks])
+        mocked_resolver.check_all.side_effect = check_all
+
+        with mock.patch.dict("gosa.backend.objects.proxy.PluginRegistry.modules", {'ACLResolver': mocked_resolver}):
+            # the attribute permissions are resolved at once when the object is opened
+            user = ObjectProxy('cn=Frank Reich,ou=people,dc=example,dc=net', None, 'admin')
+            assert mocked_resolver.check_all.call_count == 1
+            assert not mocked_resolver.check.called
+
+            # the mask is reused
+            assert user.get_attributes() == ['uid']
+            assert user.uid == "freich"
+            with pytest.raises(ACLException):
+                user.sn
+            assert mocked_resolver.check_all.call_count == 1
+            assert not mocked_resolver.check.called
+
+            # until the ACLs change
+            allowed.append("net.example.objects.User.attributes.sn")
+            zope.event.notify(ACLChanged())
+            assert user.sn == "Reich"
+            assert mocked_resolver.check_all.call_count == 2
+
     def test_get_parent_dn(self):
         user = ObjectProxy('cn=Frank Reich,ou=people,dc=example,dc=net', None, 'admin')
         assert user.get_parent_dn() == "ou=people,dc=example,dc=net"
@@ -0,0 +1,76 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+from unittest import mock, TestCase
+from gosa.common.components import PluginRegistry
+from gosa.backend.objects.backend import ObjectBackend
+from gosa.backend.objects.references import ReferenceUpdater
+
+
+class DirectBackend(ObjectBackend):
+
+    def update_values(self, changes):
+        pass
+
+
+class ReferenceUpdaterTestCase(TestCase):
+
+    def test_collect_changes(self):
+        updater = ReferenceUpdater()
+        updater.replace_value("cn=group1", "member", "cn=old", "cn=new")
+        updater.replace_value("cn=group2", "member", "cn=same", "cn=same")
+        updater.remove_value("cn=group3", "member", "cn=old")
+        updater.set_value("cn=user", "manager", "cn=old")
+        updater.set_value("cn=user", "manager", None)
+
+        mocked_index = mock.MagicMock()
+        mocked_index.search.return_value = []
+        with mock.patch.dict(PluginRegistry.modules, {'ObjectIndex': mocked_index}):
+            # unknown objects cannot be written directly, empty changes are skipped
+            res = updater.apply()
+
+        assert res == [
+            ("cn=group1", "member", {'set': None, 'remove': ["cn=old"], 'add': ["cn=new"]}),
+            ("cn=group3", "member", {'set': None, 'remove': ["cn=old"], 'add': []}),
+            ("cn=user", "manager", {'set': [], 'remove': [], 'add': []})
+        ]
+
+        # changes have been consumed
+        assert updater.apply() == []
+
+    def test_direct_backend(self):
+        prop = {'foreign': False, 'readonly': False, 'auto': False, 'in_filter': [], 'out_filter': [],
+                'validator': None, 'backend': ["LDAP"], 'type': "String", 'backend_type': "String",
+                'mandatory': False, 'depends_on': []}
+        properties = {
+            'User': {'description': dict(prop)},
+            'PosixUser': {'gecos': dict(prop, depends_on=["description"])},
+            'SambaUser': {'sambaDisplayName': dict(prop)}
+        }
+        mocked_factory = mock.MagicMock()
+        mocked_factory.get_attributes_by_object.return_value = {'description': {'base': "User"}}
+        mocked_factory.getObjectProperties.side_effect = lambda name: properties[name]
+        mocked_factory.getUpdateHooks.return_value = {}
+
+        updater = ReferenceUpdater()
+        get_direct_backend = updater._ReferenceUpdater__get_direct_backend
+        change = {'set': ["new"], 'remove': [], 'add': []}
+        entry = {'dn': "cn=user,dc=example,dc=net", '_type': "User", '_extensions': ["SambaUser"]}
+        with mock.patch.object(ReferenceUpdater, "_ReferenceUpdater__get_factory", return_value=mocked_factory), \
+                mock.patch("gosa.backend.objects.references.ObjectBackendRegistry.getBackend",
+                           return_value=DirectBackend()):
+            assert get_direct_backend(entry, "description", change, {}) == ("LDAP", "String")
+
+            # an attribute of an active extension depends on it
+            entry['_extensions'].append("PosixUser")
+            assert get_direct_backend(entry, "description", change, {}) is None
+
+            # an active extension has an update hook for it
+            entry['_extensions'].remove("PosixUser")
+            assert get_direct_backend(entry, "description", change, {'SambaUser': {'description': []}}) is None
@@ -0,0 +1,64 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+from unittest import mock, TestCase
+from gosa.backend.objects import ObjectProxy
+from gosa.backend.objects.snapshot import ObjectSnapshot
+
+
+class ObjectSnapshotTestCase(TestCase):
+    dn = "cn=Frank Reich,ou=people,dc=example,dc=net"
+
+    def test_load(self):
+        user = ObjectProxy(self.dn)
+        res = ObjectSnapshot.load([self.dn, user.uuid, "cn=unknown,dc=example,dc=net"])
+
+        assert list(res.keys()) == [self.dn, user.uuid]
+        snapshot = res[self.dn]
+        assert snapshot is res[user.uuid]
+        assert snapshot.uuid == user.uuid
+        assert snapshot.get_base_type() == "User"
+        # attribute values are the same as the ones of the ObjectProxy
+        assert snapshot.sn == user.sn
+        assert snapshot.get('unknown') is None
+        assert snapshot.get_adjusted_parent_dn() == user.get_adjusted_parent_dn()
+        for ext, active in user.get_extension_types().items():
+            assert snapshot.is_extended_by(ext) == active
+
+        data = snapshot.asJSON()
+        assert data['_type'] == "User"
+        assert data['sn'] == user.asJSON()['sn']
+
+        assert ObjectSnapshot.load([]) == {}
+
+    def test_query(self):
+        res = ObjectSnapshot.query({'_type': "User", 'uid': "freich"}, attributes=["uid"])
+        assert len(res) == 1
+        assert res[0].dn == self.dn
+        assert res[0].get_attributes() == ["uid"]
+        assert res[0].uid == "freich"
+        assert res[0].asJSON()['uid'] == ["freich"]
+
+    def test_load_acl(self):
+        mocked_resolver = mock.MagicMock()
+        mocked_resolver.isAdmin.return_value = False
+
+        def check(user, topic, flags, base):
+            return topic in ["net.example.objects.User", "net.example.objects.User.attributes.uid"]
+        mocked_resolver.check.side_effect = check
+
+        with mock.patch.dict("gosa.backend.objects.snapshot.PluginRegistry.modules", {'ACLResolver': mocked_resolver}):
+            snapshot = ObjectSnapshot.load([self.dn], user="tester")[self.dn]
+            assert snapshot.get_attributes() == ["uid"]
+            with self.assertRaises(AttributeError):
+                snapshot.sn
+
+            mocked_resolver.check.side_effect = None
+            mocked_resolver.check.return_value = False
+            assert ObjectSnapshot.load([self.dn], user="tester") == {}
@@ -0,0 +1,40 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+import logging
+import time
+from unittest import TestCase
+
+from gosa.common.components import PluginRegistry
+from tests.GosaTestCase import slow
+
+
+@slow
+class CommandRegistryBenchmarkTestCase(TestCase):
+    calls = 100000
+
+    def setUp(self):
+        super(CommandRegistryBenchmarkTestCase, self).setUp()
+        self.reg = PluginRegistry.getInstance("CommandRegistry")
+
+    def __measure(self, user, func, *args):
+        start = time.time()
+        for i in range(self.calls):
+            self.reg.dispatch(user, None, func, *args)
+        duration = time.time() - start
+        logging.getLogger(__name__).info("%s calls of '%s' as %s: %.3fs (%.2fus per call)" %
+                                         (self.calls, func, user if user != self.reg else "internal", duration, duration * 1000000 / self.calls))
+
+    def test_dispatch_overhead(self):
+        # internal call without ACL check
+        self.__measure(self.reg, "getBase")
+        # ACL checked call
+        self.__measure("admin", "getBase")
+        # call with user injection
+        self.__measure("admin", "getSessionUser")
@@ -0,0 +1,41 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+import logging
+import time
+from unittest import TestCase
+
+from gosa.backend.objects.filter import FilterChain
+from gosa.backend.objects.filter.strings import ConcatString, Replace, SplitString, JoinArray
+from tests.GosaTestCase import slow
+
+
+@slow
+class FilterChainBenchmarkTestCase(TestCase):
+    runs = 100000
+
+    def test_filter_throughput(self):
+        chain = FilterChain({
+            1: {'filter': SplitString(None), 'params': [","]},
+            2: {'filter': ConcatString(None), 'params': ["%(uid)s-", "left"]},
+            3: {'filter': Replace(None), 'params': ["^(.*)$", "\\1"]},
+            4: {'filter': JoinArray(None), 'params': [","]}
+        })
+        props = {'uid': {'value': ["freich"], 'backend': ["LDAP"], 'type': "String", 'multivalue': False}}
+        for i in range(20):
+            props['attr%s' % i] = {'value': ["a,b,c"], 'backend': ["LDAP"], 'type': "String", 'multivalue': False}
+
+        start = time.time()
+        for i in range(self.runs):
+            props['attr0']['value'] = ["a,b,c"]
+            chain.process(None, 'attr0', props)
+        duration = time.time() - start
+
+        assert props['attr0']['value'] == ["freich-a,freich-b,freich-c"]
+        logging.getLogger(__name__).info("%s filter chain runs: %.3fs (%.0f/s)" % (self.runs, duration, self.runs / duration))
@@ -0,0 +1,74 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+import logging
+import time
+import uuid
+from unittest import mock, TestCase
+
+from gosa.backend.components.jsonrpc_objects import JSONRPCObjectMapper, ObjectRegistry
+from tests.GosaTestCase import slow
+
+
+class BenchmarkObject(object):
+    """ minimal stand-in for an ObjectProxy to measure the stack handling only """
+
+    def __init__(self, dn, user=None, session_id=None):
+        self.dn = dn
+        self.uuid = str(uuid.uuid4())
+
+    def get_all_method_names(self):
+        return []
+
+    def get_attributes(self):
+        return []
+
+    def get_methods(self):
+        return []
+
+
+@slow
+class JSONRPCObjectMapperBenchmarkTestCase(TestCase):
+    objects = 5000
+
+    def setUp(self):
+        super(JSONRPCObjectMapperBenchmarkTestCase, self).setUp()
+        self.mapper = JSONRPCObjectMapper()
+        self.patcher = mock.patch.dict(ObjectRegistry.objects['object'], {'object': BenchmarkObject})
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        super(JSONRPCObjectMapperBenchmarkTestCase, self).tearDown()
+
+    def test_open_close_objects(self):
+        refs = []
+        start = time.time()
+        for i in range(self.objects):
+            res = self.mapper.openObject("user%s" % (i % 100), "session-uuid", "object", "cn=object%s,dc=example,dc=net" % i)
+            refs.append((res["__jsonclass__"][1][1], "user%s" % (i % 100)))
+        self.mapper.flush_open_objects()
+        opened = time.time() - start
+
+        # locked objects must be detected
+        with self.assertRaises(Exception):
+            self.mapper.openObject("other", "session-uuid", "object", "cn=object0,dc=example,dc=net")
+
+        start = time.time()
+        for ref, user in refs:
+            self.mapper.closeObject(user, ref)
+        self.mapper.flush_open_objects()
+        closed = time.time() - start
+
+        logging.getLogger(__name__).info("opened %s objects in %.3fs (%.0f/s), closed them in %.3fs (%.0f/s)" %
+                                         (self.objects, opened, self.objects / opened, closed, self.objects / closed))
+
+        # the locks have been released
+        res = self.mapper.openObject("other", "session-uuid", "object", "cn=object0,dc=example,dc=net")
+        self.mapper.closeObject("other", res["__jsonclass__"][1][1])
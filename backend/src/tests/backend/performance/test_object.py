@@ -0,0 +1,60 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+import logging
+import time
+import tracemalloc
+from unittest import TestCase
+
+from gosa.backend.objects import ObjectProxy
+from tests.GosaTestCase import slow
+
+
+@slow
+class ObjectBenchmarkTestCase(TestCase):
+    objects = 200
+    dn = "cn=Frank Reich,ou=people,dc=example,dc=net"
+
+    def test_open_objects(self):
+        # warm up the caches (object definitions, backends)
+        ObjectProxy(self.dn)
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        opened = []
+        start = time.time()
+        for i in range(self.objects):
+            opened.append(ObjectProxy(self.dn))
+        duration = time.time() - start
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+        logging.getLogger(__name__).info("opened %s objects in %.3fs (%.0f/s), %.1f KiB per object" %
+                                         (self.objects, duration, self.objects / duration, size / 1024 / self.objects))
+
+        # opened objects must not influence each other
+        opened[0].sn = "Benchmark"
+        self.assertNotEqual(opened[1].sn, "Benchmark")
+
+    def test_open_latency_with_extensions(self):
+        obj = ObjectProxy(self.dn)
+        extensions = [name for name, active in obj.get_extension_types().items() if active]
+
+        def measure(access):
+            start = time.time()
+            for i in range(self.objects):
+                access(ObjectProxy(self.dn))
+            return (time.time() - start) / self.objects * 1000
+
+        lazy = measure(lambda o: o.get_extension_types())
+        first_attr = measure(lambda o: o.sn)
+        loaded = measure(lambda o: o.asJSON())
+        logging.getLogger(__name__).info("open latency with %s active extensions: %.2fms (lazy), %.2fms (read base attribute), "
+                                         "%.2fms (all extensions loaded)" % (len(extensions), lazy, first_attr, loaded))
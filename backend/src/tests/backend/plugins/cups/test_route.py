@@ -0,0 +1,79 @@
+# This file is part of the GOsa project.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+import gzip
+import os
+import time
+
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+from gosa.backend.plugins.cups.route import *
+
+
+class PPDHandlerTestCase(AsyncHTTPTestCase):
+    file_name = "test-route.ppd"
+
+    def get_app(self):
+        return Application([('/ppd/modified/(?P<path>.*)?', PPDHandler)])
+
+    def setUp(self):
+        super(PPDHandlerTestCase, self).setUp()
+        self.dir = Environment.getInstance().config.get("cups.spool", default="/tmp/spool")
+        if not os.path.exists(self.dir):
+            os.makedirs(self.dir)
+        self.path = os.path.join(self.dir, self.file_name)
+        with open(self.path, "w") as f:
+            f.write("*PPD-Adobe: \"4.3\"\n" * 100)
+
+    def tearDown(self):
+        for path in [self.path, "%s.gz" % self.path]:
+            if os.path.exists(path):
+                os.remove(path)
+        super(PPDHandlerTestCase, self).tearDown()
+
+    def test_get(self):
+        response = self.fetch("/ppd/modified/%s" % self.file_name, decompress_response=False)
+        assert response.code == 200
+        assert response.headers['Content-Type'] == "application/vnd.cups-ppd"
+        assert "Content-Encoding" not in response.headers
+        etag = response.headers['Etag']
+
+        response = self.fetch("/ppd/modified/%s" % self.file_name, headers={"If-None-Match": etag}, decompress_response=False)
+        assert response.code == 304
+
+        # the compressed copy is written with the PPD file
+        assert PPDHandler.compress(self.path) == "%s.gz" % self.path
+        response = self.fetch("/ppd/modified/%s" % self.file_name, headers={"Accept-Encoding": "gzip"}, decompress_response=False)
+        assert response.code == 200
+        assert response.headers['Content-Encoding'] == "gzip"
+        assert response.headers['Content-Type'] == "application/vnd.cups-ppd"
+        assert gzip.decompress(response.body) == b"*PPD-Adobe: \"4.3\"\n" * 100
+
+        # changed files get a new etag, an outdated compressed copy is not served
+        time.sleep(0.01)
+        with open(self.path, "w") as f:
+            f.write("*PPD-Adobe: \"4.3\"\n")
+        response = self.fetch("/ppd/modified/%s" % self.file_name, headers={"If-None-Match": etag}, decompress_response=False)
+        assert response.code == 200
+        assert response.headers['Etag'] != etag
+
+        response = self.fetch("/ppd/modified/%s" % self.file_name, headers={"Accept-Encoding": "gzip"}, decompress_response=False)
+        assert "Content-Encoding" not in response.headers
+        assert response.body == b"*PPD-Adobe: \"4.3\"\n"
+
+        # the copy is created in the background for the following requests
+        for _ in range(50):
+            if os.path.getmtime("%s.gz" % self.path) >= os.path.getmtime(self.path):
+                break
+            time.sleep(0.1)
+        response = self.fetch("/ppd/modified/%s" % self.file_name, headers={"Accept-Encoding": "gzip"}, decompress_response=False)
+        assert response.headers['Content-Encoding'] == "gzip"
+        assert gzip.decompress(response.body) == b"*PPD-Adobe: \"4.3\"\n"
+
+        response = self.fetch("/ppd/modified/unknown.ppd")
+        assert response.code == 404
@@ -148,10 +148,10 @@ class MockForeman:
         logging.getLogger("test.foreman-integration").info("trigger registered: %s" % tid)
 
 
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.post")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.put")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.delete")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.get")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.post")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.put")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.delete")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
 class ForemanIntegrationTestCase(RemoteTestCase):
     foreman = None
     host_url = None
@@ -24,9 +24,14 @@ from tests.RemoteTestCase import RemoteTestCase
 from gosa.backend.exceptions import ProxyException
 from gosa.backend.plugins.webhook.registry import WebhookReceiver
 from tests.GosaTestCase import GosaTestCase
-from gosa.backend.plugins.foreman.main import Foreman as ForemanPlugin, ForemanHookReceiver
+from gosa.backend.plugins.foreman.main import Foreman as ForemanPlugin, ForemanHookReceiver, PayloadHashes
+from gosa.backend.plugins.foreman.hook_queue import ForemanHookQueue, ForemanHookQueueFull, ForemanHookEvent
 from gosa.backend.objects.backend.back_foreman import *
 from gosa.backend.objects.backend.registry import ObjectBackendRegistry
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
 import time
 
 
@@ -55,6 +60,11 @@ class MockResponse:
         raise HTTPError(self.status_code)
 
 
+def wait_for_hook_events():
+    receiver = PluginRegistry.getInstance("WebhookRegistry").get_handler("application/vnd.foreman.hookevent+json")
+    assert receiver.queue.join(10) is True
+
+
 class MockForeman:
 
     def __init__(self):
@@ -89,10 +99,10 @@ class MockForeman:
         return MockResponse({}, 200)
 
 
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.post")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.put")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.delete")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.get")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.post")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.put")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.delete")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
 class ForemanTestCase(GosaTestCase):
     foreman = None
 
@@ -190,10 +200,10 @@ class ForemanTestCase(GosaTestCase):
         assert device.status == "pending"
 
 
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.post")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.put")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.delete")
-@mock.patch("gosa.backend.objects.backend.back_foreman.requests.get")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.post")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.put")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.delete")
+@mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
 class ForemanSyncTestCase(GosaTestCase):
 
     dns_to_delete = []
@@ -224,7 +234,7 @@ class ForemanSyncTestCase(GosaTestCase):
         # logging.getLogger("gosa.backend.objects").setLevel(logging.INFO)
 
         # remove them all
-        with mock.patch("gosa.backend.objects.backend.back_foreman.requests.delete") as m_del:
+        with mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.delete") as m_del:
             m_del.return_value = MockResponse({}, 200)
 
             for dn in self.dns_to_delete:
@@ -274,12 +284,25 @@ class ForemanSyncTestCase(GosaTestCase):
         res = index.search(discovered_host_query, {'dn': 1})
         assert len(res) == 0
 
-        self.foreman.sync_type("ForemanHostGroup")
+        stats = self.foreman.sync_type("ForemanHostGroup")
         logging.getLogger("gosa.backend.objects.index").info("waiting for index update")
         logging.getLogger("gosa.backend.objects.index").info("checking index")
         res = index.search(hostgroup_query, {'dn': 1})
         self.dns_to_delete.extend([x['dn'] for x in res])
         assert len(res) == 3
+        assert stats["synced"] == 3
+        assert stats["changed"] == 3
+
+        # unchanged objects are skipped
+        stats = self.foreman.sync_type("ForemanHostGroup")
+        assert stats["skipped"] == 3
+        assert stats["changed"] == 0
+        assert stats["removed"] == 0
+
+        # unless the sync is forced
+        stats = self.foreman.sync_type("ForemanHostGroup", force=True)
+        assert stats["skipped"] == 0
+        assert stats["changed"] == 3
         res = index.search(host_query, {'dn': 1})
         assert len(res) == 0
         res = index.search(discovered_host_query, {'dn': 1})
@@ -358,8 +381,9 @@ class ForemanSyncTestCase(GosaTestCase):
 
 class ForemanClientTestCase(TestCase):
 
-    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.get")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
     def test_get(self, m_get):
+        ForemanClientCache.clear()
         client = ForemanClient("http://localhost:8000/api/v2")
 
         m_get.return_value = MockResponse({}, 404)
@@ -433,6 +457,330 @@ class ForemanClientTestCase(TestCase):
         assert res['id'] == 23
         assert res['fullname'] == "QA"
 
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.put")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
+    def test_cache(self, m_get, m_put):
+        ForemanClientCache.clear()
+        client = ForemanClient("http://localhost:8000/api/v2")
+        m_get.return_value = MockResponse({"id": 23, "name": "host"}, 200)
+        m_put.return_value = MockResponse({"id": 23, "name": "changed"}, 200)
+
+        client.get("hosts")
+        client.get("hosts", 23)
+        client.get("hosts", 23)
+        client.get("hosts/23/interfaces")
+        assert m_get.call_count == 3
+        stats = ForemanClientCache.get_statistics()
+        assert stats['hits'] == 1
+        assert stats['size'] == 3
+
+        # writes drop the object, its sub resources and the list
+        client.put("hosts", 23, {"name": "changed"})
+        assert ForemanClientCache.get_statistics()['size'] == 0
+        client.get("hosts", 23)
+        assert m_get.call_count == 4
+
+        # incoming hook events use the same invalidation
+        ForemanClientCache.delete_cache("hosts", object_id=23)
+        client.get("hosts", 23)
+        assert m_get.call_count == 5
+
+        config = Environment.getInstance().config
+        getint = config.getint
+
+        def get_option(options):
+            return lambda path, default=None: options[path] if path in options else getint(path, default=default)
+
+        # least recently used entries are evicted
+        with mock.patch.object(config, "getint", side_effect=get_option({"foreman.cache-size": 2})):
+            client.get("domains")
+            client.get("hosts", 23)
+            client.get("architectures")
+            assert m_get.call_count == 7
+            client.get("hosts", 23)
+            assert m_get.call_count == 7
+            client.get("domains")
+            assert m_get.call_count == 8
+            assert ForemanClientCache.get_statistics()['evictions'] >= 2
+
+        # resource specific lifetime
+        with mock.patch.object(config, "getint", side_effect=get_option({"foreman.cache-ttl-smart_proxies": 0})):
+            client.get("smart_proxies")
+            client.get("smart_proxies")
+            assert m_get.call_count == 10
+        ForemanClientCache.clear()
+
+    def test_iter_results(self):
+        hosts = [{"id": i, "name": "host%s" % i} for i in range(25)]
+        requests_log = []
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                requests_log.append((url.path, query, self.headers.get("Connection")))
+                page = int(query["page"][0])
+                # simulate a foreman instance with a maximum page size of 10
+                per_page = min(10, int(query["per_page"][0]))
+                body = dumps({
+                    "total": len(hosts),
+                    "subtotal": len(hosts),
+                    "page": page,
+                    "per_page": per_page,
+                    "results": hosts[(page - 1) * per_page:page * per_page]
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        Handler.protocol_version = "HTTP/1.1"
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            client = ForemanClient("http://127.0.0.1:%s/api/v2" % server.server_port)
+            results = client.iter_results("hosts", per_page=50)
+
+            # nothing is requested before iterating
+            assert len(requests_log) == 0
+            assert next(results) == hosts[0]
+            assert len(requests_log) == 1
+
+            assert [x["id"] for x in results] == list(range(1, 25))
+            assert [x[1]["page"][0] for x in requests_log] == ["1", "2", "3"]
+            assert all(x[0] == "/api/v2/hosts" for x in requests_log)
+
+            # pages are not cached
+            assert len(list(client.iter_results("hosts"))) == 25
+            assert len(requests_log) == 6
+        finally:
+            ForemanClient.close_sessions()
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+class ForemanWriteQueueTestCase(TestCase):
+
+    def __wait_for_active(self, queue, active):
+        for i in range(100):
+            if queue.get_statistics()["active"] == active:
+                return
+            time.sleep(0.01)
+        raise AssertionError("queue has %s active operations" % queue.get_statistics()["active"])
+
+    def test_ordering(self):
+        sent = []
+        release = threading.Event()
+
+        def handler(operation):
+            release.wait()
+            sent.append((operation.method, operation.object_id, operation.payload))
+
+        queue = ForemanWriteQueue(handler)
+        queue.put(ForemanWriteOperation("put", "hosts", "host1", payload={"host": {"name": "host1"}}))
+        self.__wait_for_active(queue, 1)
+
+        # these updates are merged, as the first one is already being sent
+        queue.put(ForemanWriteOperation("put", "hosts", "host1", payload={"host": {"ip": "192.168.0.1"}}))
+        queue.put(ForemanWriteOperation("put", "hosts", "host1", payload={"host": {"ip": "192.168.0.2", "mac": None}}))
+        queue.put(ForemanWriteOperation("delete", "hosts", "host1"))
+        queue.put(ForemanWriteOperation("put", "hosts", "host2", payload={"host": {"name": "host2"}}))
+        assert queue.get_statistics()["depth"] == 4
+
+        release.set()
+        assert queue.join(5) is True
+
+        assert [x for x in sent if x[1] == "host1"] == [
+            ("put", "host1", {"host": {"name": "host1"}}),
+            ("put", "host1", {"host": {"ip": "192.168.0.2", "mac": None}}),
+            ("delete", "host1", None)
+        ]
+        assert ("put", "host2", {"host": {"name": "host2"}}) in sent
+
+        stats = queue.get_statistics()
+        assert stats["queued"] == 5
+        assert stats["coalesced"] == 1
+        assert stats["processed"] == 4
+        assert stats["depth"] == 0
+        assert stats["latency_p50"] is not None
+
+    def test_retry(self):
+        calls = []
+
+        def handler(operation):
+            calls.append(operation.object_id)
+            if operation.object_id == "temporary" and len(calls) < 3:
+                raise requests.exceptions.ConnectionError()
+            elif operation.object_id == "permanent":
+                raise ValueError()
+
+        queue = ForemanWriteQueue(handler)
+        queue.retry_delay = 0
+        queue.put(ForemanWriteOperation("delete", "hosts", "temporary"))
+        assert queue.join(5) is True
+        assert calls == ["temporary"] * 3
+
+        queue.put(ForemanWriteOperation("delete", "hosts", "permanent"))
+        assert queue.join(5) is True
+        stats = queue.get_statistics()
+        assert stats["retried"] == 2
+        assert stats["processed"] == 1
+        assert stats["failed"] == 1
+
+    def test_full(self):
+        release = threading.Event()
+        queue = ForemanWriteQueue(lambda operation: release.wait())
+        queue.size = 1
+        queue.timeout = 0
+
+        queue.put(ForemanWriteOperation("delete", "hosts", "host1"))
+        with pytest.raises(ForemanWriteQueueFull):
+            queue.put(ForemanWriteOperation("delete", "hosts", "host2"))
+
+        release.set()
+        assert queue.join(5) is True
+        queue.put(ForemanWriteOperation("delete", "hosts", "host2"))
+        assert queue.join(5) is True
+
+
+class ForemanHookQueueTestCase(TestCase):
+
+    def test_queue(self):
+        processed = []
+        release = threading.Event()
+
+        def handler(data):
+            release.wait()
+            processed.append((data["event"], data["object"], data["data"]["host"]["host"].get("ip")))
+
+        def event(name, ip=None, event_type="after_commit"):
+            return {"event": event_type, "object": name, "data": {"host": {"host": {"name": name, "ip": ip}}}}
+
+        queue = ForemanHookQueue(handler)
+        queue.put(event("host1", "192.168.0.1"))
+        for i in range(100):
+            if queue.get_statistics()["active"] == 1:
+                break
+            time.sleep(0.01)
+
+        # the second event is outdated by the third one before it has been processed
+        queue.put(event("host1", "192.168.0.2"))
+        queue.put(event("host1", "192.168.0.3"))
+        queue.put(event("host1", event_type="after_destroy"))
+        queue.put(event("host2", "192.168.0.4"))
+        assert queue.get_statistics()["depth"] == 3
+
+        # the events are stored until they have been processed
+        with make_session() as session:
+            assert session.query(ForemanHookEvent).count() == 3
+
+        release.set()
+        assert queue.join(10) is True
+        assert [x for x in processed if x[1] == "host1"] == [
+            ("after_commit", "host1", "192.168.0.1"),
+            ("after_destroy", "host1", None)
+        ]
+        assert ("after_commit", "host2", "192.168.0.4") in processed
+
+        stats = queue.get_statistics()
+        assert stats["received"] == 5
+        assert stats["superseded"] == 2
+        assert stats["processed"] == 3
+        with make_session() as session:
+            assert session.query(ForemanHookEvent).count() == 0
+
+        queue.size = 0
+        with pytest.raises(ForemanHookQueueFull):
+            queue.put(event("host3"))
+
+    def test_supersede(self):
+        processed = []
+        release = threading.Event()
+
+        def handler(data):
+            release.wait()
+            processed.append((data["event"], data["object"], data["data"]["host"]["host"].get("ip")))
+
+        def event(name, ip=None, event_type="after_commit"):
+            return {"event": event_type, "object": name, "data": {"host": {"host": {"name": name, "ip": ip}}}}
+
+        queue = ForemanHookQueue(handler, keep=lambda data: data["data"]["host"]["host"].get("ip") == "skipped")
+        queue.put(event("host1", "192.168.0.1"))
+        queue.put(event("host2", "192.168.0.1"))
+        for i in range(100):
+            if queue.get_statistics()["active"] == 2:
+                break
+            time.sleep(0.01)
+
+        # other events do not outdate a pending after_commit
+        queue.put(event("host1", "192.168.0.2"))
+        queue.put(event("host1", event_type="after_build"))
+        assert queue.get_statistics()["superseded"] == 0
+
+        # only the newer after_commit does
+        queue.put(event("host1", "192.168.0.3"))
+        assert queue.get_statistics()["superseded"] == 1
+
+        # the after_commit that follows an after_destroy is kept
+        queue.put(event("host1", event_type="after_destroy"))
+        assert queue.get_statistics()["superseded"] == 2
+        queue.put(event("host1", "192.168.0.4"))
+        queue.put(event("host1", "192.168.0.5"))
+
+        # the events the handler is going to skip are kept
+        queue.put(event("host2", "skipped"))
+        queue.put(event("host2", "192.168.0.2"))
+
+        release.set()
+        assert queue.join(10) is True
+        assert [x for x in processed if x[1] == "host1"] == [
+            ("after_commit", "host1", "192.168.0.1"),
+            ("after_build", "host1", None),
+            ("after_destroy", "host1", None),
+            ("after_commit", "host1", "192.168.0.4"),
+            ("after_commit", "host1", "192.168.0.5")
+        ]
+        assert [x[2] for x in processed if x[1] == "host2"] == ["192.168.0.1", "skipped", "192.168.0.2"]
+        assert queue.get_statistics()["superseded"] == 2
+        assert queue.get_statistics()["processed"] == 8
+
+    def test_blocked(self):
+        processed = []
+        blocked = threading.Event()
+        blocked.set()
+
+        def handler(data):
+            if data["object"] == "broken":
+                raise ValueError("cannot apply event")
+            processed.append(data["object"])
+
+        def event(name):
+            return {"event": "after_commit", "object": name, "data": {"host": {"host": {"name": name}}}}
+
+        queue = ForemanHookQueue(handler, blocked=blocked.is_set)
+        queue.put(event("host1"))
+        queue.put(event("broken"))
+        assert queue.join(2) is False
+        assert processed == []
+
+        # the events are applied after the sync
+        blocked.clear()
+        assert queue.join(10) is True
+        assert processed == ["host1"]
+
+        # failed events are kept until the next start
+        with make_session() as session:
+            assert session.query(ForemanHookEvent).count() == 1
+            session.query(ForemanHookEvent).delete()
+            session.commit()
+
 
 class ForemanRealmTestCase(RemoteTestCase):
     registry = None
@@ -456,7 +804,7 @@ class ForemanRealmTestCase(RemoteTestCase):
     def get_app(self):
         return Application([('/hooks(?P<path>.*)?', WebhookReceiver)], cookie_secret='TecloigJink4', xsrf_cookies=True)
 
-    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.get")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
     def test_request(self, m_get):
 
         m_get.return_value = MockResponse('{\
@@ -509,6 +857,7 @@ class ForemanRealmTestCase(RemoteTestCase):
             'HTTP_X_HUB_SIGNATURE': signature
         }
         AsyncHTTPTestCase.fetch(self, "/hooks/", method="POST", headers=headers, body=payload)
+        wait_for_hook_events()
 
         with pytest.raises(ProxyException):
             ObjectProxy("cn=new-foreman-host,ou=incoming,dc=example,dc=net")
@@ -541,6 +890,7 @@ class ForemanHookTestCase(RemoteTestCase):
         with make_session() as session:
             session.query(Schema).filter(Schema.type.endswith('|Foreman')).delete(synchronize_session='fetch')
             session.commit()
+        PayloadHashes.clear()
 
     def get_app(self):
         return Application([('/hooks(?P<path>.*)?', WebhookReceiver)], cookie_secret='TecloigJink4', xsrf_cookies=True)
@@ -557,9 +907,9 @@ class ForemanHookTestCase(RemoteTestCase):
         }
         return headers, payload
 
-    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.put")
-    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.post")
-    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.get")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.put")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.post")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
     def test_host_request(self, m_get, m_post, m_put):
 
         m_get.return_value = MockResponse('{\
@@ -591,6 +941,7 @@ class ForemanHookTestCase(RemoteTestCase):
         headers, payload = self._create_request(payload_data)
         logging.getLogger(__name__).info("send update")
         AsyncHTTPTestCase.fetch(self, "/hooks/", method="POST", headers=headers, body=payload)
+        wait_for_hook_events()
         logging.getLogger(__name__).info("finished update")
 
         assert m_get.called is False
@@ -605,6 +956,7 @@ class ForemanHookTestCase(RemoteTestCase):
 
         # trigger hook again and check if the updates have been skipped (no save to foremen, no requests from foreman)
         AsyncHTTPTestCase.fetch(self, "/hooks/", method="POST", headers=headers, body=payload)
+        wait_for_hook_events()
         assert m_get.called is False
         assert m_put.called is False
         assert m_post.called is False
@@ -623,14 +975,15 @@ class ForemanHookTestCase(RemoteTestCase):
         }
         headers, payload = self._create_request(payload_data)
         AsyncHTTPTestCase.fetch(self, "/hooks/", method="POST", headers=headers, body=payload)
+        wait_for_hook_events()
 
         with pytest.raises(ProxyException):
             ObjectProxy("cn=new-foreman-host,ou=incoming,dc=example,dc=net")
 
         self._host_cn = None
 
-    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.delete")
-    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.get")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.delete")
+    @mock.patch("gosa.backend.objects.backend.back_foreman.requests.Session.get")
     def test_hostgroup_request(self, m_get, m_delete):
 
         m_get.return_value = MockResponse('{\
@@ -654,6 +1007,7 @@ class ForemanHookTestCase(RemoteTestCase):
         }
         headers, payload = self._create_request(payload_data)
         AsyncHTTPTestCase.fetch(self, "/hooks/", method="POST", headers=headers, body=payload)
+        wait_for_hook_events()
 
         # check if the host has been updated
         device = ObjectProxy(self._host_dn)
@@ -675,6 +1029,7 @@ class ForemanHookTestCase(RemoteTestCase):
         }
         headers, payload = self._create_request(payload_data)
         AsyncHTTPTestCase.fetch(self, "/hooks/", method="POST", headers=headers, body=payload)
+        wait_for_hook_events()
 
         with pytest.raises(ProxyException):
             ObjectProxy(self._host_dn)
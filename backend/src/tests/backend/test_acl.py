@@ -715,6 +715,41 @@ class ACLResolverTestCase(TestCase):
         self.assertFalse(self.resolver.check('tester1', 'org.gosa.factory', 'r', base=base),
                          "ACL scope ONE is not resolved correclty! The user should not be able to read, but he can!")
 
+    def test_check_all(self):
+        base = "dc=a," + self.ldap_base
+        aclset = ACLSet(base)
+        acl = ACL(scope=ACL.SUB)
+        acl.set_members(['tester1'])
+        acl.add_action('org.gosa.factory', 'rw')
+        acl.add_action('org.gosa.event', 'rw')
+        aclset.add(acl)
+        self.resolver.add_acl_set(aclset)
+
+        # RESET the write permissions for the events in a subtree
+        aclset = ACLSet("dc=b," + base)
+        acl = ACL(scope=ACL.RESET)
+        acl.set_members(['tester1'])
+        acl.add_action('org.gosa.event', 'w')
+        aclset.add(acl)
+        self.resolver.add_acl_set(aclset)
+
+        checks = [(topic, mode) for topic in ['org.gosa.factory', 'org.gosa.event', 'org.gosa.command'] for mode in ['r', 'w']]
+        for base in [self.ldap_base, "dc=a," + self.ldap_base, "dc=b,dc=a," + self.ldap_base, "dc=c,dc=b,dc=a," + self.ldap_base]:
+            res = self.resolver.check_all('tester1', checks, base=base)
+            assert res == dict([(check, self.resolver.check('tester1', check[0], check[1], base=base)) for check in checks])
+
+        assert self.resolver.check_all('tester1', checks, base="dc=b,dc=a," + self.ldap_base) == {
+            ('org.gosa.factory', 'r'): True,
+            ('org.gosa.factory', 'w'): True,
+            ('org.gosa.event', 'r'): True,
+            ('org.gosa.event', 'w'): False,
+            ('org.gosa.command', 'r'): False,
+            ('org.gosa.command', 'w'): False
+        }
+
+        self.resolver.admins = ['admin']
+        assert all(self.resolver.check_all('admin', checks).values())
+
     def test_getEntryPoints(self):
         # TODO needs to be completed
         self.resolver.admins = ['admin']
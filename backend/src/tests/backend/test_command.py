@@ -66,6 +66,32 @@ class CommandRegistryTestCase(TestCase):
         res = self.reg.dispatch(self.reg, None, 'getBase')
         assert res == "dc=example,dc=net"
 
+    def test_permission_cache(self):
+        mocked_resolver = mock.MagicMock()
+        mocked_resolver.check.return_value = True
+        mocked_resolver.check.generation = 1
+        mocked_resolver.topic_uses_options.return_value = False
+        plan = {'acl_topic': "net.example.command.getBase", 'sig': [], 'uses_options': None}
+        check = self.reg._CommandRegistry__check_permission
+
+        with mock.patch.dict("gosa.backend.command.PluginRegistry.modules", {'ACLResolver': mocked_resolver}), \
+                mock.patch.object(self.reg, "_CommandRegistry__permission_cache_size", 2):
+            assert check("user1", "getBase", plan, [], {}) is True
+            assert check("user1", "getBase", plan, [], {}) is True
+            assert mocked_resolver.check.call_count == 1
+
+            # the least recently used entry is dropped
+            check("user2", "getBase", plan, [], {})
+            check("user3", "getBase", plan, [], {})
+            assert len(self.reg._CommandRegistry__permission_cache) == 2
+            check("user1", "getBase", plan, [], {})
+            assert mocked_resolver.check.call_count == 4
+
+            # a new ACL generation clears the cache
+            mocked_resolver.check.generation = 2
+            check("user1", "getBase", plan, [], {})
+            assert mocked_resolver.check.call_count == 5
+
     def test_callNeedsUser(self):
         with pytest.raises(CommandInvalid):
             self.reg.callNeedsUser('unknownCommand')
@@ -95,6 +95,8 @@ class MQTTClientService(object):
                 xml = objectify.fromstring(message)
                 if hasattr(xml, "ClientPoll"):
                     self.__handleClientPoll()
+                elif hasattr(xml, "Notification"):
+                    self.__handleNotification(xml.Notification)
                 else:
                     self.log.debug("unhandled event received '%s'" % xml.getchildren()[0].tag)
             except etree.XMLSyntaxError as e:
@@ -217,6 +219,19 @@ class MQTTClientService(object):
         # Get rid of it...
         self.client.send_message(response, topic=response_topic)
 
+    def __handleNotification(self, data):
+        """ Show a notification that has been broadcasted to all clients """
+        if data.Target.text != "*" or "notify_all" not in self.__cr.getMethods():
+            return
+
+        title = data.Title.text if hasattr(data, "Title") else ""
+        timeout = int(data.Timeout.text) // 1000 if hasattr(data, "Timeout") else 0
+        icon = data.Icon.text if hasattr(data, "Icon") else "_no_icon_"
+        try:
+            self.__cr.dispatch("notify_all", title, data.Body.text, timeout, icon)
+        except Exception as e:
+            self.log.error("showing notification failed: %s" % str(e))
+
     def __handleClientPoll(self):
         delay = random.randint(0, 30)
         self.log.debug("received client poll - will answer in %d seconds" % delay)
@@ -20,6 +20,8 @@ e.g.:
 
 >>> proxy.clientDispatch("49cb1287-db4b-4ddf-bc28-5f4743eac594", "notify", "user1", "Hallo", "This is a message")
 
+>>> proxy.clientDispatch("49cb1287-db4b-4ddf-bc28-5f4743eac594", "notify_users", ["user1", "user2"], "Hallo", "This is a message")
+
 >>> proxy.clientDispatch("49cb1287-db4b-4ddf-bc28-5f4743eac594", "notify_all", "Hallo", "This is a message")
 
 """
@@ -73,6 +75,9 @@ class Notify(Plugin):
             ccr.register("notify", 'Notify.notify', [],
                          ['user', 'title', 'message', 'timeout', 'icon'],
                          'Sent a notification to a given user')
+            ccr.register("notify_users", 'Notify.notify_users', [],
+                         ['users', 'title', 'message', 'timeout', 'icon'],
+                         'Sent a notification to a list of users')
             ccr.register("notify_all", 'Notify.notify_all', [],
                          ['title', 'message', 'timeout', 'icon'],
                          'Sent a notification to a given user')
@@ -87,6 +92,7 @@ class Notify(Plugin):
                 # Trigger resend of capapability event
                 ccr = PluginRegistry.getInstance('ClientCommandRegistry')
                 ccr.unregister("notify")
+                ccr.unregister("notify_users")
                 ccr.unregister("notify_all")
                 mqtt = PluginRegistry.getInstance('MQTTClientService')
                 mqtt.reAnnounce()
@@ -116,6 +122,10 @@ class Notify(Plugin):
                                    icon, dbus_interface="org.gosa")
         return int(o)
 
+    def notify_users(self, users, title, message, timeout=0, icon="dialog-information"):
+        """ Send a notification to several users on a machine, returns the return codes per user """
+        return {user: self.notify(user, title, message, timeout, icon) for user in users}
+
     def notify_all(self, title, message, timeout=0, icon="dialog-information"):
         """ Send a notification to all users on a machine """
 
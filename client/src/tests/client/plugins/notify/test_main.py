@@ -57,6 +57,15 @@ class ClientNotifyTestCase(ClientDBusTestCase):
             assert inv.notify("admin", "Title", "message", 0, "base64:%s" % base64.b64encode(b"test").decode()) is 1
             self.assertRegex(self.inv_mock.stdout.readline(), b'^[0-9.]+ _notify "admin" "Title" "message" 0 "dialog-information"\n?$')
 
+    def test_notify_users(self):
+        with mock.patch("gosa.client.plugins.notify.main.DBusRunner.get_instance") as m:
+            m.return_value.get_system_bus.return_value = self.dbus_con
+            inv = Notify()
+            time.sleep(0.3)
+            assert inv.notify_users(["admin", "tester"], "Title", "message") == {"admin": 1, "tester": 1}
+            self.assertRegex(self.inv_mock.stdout.readline(), b'^[0-9.]+ _notify "admin" "Title" "message" 0 "dialog-information"\n?$')
+            self.assertRegex(self.inv_mock.stdout.readline(), b'^[0-9.]+ _notify "tester" "Title" "message" 0 "dialog-information"\n?$')
+
     def test_notify_all(self):
         with mock.patch("gosa.client.plugins.notify.main.DBusRunner.get_instance") as m:
             m.return_value.get_system_bus.return_value = self.dbus_con
@@ -65,6 +65,28 @@ class ClientMqttServiceTestCase(TestCase):
             assert isinstance(args[0], Resume)
             assert mocked_handler.send_event.called
 
+    def test_handle_notification(self):
+        topic = "%s/client/broadcast" % self.env.domain
+        e = EventMaker()
+        cr = mock.MagicMock()
+        cr.getMethods.return_value = {"notify_all": {}}
+        with mock.patch.object(self.mqtt, "_MQTTClientService__cr", cr):
+            msg = e.Event(e.Notification(e.Target("*"), e.Title("Title"), e.Body("Message"), e.Timeout("10000")))
+            mocked_handler.simulate_message(topic, etree.tostring(msg))
+            cr.dispatch.assert_called_once_with("notify_all", "Title", "Message", 10, "_no_icon_")
+
+            # notifications for single users are ignored
+            cr.dispatch.reset_mock()
+            msg = e.Event(e.Notification(e.Target("admin"), e.Body("Message")))
+            mocked_handler.simulate_message(topic, etree.tostring(msg))
+            assert not cr.dispatch.called
+
+            # no notification service available
+            cr.getMethods.return_value = {}
+            msg = e.Event(e.Notification(e.Target("*"), e.Body("Message"), e.Icon("dialog-warning")))
+            mocked_handler.simulate_message(topic, etree.tostring(msg))
+            assert not cr.dispatch.called
+
     def test_commandReceived(self):
         topic = "%s/client/%s/%s" % (self.env.domain, self.env.uuid, uuid4())
 
@@ -9,11 +9,16 @@
 
 import logging
 import datetime
+import time
+import zlib
+import base64
 import paho.mqtt.client as mqtt
 import zope
+from threading import Lock
 
 from gosa.common.gjson import loads, dumps
-from tornado.queues import Queue, QueueEmpty
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
 from tornado import gen
 from gosa.common import Environment
 from gosa.common.components import JSONRPCException, PluginRegistry
@@ -56,7 +61,6 @@ class MQTTClient(object):
         >>> client.publish('/topic/to/publish', 'my message')
     """
     __published_messages = {}
-    __sync_message_queues = {}
     __sender_id = None
     __connection_retries = 3
     __connection_retry_delay = 3
@@ -107,6 +111,28 @@ class MQTTClient(object):
 
         self.subscriptions = {}
 
+        # RPC correlation: response topic -> pending request
+        self.__pending_requests = {}
+        # shared response subscriptions, kept until the client disconnects
+        self.__response_subscriptions = set()
+        self.__response_lock = Lock()
+        self.__rpc_stats = {
+            'requests': 0,
+            'responses': 0,
+            'timeouts': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0
+        }
+
+        # Batched publishing: (topic, qos, retain, proxied) -> list of queued contents
+        self.__batches = {}
+        self.__batch_lock = Lock()
+        self.__batch_window = self.env.config.getfloat('mqtt.batch-window', default=0.05)
+        self.__batch_size = self.env.config.getint('mqtt.batch-size', default=100)
+        self.__compress_threshold = self.env.config.getint('mqtt.compress-threshold', default=4096)
+        # batches are flushed on this loop, publish_batched may be called from any thread
+        self.__loop = IOLoop.current()
+
         # Listen for object events
         zope.event.subscribers.append(self.__handle_events)
 
@@ -239,6 +265,14 @@ class MQTTClient(object):
 
     def disconnect(self):
         """ disconnect from the MQTT broker """
+        if IOLoop.current(instance=False) is self.__loop:
+            self.flush_batch()
+        else:
+            self.__loop.add_callback(self.flush_batch)
+        with self.__response_lock:
+            for response_sub in self.__response_subscriptions:
+                self.remove_subscription(response_sub)
+            self.__response_subscriptions.clear()
         self.client.disconnect()
         self.client.loop_stop()
         self.__sender_id = None
@@ -353,54 +387,112 @@ class MQTTClient(object):
     def __on_message(self, client, userdata, message):
         self.log.debug("%s: __on_message client='%s', userdata='%s', message='%s'" % (self.get_identifier(), client, userdata, message.payload))
         payload = loads(message.payload)
-        if isinstance(payload, dict) and "content" in payload:
-            content = payload["content"]
+        if isinstance(payload, dict) and ("content" in payload or "batch" in payload):
             if self.__sender_id is not None and 'sender_id' in payload and payload['sender_id'] == self.__sender_id:
                 # skip own messages
                 return
+            contents = self.__unpack_batch(payload) if "batch" in payload else [payload["content"]]
         else:
-            content = payload
+            contents = [payload]
 
         subs = self.get_subscriptions(message.topic)
-        for sub in subs:
-            if sub['sync'] is True:
-                self.log.debug("%s: incoming message for synced topic %s" % (self.get_identifier(), message.topic))
-                self.__sync_message_queues[message.topic].put(content)
-            if 'callback' in sub and sub['callback'] is not None:
-                callback = sub['callback']
-                callback(message.topic, content)
-            elif sub['sync'] is not True:
-                self.log.warning("Incoming message not processed by async subscription because of missing callback")
+        for content in contents:
+            for sub in subs:
+                if sub['sync'] is True:
+                    self.log.debug("%s: incoming message for synced topic %s" % (self.get_identifier(), message.topic))
+                    self.__resolve_request(message.topic, content)
+                if 'callback' in sub and sub['callback'] is not None:
+                    callback = sub['callback']
+                    callback(message.topic, content)
+                elif sub['sync'] is not True:
+                    self.log.warning("Incoming message not processed by async subscription because of missing callback")
         if len(subs) == 0:
             self.log.warning("Incoming message for unhandled topic '%s'" % message.topic)
 
+    def __unpack_batch(self, payload):
+        """ extract the list of contents from a batch envelope """
+        batch = payload["batch"]
+        if payload.get("compression") == "zlib":
+            batch = loads(zlib.decompress(base64.b64decode(batch)).decode('utf-8'))
+        return batch
+
     @gen.coroutine
-    def get_sync_response(self, topic, message, qos=0):
+    def get_sync_response(self, topic, message, qos=0, timeout=10):
         """
         Sends a message to a client queue and waits and returns the response from the client.
 
+        The last level of the topic is used as correlation ID. Responses for all requests
+        sharing the same parent topic are received by one long-lived wildcard subscription
+        on ``<parent>/+/response``, which is created once per parent topic and removed on disconnect.
+
         :param topic: Topic this message should be sent to / received from
         :param message: The message published on the request topic
         :param qos: QOS value
+        :param timeout: seconds to wait for the response
         :return: The clients response
         """
-        # listen on the backend response topic
-        listen_to_topic = "%s/response" % topic
-        self.__sync_message_queues[listen_to_topic] = Queue()
-        self.add_subscription(listen_to_topic, sync=True)
-        self.publish("%s/request" % topic, message, qos)
+        response_topic = "%s/response" % topic
+        self.__ensure_response_subscription(topic)
+
+        future = Future()
+        self.__pending_requests[response_topic] = {
+            'future': future,
+            'loop': IOLoop.current(),
+            'started': time.time()
+        }
+        self.__rpc_stats['requests'] += 1
+
         # send to the client topic
+        self.publish("%s/request" % topic, message, qos)
         try:
-            response = yield self.__sync_message_queues[listen_to_topic].get(timeout=datetime.timedelta(seconds=10))
-            self.__sync_message_queues[listen_to_topic].task_done()
+            response = yield gen.with_timeout(datetime.timedelta(seconds=timeout), future)
             return response
-        except QueueEmpty:
+        except gen.TimeoutError:
+            self.__rpc_stats['timeouts'] += 1
             raise JSONRPCException("Timeout while waiting for the clients response")
         finally:
-            self.remove_subscription(listen_to_topic)
+            self.__pending_requests.pop(response_topic, None)
+
+    def __ensure_response_subscription(self, topic):
+        """ subscribe to the shared response topic of the topics parent, if not done yet """
+        parent = topic.rsplit("/", 1)[0] if "/" in topic else topic
+        response_sub = "%s/+/response" % parent
+        with self.__response_lock:
+            if response_sub not in self.__response_subscriptions:
+                self.__response_subscriptions.add(response_sub)
+                self.add_subscription(response_sub, qos=1, sync=True)
+
+    def __resolve_request(self, topic, content):
+        """ hand over an incoming response to the waiting request (called from the MQTT thread) """
+        request = self.__pending_requests.get(topic)
+        if request is None:
+            self.log.debug("%s: no pending request for response on '%s'" % (self.get_identifier(), topic))
+            return
+
+        latency = time.time() - request['started']
+        self.__rpc_stats['responses'] += 1
+        self.__rpc_stats['latency_total'] += latency
+        self.__rpc_stats['latency_max'] = max(self.__rpc_stats['latency_max'], latency)
+
+        def resolve():
+            if not request['future'].done():
+                request['future'].set_result(content)
+
+        request['loop'].add_callback(resolve)
+
+    def get_rpc_stats(self):
+        """
+        Return statistics about the RPC requests sent by this client
+
+        :return: dict with in-flight count, request/response/timeout counters and latency values (seconds)
+        """
+        stats = dict(self.__rpc_stats)
+        stats['in_flight'] = len(self.__pending_requests)
+        stats['latency_avg'] = stats['latency_total'] / stats['responses'] if stats['responses'] > 0 else 0.0
+        return stats
 
     @gen.coroutine
-    def publish(self, topic, content, qos=0, retain=False, retried=0, proxied=False):
+    def publish(self, topic, content, qos=0, retain=False, proxied=False):
         """ Publish a message on the MQTT bus"""
         message = {
             "sender_id": self.__sender_id,
@@ -409,16 +501,87 @@ class MQTTClient(object):
         if proxied is True:
             message['proxied_by'] = self.__sender_id
 
-        res, mid = self.client.publish(topic, payload=dumps(message), qos=qos, retain=retain)
+        yield self.__publish_payload(topic, dumps(message), qos=qos, retain=retain)
+
+    def publish_batched(self, topic, content, qos=0, retain=False, proxied=False):
+        """
+        Queue a message for publishing on the MQTT bus. All messages queued for the
+        same topic within the configured ``mqtt.batch-window`` (seconds) are sent
+        as one batch envelope, which is unpacked transparently by the receiving
+        MQTTClient. Use this for high volume event topics only, as it delays the
+        delivery by up to one batch window.
+
+        The batches are published on the IOLoop that was current when the client has
+        been created, so this method can be called from any thread.
+        """
+        if self.__batch_window <= 0:
+            return self.publish(topic, content, qos=qos, retain=retain, proxied=proxied)
+
+        key = (topic, qos, retain, proxied)
+        with self.__batch_lock:
+            if key not in self.__batches:
+                self.__batches[key] = []
+                self.__loop.add_callback(self.__loop.call_later, self.__batch_window, self.flush_batch, key)
+            self.__batches[key].append(content)
+            flush_now = len(self.__batches[key]) >= self.__batch_size
+
+        if flush_now:
+            self.__loop.add_callback(self.flush_batch, key)
+
+    @gen.coroutine
+    def flush_batch(self, key=None):
+        """
+        Publish the queued batches immediately, must be called on the IOLoop of the client
+
+        :param key: (topic, qos, retain, proxied) tuple of the batch to flush, flush all batches if None
+        """
+        with self.__batch_lock:
+            if key is None:
+                batches = self.__batches
+                self.__batches = {}
+            elif key in self.__batches:
+                batches = {key: self.__batches.pop(key)}
+            else:
+                # already flushed
+                return
+
+        for (topic, qos, retain, proxied), contents in batches.items():
+            if len(contents) == 1:
+                yield self.publish(topic, contents[0], qos=qos, retain=retain, proxied=proxied)
+                continue
+
+            message = {
+                "sender_id": self.__sender_id,
+                "batch": contents
+            }
+            if proxied is True:
+                message['proxied_by'] = self.__sender_id
+            payload = dumps(message)
+
+            if 0 < self.__compress_threshold <= len(payload):
+                message["compression"] = "zlib"
+                message["batch"] = base64.b64encode(zlib.compress(dumps(contents).encode('utf-8'))).decode('ascii')
+                payload = dumps(message)
+
+            self.log.debug("%s: publishing batch of %s messages to '%s'" % (self.get_identifier(), len(contents), topic))
+            yield self.__publish_payload(topic, payload, qos=qos, retain=retain)
+
+    @gen.coroutine
+    def __publish_payload(self, topic, payload, qos=0, retain=False):
+        retried = 0
+        while True:
+            res, mid = self.client.publish(topic, payload=payload, qos=qos, retain=retain)
+            self.__published_messages[mid] = res
+            if res != mqtt.MQTT_ERR_NO_CONN:
+                return
 
-        self.__published_messages[mid] = res
-        if res == mqtt.MQTT_ERR_NO_CONN:
             self.log.error("%s: mqtt server not reachable, message could not be send to '%s'" % (self.get_identifier(), topic))
+            if qos == 0 or retried >= 3:
+                return
 
-            if qos > 0 and retried < 3:
-                # try again
-                yield gen.sleep(0.1)
-                self.publish(topic, content, qos=qos, retain=retain, retried=retried+1)
+            # try again
+            retried += 1
+            yield gen.sleep(0.1)
 
     def will_set(self, topic, message, qos=0, retain=False):
         """
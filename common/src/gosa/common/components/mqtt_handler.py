@@ -120,13 +120,18 @@ class MQTTHandler(object):
         self.log.debug("%s: connected" % self.__client.get_identifier())
         callback()
 
-    def send_message(self, data, topic, qos=0, proxied=False):
-        """ Send message via proxy to mqtt. """
+    def send_message(self, data, topic, qos=0, proxied=False, batched=False):
+        """
+        Send message via proxy to mqtt. If *batched* is True, the message is
+        coalesced with other messages for the same topic (see :meth:`MQTTClient.publish_batched`).
+        """
+        if batched is True:
+            return self.__client.publish_batched(topic, data, qos=qos, proxied=proxied)
         return self.__client.publish(topic, data, qos=qos, proxied=proxied)
 
-    def send_event(self, event, topic, qos=0, proxied=False):
+    def send_event(self, event, topic, qos=0, proxied=False, batched=False):
         data = etree.tostring(event, pretty_print=True).decode('utf-8')
-        self.send_message(data, topic, qos=qos, proxied=proxied)
+        self.send_message(data, topic, qos=qos, proxied=proxied, batched=batched)
 
     def will_set(self, topic, event, qos=0, retain=False):
         """
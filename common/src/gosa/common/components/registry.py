@@ -8,7 +8,9 @@
 # See the LICENSE file in the project's top-level directory for details.
 
 import os
+import json
 import logging
+import time
 from inspect import isclass
 
 import itertools
@@ -36,12 +38,16 @@ class PluginRegistry(object):
     handlers = {}
     evreg = {}
     _event_parser = None
+    # startup timings (seconds) per plugin and phase: {name: {'import': .., 'init': .., 'serve': ..}}
+    startup_profile = {}
 
     def __init__(self, component=None):
         env = Environment.getInstance()
         self.env = env
         self.log = logging.getLogger(__name__)
         self.log.debug("initializing plugin registry")
+        start = time.time()
+        PluginRegistry.startup_profile = {}
 
         # Load common event resources
         base_dir = resource_filename('gosa.common', 'data/events') + os.sep
@@ -61,7 +67,9 @@ class PluginRegistry(object):
 
         for comp in components:
             for entry in iter_entry_points(comp):
+                started = time.time()
                 module = entry.load()
+                self.__profile(module.__name__, "import", started)
                 self.log.info("module %s included" % module.__name__)
                 PluginRegistry.modules[module.__name__] = module
 
@@ -88,28 +96,60 @@ class PluginRegistry(object):
 
         # Initialize component handlers
         for handler, clazz in PluginRegistry.handlers.items():
-             PluginRegistry.handlers[handler] = clazz()
+            started = time.time()
+            PluginRegistry.handlers[handler] = clazz()
+            self.__profile(handler, "init", started)
 
         # Initialize modules
         for module, clazz  in PluginRegistry.modules.items():
             if module in PluginRegistry.handlers:
                 PluginRegistry.modules[module] = PluginRegistry.handlers[module]
             else:
+                started = time.time()
                 if hasattr(clazz, 'get_instance'):
                     PluginRegistry.modules[module] = clazz.get_instance()
                 else:
                     PluginRegistry.modules[module] = clazz()
+                self.__profile(module, "init", started)
 
         # Let handlers serve
         for handler, clazz in sorted(PluginRegistry.handlers.items(),
                 key=lambda k: k[1]._priority_):
+            self.__serve(handler, clazz)
 
-            if hasattr(clazz, 'serve'):
-                clazz.serve()
+        self.__report(time.time() - start)
 
         #NOTE: For component handler: list implemented interfaces
         #print(list(zope.interface.implementedBy(module)))
 
+    def __profile(self, name, phase, started):
+        if name not in PluginRegistry.startup_profile:
+            PluginRegistry.startup_profile[name] = {}
+        PluginRegistry.startup_profile[name][phase] = time.time() - started
+
+    def __serve(self, handler, clazz):
+        if hasattr(clazz, 'serve'):
+            started = time.time()
+            clazz.serve()
+            self.__profile(handler, "serve", started)
+
+    def __report(self, duration):
+        """
+        Emit the startup timings as JSON, the slowest plugins first.
+        """
+        plugins = []
+        for name, timings in PluginRegistry.startup_profile.items():
+            entry = {'plugin': name, 'total': round(sum(timings.values()), 4)}
+            entry.update([(phase, round(value, 4)) for phase, value in timings.items()])
+            plugins.append(entry)
+        plugins.sort(key=lambda x: x['total'], reverse=True)
+
+        report = json.dumps({'total': round(duration, 4), 'plugins': plugins})
+        if self.env.config.getboolean("core.profile-startup", default=False):
+            self.log.info("startup profile: %s" % report)
+        else:
+            self.log.debug("startup profile: %s" % report)
+
     @staticmethod
     def shutdown():
         """
@@ -7,7 +7,7 @@
 #  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
 #
 # See the LICENSE file in the project's top-level directory for details.
-from threading import Timer
+from threading import Timer, Thread
 
 import pytest
 from tornado.testing import gen_test, AsyncTestCase
@@ -214,18 +214,90 @@ class MqttClientTestCase(AsyncTestCase):
         m_message = MessageMock()
 
         # test timeout
-        with pytest.raises(JSONRPCException), \
-                mock.patch("gosa.common.components.mqtt_client.Queue") as m_queue:
-            m_queue.return_value.get.side_effect = QueueEmpty()
-            res = yield self.mqtt.get_sync_response("test/topic", "message")
+        with pytest.raises(JSONRPCException):
+            yield self.mqtt.get_sync_response("test/topic", "message", timeout=0.1)
+        assert self.mqtt.get_rpc_stats()['timeouts'] == 1
+        assert self.mqtt.get_rpc_stats()['in_flight'] == 0
+        self.mqtt.client.subscribe.assert_called_once_with("test/+/response")
 
         def send():
             self.mqtt.client.on_message(None, None, m_message)
 
         timer = Timer(0.1, send)
         timer.start()
+        self.mqtt.client.subscribe.reset_mock()
+        other = self.mqtt.get_sync_response("test/other", "message", timeout=0.2)
         res = yield self.mqtt.get_sync_response("test/topic", "message")
 
         assert res == "message content"
 
+        # all requests share the response subscription created by the first one
+        with pytest.raises(JSONRPCException):
+            yield other
+        assert "test/+/response" in self.mqtt.subscriptions
+        assert not self.mqtt.client.subscribe.called
+        assert not self.mqtt.client.unsubscribe.called
+        stats = self.mqtt.get_rpc_stats()
+        assert stats['requests'] == 3
+        assert stats['responses'] == 1
+        assert stats['in_flight'] == 0
+
+        # the subscription is removed on disconnect
+        self.mqtt.disconnect()
+        assert "test/+/response" not in self.mqtt.subscriptions
+        self.mqtt.client.unsubscribe.assert_called_with("test/+/response")
+
+    @gen_test
+    def test_publish_batched(self):
+        self.mqtt.client.publish.return_value = (mqtt.MQTT_ERR_SUCCESS, 0)
+
+        # queued from another thread (like the MQTT network thread) and flushed on the IOLoop after the batch window
+        def queue():
+            self.mqtt.publish_batched("test/topic", "message1")
+            self.mqtt.publish_batched("test/topic", "message2")
+
+        thread = Thread(target=queue)
+        thread.start()
+        thread.join()
+        assert not self.mqtt.client.publish.called
 
+        yield gen.sleep(0.2)
+        assert self.mqtt.client.publish.call_count == 1
+        args, kwargs = self.mqtt.client.publish.call_args
+        assert args[0] == "test/topic"
+        payload = loads(kwargs['payload'])
+        assert payload['batch'] == ["message1", "message2"]
+
+        # full batches are flushed without waiting for the batch window
+        self.mqtt.client.publish.reset_mock()
+        self.mqtt._MQTTClient__batch_window = 10
+        self.mqtt._MQTTClient__batch_size = 2
+        self.mqtt.publish_batched("test/topic", "message3")
+        self.mqtt.publish_batched("test/topic", "message4")
+        yield gen.sleep(0.01)
+        args, kwargs = self.mqtt.client.publish.call_args
+        assert loads(kwargs['payload'])['batch'] == ["message3", "message4"]
+
+        # compressed batches
+        self.mqtt._MQTTClient__compress_threshold = 1
+        self.mqtt._MQTTClient__batch_size = 100
+        self.mqtt.publish_batched("test/topic", "message1")
+        self.mqtt.publish_batched("test/topic", "message2")
+        yield self.mqtt.flush_batch()
+        args, kwargs = self.mqtt.client.publish.call_args
+        payload = loads(kwargs['payload'])
+        assert payload['compression'] == "zlib"
+
+        # receiving side unpacks the batch
+        m_cb = mock.MagicMock()
+        self.mqtt.add_subscription("test/topic", callback=m_cb.callback)
+
+        class MessageMock:
+            topic = "test/topic"
+
+        m_message = MessageMock()
+        m_message.payload = kwargs['payload']
+        self.mqtt.client.on_message(None, None, m_message)
+        assert m_cb.callback.call_count == 2
+        m_cb.callback.assert_any_call("test/topic", "message1")
+        m_cb.callback.assert_any_call("test/topic", "message2")
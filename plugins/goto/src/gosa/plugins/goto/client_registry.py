@@ -0,0 +1,376 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+"""
+The client registry keeps the known GOto clients together with indexes that
+are maintained incrementally from the client events, so that lookups like
+"which online clients provide method X" or "where is user Y logged in" do not
+need to iterate over all clients.
+
+    >>> registry = ClientRegistry()
+    >>> registry.add("fake_client_uuid", {'name': 'Testclient', 'online': True, 'caps': {}, ...})
+    >>> registry.set_caps("fake_client_uuid", {'notify': {...}})
+    ([], ['notify'])
+    >>> registry.get_capable_clients("notify")
+    {'fake_client_uuid'}
+
+The :class:`ClientCallQueue` stores calls for methods a client does not provide yet
+in the database, so that they survive a restart of the backend. Calls expire after
+``goto.client-call-ttl`` seconds.
+"""
+import datetime
+import itertools
+from collections import deque
+from logging import getLogger
+from threading import RLock
+
+import sqlalchemy
+from sqlalchemy import Column, String, Integer, DateTime, Sequence, JSON
+
+from gosa.common import Environment
+from gosa.common.env import declarative_base, make_session
+
+Base = declarative_base()
+
+
+class ClientRegistry(object):
+    """
+    Known clients indexed by name, online state, capability and logged in users.
+    """
+
+    def __init__(self):
+        self.__lock = RLock()
+        self.__clients = {}
+        self.__names = {}
+        self.__online = set()
+        # method -> online clients providing it
+        self.__capabilities = {}
+        # client -> logged in users and user -> clients
+        self.__sessions = {}
+        self.__user_clients = {}
+
+    def __contains__(self, client):
+        return client in self.__clients
+
+    def __len__(self):
+        return len(self.__clients)
+
+    def get(self, client):
+        """ Return the information dict of a client or None """
+        return self.__clients.get(client)
+
+    def get_uuid(self, name):
+        """ Return the UUID of the client with the given host name or None """
+        return self.__names.get(name)
+
+    def add(self, client, info):
+        """ Add or replace a client, ``info`` needs the keys name, online and caps """
+        with self.__lock:
+            self.__remove_client(client)
+            self.__clients[client] = info
+            self.__names[info['name']] = client
+            if info['online']:
+                self.__online.add(client)
+                self.__index_caps(client, info['caps'])
+
+    def remove(self, client):
+        """ Remove a client including its user sessions """
+        with self.__lock:
+            self.__remove_client(client)
+            self.set_users(client, None)
+
+    def __remove_client(self, client):
+        info = self.__clients.pop(client, None)
+        if info is None:
+            return
+
+        if self.__names.get(info['name']) == client:
+            del self.__names[info['name']]
+        self.__online.discard(client)
+        self.__unindex_caps(client, info['caps'])
+
+    def __index_caps(self, client, methods):
+        for method in methods:
+            if method not in self.__capabilities:
+                self.__capabilities[method] = set()
+            self.__capabilities[method].add(client)
+
+    def __unindex_caps(self, client, methods):
+        for method in methods:
+            if method in self.__capabilities:
+                self.__capabilities[method].discard(client)
+                if not len(self.__capabilities[method]):
+                    del self.__capabilities[method]
+
+    def set_online(self, client, online):
+        """ Change the online state of a known client """
+        with self.__lock:
+            info = self.__clients.get(client)
+            if info is None or info['online'] == online:
+                return
+
+            info['online'] = online
+            if online:
+                self.__online.add(client)
+                self.__index_caps(client, info['caps'])
+            else:
+                self.__online.discard(client)
+                self.__unindex_caps(client, info['caps'])
+
+    def set_caps(self, client, caps):
+        """
+        Replace the capabilities of a known client.
+
+        ``Return:`` tuple with the lists of removed and added method names
+        """
+        with self.__lock:
+            info = self.__clients.get(client)
+            if info is None:
+                return [], []
+
+            current = info['caps']
+            info['caps'] = caps
+            removed = [m for m in current if m not in caps]
+            added = [m for m in caps if m not in current]
+            if info['online']:
+                self.__unindex_caps(client, removed)
+                self.__index_caps(client, added)
+            return removed, added
+
+    def is_online(self, client):
+        return client in self.__online
+
+    def get_online(self):
+        """ Return the set of online clients """
+        with self.__lock:
+            return set(self.__online)
+
+    def has_capability(self, client, method):
+        """ Check if an online client provides the method """
+        return client in self.__capabilities.get(method, ())
+
+    def get_capable_clients(self, method):
+        """ Return the set of online clients providing the method """
+        with self.__lock:
+            return set(self.__capabilities.get(method, ()))
+
+    def set_users(self, client, users):
+        """
+        Replace the logged in users of a client, ``None`` removes the session information.
+        """
+        with self.__lock:
+            for user in self.__sessions.get(client, []):
+                if user in self.__user_clients:
+                    self.__user_clients[user].discard(client)
+                    if not len(self.__user_clients[user]):
+                        del self.__user_clients[user]
+
+            if users is None:
+                self.__sessions.pop(client, None)
+                return
+
+            users = list(users)
+            self.__sessions[client] = users
+            for user in users:
+                if user not in self.__user_clients:
+                    self.__user_clients[user] = set()
+                self.__user_clients[user].add(client)
+
+    def add_user(self, client, user):
+        with self.__lock:
+            users = self.__sessions.get(client, [])
+            if user not in users:
+                self.set_users(client, users + [user])
+
+    def remove_user(self, client, user):
+        with self.__lock:
+            self.set_users(client, [x for x in self.__sessions.get(client, []) if x != user])
+
+    def has_session(self, client):
+        return client in self.__sessions
+
+    def get_users(self, client):
+        """ Return the list of users logged in on a client """
+        with self.__lock:
+            return list(self.__sessions.get(client, []))
+
+    def get_session_clients(self):
+        """ Return the list of clients with session information """
+        with self.__lock:
+            return list(self.__sessions)
+
+    def get_user_clients(self, user):
+        """ Return the list of clients the user is logged in """
+        with self.__lock:
+            return list(self.__user_clients.get(user, ()))
+
+
+class ClientCall(Base):
+    __tablename__ = 'goto-client-calls'
+
+    id = Column(Integer, Sequence('goto_client_call_id_seq'), primary_key=True, nullable=False)
+    client = Column(String)
+    method = Column(String)
+    args = Column(JSON)
+    kwargs = Column(JSON)
+    created = Column(DateTime)
+
+    def __repr__(self):  # pragma: nocover
+        return "<ClientCall(id='%s', client='%s', method='%s')>" % (self.id, self.client, self.method)
+
+
+class ClientCallQueue(object):
+    """
+    Calls that wait until a client provides the called method. The calls are stored in
+    the database and indexed by client and method.
+
+    A proxy keeps the calls in memory only, as its database is replicated from the master.
+
+    :param ttl: lifetime of the calls in seconds (0 keeps them until they are delivered or removed)
+    """
+
+    def __init__(self, ttl=3600):
+        self.env = Environment.getInstance()
+        self.log = getLogger(__name__)
+        self.ttl = ttl
+        self.persistent = self.env.mode != "proxy"
+        self.__lock = RLock()
+        self.__calls = {}
+        self.__methods = {}
+        # ids of the calls that are not stored in the database
+        self.__ids = itertools.count(1)
+        self.__started = False
+
+    def start(self):
+        """ Load the calls that have not been delivered before the last shutdown """
+        with self.__lock:
+            if self.__started is True:
+                return
+
+            if self.persistent is False:
+                self.__started = True
+                return
+
+            try:
+                Base.metadata.create_all(self.env.getDatabaseEngine("backend-database"), tables=[ClientCall.__table__])
+            except (sqlalchemy.exc.ProgrammingError, sqlalchemy.exc.IntegrityError):
+                # already exists
+                pass
+
+            with make_session() as session:
+                expired = self.__get_expiry()
+                if expired is not None:
+                    session.query(ClientCall).filter(ClientCall.created < expired).delete(synchronize_session=False)
+                    session.commit()
+
+                for call in session.query(ClientCall).order_by(ClientCall.id):
+                    self.__append(call.client, call.method, call.id, call.args, call.kwargs, call.created)
+            if len(self):
+                self.log.info("loaded %s queued client calls" % len(self))
+            self.__started = True
+
+    def __get_expiry(self):
+        """ Calls created before the returned time are expired """
+        if self.ttl <= 0:
+            return None
+        return datetime.datetime.now() - datetime.timedelta(seconds=self.ttl)
+
+    def __append(self, client, method, call_id, args, kwargs, created):
+        key = (client, method)
+        if key not in self.__calls:
+            self.__calls[key] = deque()
+        self.__calls[key].append((call_id, args, kwargs, created))
+        self.__methods[method] = self.__methods.get(method, 0) + 1
+
+    def __discard(self, key, calls):
+        """ Remove calls of a client method from the indexes and the database """
+        remaining = deque(x for x in self.__calls[key] if x not in calls)
+        if len(remaining):
+            self.__calls[key] = remaining
+        else:
+            del self.__calls[key]
+
+        method = key[1]
+        self.__methods[method] -= len(calls)
+        if self.__methods[method] <= 0:
+            del self.__methods[method]
+
+        if self.persistent is False:
+            return
+
+        with make_session() as session:
+            session.query(ClientCall).filter(ClientCall.id.in_([x[0] for x in calls])).delete(synchronize_session=False)
+            session.commit()
+
+    def put(self, client, method, args, kwargs):
+        """ Queue a call until the client provides the method """
+        self.start()
+        with self.__lock:
+            created = datetime.datetime.now()
+            if self.persistent is True:
+                with make_session() as session:
+                    call = ClientCall(client=client, method=method, args=list(args), kwargs=kwargs, created=created)
+                    session.add(call)
+                    session.commit()
+                    call_id = call.id
+            else:
+                call_id = next(self.__ids)
+
+            self.__append(client, method, call_id, list(args), kwargs, created)
+
+    def pop(self, client, method):
+        """
+        Remove the queued calls of a client method.
+
+        ``Return:`` list of (args, kwargs) tuples in the order they have been queued, expired calls are skipped
+        """
+        with self.__lock:
+            calls = list(self.__calls.get((client, method), []))
+            if not len(calls):
+                return []
+            self.__discard((client, method), calls)
+
+        expired = self.__get_expiry()
+        return [(args, kwargs) for call_id, args, kwargs, created in calls if expired is None or created >= expired]
+
+    def remove(self, client, user=None):
+        """
+        Remove the queued calls of a client, e.g. when it has been purged.
+
+        :param user: only remove the calls for this user (calls with the user as first argument)
+        """
+        with self.__lock:
+            for key in [x for x in self.__calls if x[0] == client]:
+                calls = [x for x in self.__calls[key] if user is None or (len(x[1]) and x[1][0] == user)]
+                if len(calls):
+                    self.__discard(key, calls)
+
+    def expire(self):
+        """ Remove the calls that are older than :attr:`ttl` """
+        expired = self.__get_expiry()
+        if expired is None:
+            return
+
+        with self.__lock:
+            for key in list(self.__calls):
+                calls = [x for x in self.__calls[key] if x[3] < expired]
+                if len(calls):
+                    self.log.debug("dropping %s expired %s calls for client %s" % (len(calls), key[1], key[0]))
+                    self.__discard(key, calls)
+
+    def has_method(self, method):
+        """ Check if there are queued calls for the method of any client """
+        return method in self.__methods
+
+    def get_methods(self):
+        with self.__lock:
+            return list(self.__methods)
+
+    def __len__(self):
+        return sum(self.__methods.values())
@@ -10,21 +10,23 @@ import json
 import re
 import datetime
 import logging
+import time
+from threading import RLock
 from uuid import uuid4
-from copy import copy
 
 import ldap
 import zope
 from ldap.dn import str2dn, dn2str
 
 from gosa.backend.lock import GlobalLock
-from gosa.backend.objects import ObjectProxy
+from gosa.backend.objects import ObjectProxy, ObjectSnapshot
 from gosa.common.components.jsonrpc_utils import Binary
 from lxml import etree
 
 from gosa.backend.components.jsonrpc_service import JsonRpcHandler
 from gosa.common.components.mqtt_handler import MQTTHandler
 from tornado import gen
+from tornado.concurrent import is_future
 from zope.interface import implementer
 from gosa.common.components.jsonrpc_proxy import JSONRPCException
 from gosa.common.gjson import loads, dumps
@@ -38,6 +40,8 @@ from gosa.common.components.mqtt_proxy import MQTTServiceProxy
 from gosa.common.components import Plugin
 from gosa.common.components.command import Command
 from gosa.plugins.goto.in_out_filters import mapping
+from gosa.plugins.goto.session_config import SessionConfigCache
+from gosa.plugins.goto.client_registry import ClientRegistry, ClientCallQueue
 from base64 import b64encode as encode
 
 # Register the errors handled  by us
@@ -73,19 +77,22 @@ class ClientService(Plugin):
     +------------------+------------+-------------------------------------------------------------+
     + timeout          | Integer    + Client ping interval.                                       |
     +------------------+------------+-------------------------------------------------------------+
+    + presence-flush-  | Integer    + Interval (seconds) in which online/offline changes of the   |
+    + interval         |            + clients are written to their devices.                       |
+    +------------------+------------+-------------------------------------------------------------+
+    + session-config-  | Integer    + Lifetime (seconds) of the cached user configurations        |
+    + ttl              |            + (0 disables the cache, always disabled in proxy mode).      |
+    +------------------+------------+-------------------------------------------------------------+
 
     """
     
     _priority_ = 90
     _target_ = 'goto'
-    __client = {}
     __proxy = {}
-    __user_session = {}
     __listeners = {}
     entry_attributes = ['cn', 'description', 'gosaApplicationPriority', 'gosaApplicationIcon', 'gosaApplicationName', 'gotoLogonScript', 'gosaApplicationFlags', 'gosaApplicationExecute']
     entry_map = {"gosaApplicationPriority": "prio", "description": "description"}
     printer_attributes = ["gotoPrinterPPD", "labeledURI", "cn", "l", "description"]
-    __client_call_queue = {}
     ppd_proxy = None
     __current_backend_rpc = None
     # changes that need to be verified by the proxy to know if its in sync
@@ -103,6 +110,26 @@ class ClientService(Plugin):
         self.__cr = None
         self.mqtt = None
 
+        # online state of the clients as persisted in their devices and the pending changes
+        self.__presence = {}
+        self.__presence_pending = {}
+        self.__presence_lock = RLock()
+
+        # known clients indexed by capability and logged in users
+        self.__client = ClientRegistry()
+
+        # calls waiting for a client method to become available
+        self.__client_call_queue = ClientCallQueue(self.env.config.getint("goto.client-call-ttl", default=3600))
+
+        # delivery accounting of the user notifications
+        self.__notification_stats = {'sent': 0, 'delivered': 0, 'failed': 0, 'broadcasts': 0}
+        self.__notification_lock = RLock()
+
+        # generated user configurations per client and user, a proxy does not get the object changes
+        # that are replicated from the master and cannot keep the cache up to date
+        ttl = 0 if self.env.mode == "proxy" else self.env.config.getint("goto.session-config-ttl", default=600)
+        self.__session_config = SessionConfigCache(ttl, volatile_attributes=["deviceStatus"] + list(mapping.values()))
+
     def __get_handler(self):
         if self.mqtt is None:
             self.mqtt = MQTTHandler(client_id_prefix="ClientService")
@@ -125,6 +152,13 @@ class ClientService(Plugin):
         # Register scheduler task to remove outdated clients
         sched = PluginRegistry.getInstance('SchedulerService').getScheduler()
         sched.add_interval_job(self.__gc, minutes=1, tag='_internal', jobstore="ram")
+        sched.add_interval_job(self.flush_presence, seconds=self.env.config.getint("goto.presence-flush-interval", default=5),
+                               tag='_internal', jobstore="ram")
+
+        # deliver the queued calls that are left from the last run as soon as the clients provide the methods
+        self.__client_call_queue.start()
+        for method in self.__client_call_queue.get_methods():
+            self.register_listener(method, self._on_client_caps)
 
         # self.register_listener("configureHostPrinters", self._on_client_caps)
         self.ppd_proxy = PluginRegistry.getInstance("PPDProxy")
@@ -134,8 +168,13 @@ class ClientService(Plugin):
         React on object modifications to keep active ACLs up to date.
         """
         if event.__class__.__name__ == "IndexSyncFinished":
+            # the index scan may have found changes that have not been announced by events
+            self.__session_config.clear()
             self.__refresh()
 
+        elif event.__class__.__name__ == "ObjectChanged":
+            self.__session_config.handle_event(event)
+
         elif event.__class__.__name__ == "ACLChanged":
             if self.env.mode != "proxy":
                 e = EventMaker()
@@ -151,21 +190,21 @@ class ClientService(Plugin):
 
     def __refresh(self):
         # Initially check if we need to ask for client caps
-        if not self.__client:
+        if not len(self.__client):
             e = EventMaker()
             self.mqtt.send_event(e.Event(e.ClientPoll()), "%s/client/broadcast" % self.env.domain)
 
     def stop(self):  # pragma: nocover
-        pass
+        self.flush_presence()
 
     def get_client_uuid(self, name_or_uuid):
         if is_uuid(name_or_uuid):
             return name_or_uuid
         else:
             # hostname used
-            for uuid in self.__client:
-                if self.__client[uuid]["name"] == name_or_uuid:
-                    return uuid
+            uuid = self.__client.get_uuid(name_or_uuid)
+            if uuid is not None:
+                return uuid
         return name_or_uuid
 
     @Command(__help__=N_("List available clients."), type="READONLY")
@@ -176,8 +215,9 @@ class ClientService(Plugin):
         ``Return:`` dict with name and timestamp information, indexed by UUID
         """
         res = {}
-        for uuid, info in self.__client.items():
-            if info['online']:
+        for uuid in self.__client.get_online():
+            info = self.__client.get(uuid)
+            if info is not None:
                 res[uuid] = {'name': info['name'], 'last-seen': info['last-seen']}
         return res
 
@@ -202,9 +242,9 @@ class ClientService(Plugin):
         # Bail out if the client is not available
         if not client in self.__client:
             raise JSONRPCException("client '%s' not available" % client)
-        if not self.__client[client]['online']:
+        if not self.__client.is_online(client):
             raise JSONRPCException("client '%s' is offline" % client)
-        if not method in self.__client[client]['caps']:
+        if not self.__client.has_capability(client, method):
             raise JSONRPCException("client '%s' has no method '%s' exported" % (client, method))
 
         # Generate tag queue name
@@ -224,7 +264,7 @@ class ClientService(Plugin):
 
     @Command(__help__=N_("Check if the client supports a method call"), type="READONLY")
     def hasCapability(self, client_id, method):
-        return client_id in self.__client and method in self.__client[client_id]
+        return self.__client.has_capability(self.get_client_uuid(client_id), method)
 
     def queuedClientDispatch(self, client, method, *arg, **larg):
         client = self.get_client_uuid(client)
@@ -232,17 +272,12 @@ class ClientService(Plugin):
         # Bail out if the client is not available
         if client not in self.__client:
             raise JSONRPCException("client '%s' not available" % client)
-        if not self.__client[client]['online']:
+        if not self.__client.is_online(client):
             raise JSONRPCException("client '%s' is offline" % client)
-        if method not in self.__client[client]['caps']:
+        if not self.__client.has_capability(client, method):
             # wait til method gets available
-            if client not in self.__client_call_queue:
-                self.__client_call_queue[client] = {}
-            if method not in self.__client_call_queue[client]:
-                self.__client_call_queue[client][method] = []
-            if method not in self.__listeners:
-                self.register_listener(method, self._on_client_caps)
-            self.__client_call_queue[client][method].append((arg, larg))
+            self.__client_call_queue.put(client, method, arg, larg)
+            self.register_listener(method, self._on_client_caps)
         else:
             self.clientDispatch(client, method, *arg, **larg)
 
@@ -269,7 +304,7 @@ class ClientService(Plugin):
         if not client in self.__client:
             return []
 
-        res = self.__client[client]['network']
+        res = self.__client.get(client)['network']
         return res
 
     @Command(__help__=N_("List available client methods for specified client."), type="READONLY")
@@ -281,12 +316,10 @@ class ClientService(Plugin):
         """
         client = self.get_client_uuid(client)
 
-        if not client in self.__client:
-            return []
-        if not self.__client[client]['online']:
+        if not self.__client.is_online(client):
             return []
 
-        return self.__client[client]['caps']
+        return self.__client.get(client)['caps']
 
     @Command(__help__=N_("List user sessions per client"), type="READONLY")
     def getUserSessions(self, client=None):
@@ -295,16 +328,16 @@ class ClientService(Plugin):
         """
         if client:
             client = self.get_client_uuid(client)
-            return list(self.__user_session[client]) if client in self.__user_session else []
+            return self.__client.get_users(client)
 
-        return list(self.__user_session)
+        return self.__client.get_session_clients()
 
     @Command(__help__=N_("List clients a user is logged in"), type="READONLY")
     def getUserClients(self, user):
         """
         TODO
         """
-        return [client for client, users in self.__user_session.items() if user in users]
+        return self.__client.get_user_clients(user)
 
     @Command(__help__=N_("Get the destinationIndicator for a user"))
     def getDestinationIndicator(self, client_id, uid, cn_query, rotate=True):
@@ -362,51 +395,109 @@ class ClientService(Plugin):
     def notifyUser(self, users, title, message, timeout=10, level='normal', icon="dialog-information"):
         """
         Send a notification request to the user client.
+
+        The recipients are grouped by client, so every client gets a single message, no matter
+        how many of the users are logged in there. Notifications to all users are broadcasted
+        to the clients in one message.
+
+        ``Return:`` dict with the number of addressed clients, sent messages and the users without client
         """
 
         if icon is None:
             icon = "_no_icon_"
 
+        res = {'clients': 0, 'messages': 0, 'unreachable': []}
+
         if users:
             # Notify a single / group of users
             if type(users) != list:
                 users = [users]
 
+            recipients = {}
             for user in users:
                 clients = self.getUserClients(user)
                 if clients:
                     for client in clients:
-                        try:
-                            self.clientDispatch(client, "notify", user, title, message,
-                                    timeout, icon)
-                        #pylint: disable=W0141
-                        except Exception as e:
-                            import traceback
-                            traceback.print_exc()
-                            self.log.error("sending message failed: %s" % str(e))
+                        if client not in recipients:
+                            recipients[client] = []
+                        recipients[client].append(user)
                 else:
                     self.log.error("sending message failed: no client found for user '%s'" % user)
+                    res['unreachable'].append(user)
 
                 # Notify websession user if available
                 if JsonRpcHandler.user_sessions_available(user):
                     mqtt = self.__get_handler()
                     mqtt.send_event(self.notification2event(user, title, message, timeout, icon), topic="%s/client/%s" % (self.env.domain, user))
 
+            for client, client_users in recipients.items():
+                res['clients'] += 1
+                if len(client_users) > 1 and self.__client.has_capability(client, "notify_users"):
+                    res['messages'] += self.__dispatch_notification(client, "notify_users", client_users, title, message, timeout, icon)
+                else:
+                    for user in client_users:
+                        res['messages'] += self.__dispatch_notification(client, "notify", user, title, message, timeout, icon)
+
         else:
-            # Notify all users
-            for client in self.__client.keys():
-                try:
-                    self.clientDispatch(client, "notify_all", title, message,
-                            timeout, icon)
-                #pylint: disable=W0141
-                except Exception:
-                    pass
+            # Notify all users, clients that provide "notify_users" understand the broadcasted event
+            broadcast = self.__client.get_capable_clients("notify_users")
+            if len(broadcast):
+                mqtt = self.__get_handler()
+                mqtt.send_event(self.notification2event("*", title, message, timeout, icon), "%s/client/broadcast" % self.env.domain)
+                res['clients'] += len(broadcast)
+                res['messages'] += 1
+                with self.__notification_lock:
+                    self.__notification_stats['broadcasts'] += 1
+
+            for client in self.__client.get_online() - broadcast:
+                res['clients'] += 1
+                res['messages'] += self.__dispatch_notification(client, "notify_all", title, message, timeout, icon, log=False)
 
             # Notify all websession users if any
             if JsonRpcHandler.user_sessions_available(None):
                 mqtt = self.__get_handler()
                 mqtt.send_event(self.notification2event("*", title, message, timeout, icon))
 
+        return res
+
+    def __dispatch_notification(self, client, method, *args, log=True):
+        """
+        Send a notification to a client and count the delivery.
+
+        ``Return:`` number of sent messages
+        """
+        def account(future):
+            with self.__notification_lock:
+                if future.exception() is not None:
+                    self.__notification_stats['failed'] += 1
+                    if log is True:
+                        self.log.error("sending message to client '%s' failed: %s" % (client, str(future.exception())))
+                else:
+                    self.__notification_stats['delivered'] += 1
+
+        try:
+            future = self.clientDispatch(client, method, *args)
+        except Exception as e:
+            with self.__notification_lock:
+                self.__notification_stats['failed'] += 1
+            if log is True:
+                self.log.error("sending message failed: %s" % str(e))
+            return 0
+
+        with self.__notification_lock:
+            self.__notification_stats['sent'] += 1
+        if is_future(future):
+            future.add_done_callback(account)
+        return 1
+
+    @Command(__help__=N_("Get the delivery statistics of the user notifications"), type="READONLY")
+    def getNotificationStatistics(self):
+        """
+        ``Return:`` dict with the number of sent, delivered and failed client messages and broadcasts
+        """
+        with self.__notification_lock:
+            return dict(self.__notification_stats)
+
     def notification2event(self, user, title, message, timeout, icon):
         e = EventMaker()
         data = [e.Target(user)]
@@ -430,6 +521,14 @@ class ClientService(Plugin):
             raise ValueError(C.make_error("CLIENT_NOT_FOUND", client=device_uuid, status_code=404))
         return ObjectProxy(res[0]['dn'], read_only=read_only, from_db_only=True)
 
+    def __get_device_status(self, device_uuid):
+        """ Read the status flags of a device from the index """
+        device_uuid = self.get_client_uuid(device_uuid)
+        res = ObjectSnapshot.query({'_type': 'Device', 'deviceUUID': device_uuid}, attributes=list(mapping.values()))
+        if len(res) != 1:
+            raise ValueError(C.make_error("CLIENT_NOT_FOUND", client=device_uuid, status_code=404))
+        return res[0]
+
     @Command(__help__=N_("Set system status"), type="READONLY")
     def systemGetStatus(self, device_uuid):
         """
@@ -451,14 +550,25 @@ class ClientService(Plugin):
             return
 
         if isinstance(device_uuid, str):
-            device = self.__open_device(device_uuid)
+            device = self.__get_device_status(device_uuid)
         else:
             device = device_uuid
+
         r = re.compile(r"([+-].)")
+        changes = {}
         for stat in r.findall(status):
             if stat[1] not in mapping:
                 raise ValueError(C.make_error("CLIENT_STATUS_INVALID", client=device_uuid, status=stat[1]))
-            setattr(device, mapping[stat[1]], stat.startswith("+"))
+            changes[mapping[stat[1]]] = stat.startswith("+")
+
+        if isinstance(device, ObjectSnapshot):
+            if all(device.get(name) == value for name, value in changes.items()):
+                # the device already has this status
+                return
+            device = ObjectProxy(device.dn, from_db_only=True)
+
+        for name, value in changes.items():
+            setattr(device, name, value)
         device.commit()
 
     @Command(needsUser=True, __help__=N_("Join a client to the GOsa infrastructure."))
@@ -600,13 +710,10 @@ class ClientService(Plugin):
         id = str(data.Id)
         if hasattr(data.User, 'Name'):
             users = list(map(str, data.User.Name))
-            if id in self.__user_session:
-                new_users = list(set.difference(set(users), set(self.__user_session[id])))
-            else:
-                # all users are new
-                new_users = users
+            # users that are not known yet are new
+            new_users = list(set.difference(set(users), set(self.__client.get_users(id))))
 
-            self.__user_session[id] = users
+            self.__client.set_users(id, users)
 
             # proxied user events need no configuration as the proxy sends an extra RPC for that
             if not hasattr(data, "Proxied") or data.Proxied is False:
@@ -618,19 +725,16 @@ class ClientService(Plugin):
                     self.configureUsers(id, new_users)
 
         else:
-            self.__user_session[id] = []
+            self.__client.set_users(id, [])
             self.systemSetStatus(id, "-B")
 
-        self.log.debug("updating client '%s' user session: %s" % (id, ','.join(self.__user_session[id])))
+        self.log.debug("updating client '%s' user session: %s" % (id, ','.join(self.__client.get_users(id))))
 
     @Command(__help__=N_("Prepare a user session after a user has logged in"), type="PROXY")
     def preUserSession(self, client_id, user_name, skip_config=False):
         sobj = PluginRegistry.getInstance("SchedulerService")
         # delay changes, send configuration first
-        if client_id not in self.__user_session:
-            self.__user_session[client_id] = [user_name]
-        elif user_name not in self.__user_session[client_id]:
-            self.__user_session[client_id].append(user_name)
+        self.__client.add_user(client_id, user_name)
 
         if self.env.mode == "proxy":
             # answer config locally and proceed the write-part of the call to the GOsa backend
@@ -681,11 +785,10 @@ class ClientService(Plugin):
         :param client_id: clients deviceUUID
         :param user: uid of the user that has logged out
         """
-        if client_id not in self.__user_session:
-            self.__user_session[client_id] = []
-        if user in self.__user_session[client_id]:
-            self.__user_session[client_id].remove(user)
-        if len(self.__user_session[client_id]) == 0:
+        self.__client.remove_user(client_id, user)
+        # the configuration of the session is not needed anymore
+        self.__client_call_queue.remove(client_id, user=user)
+        if len(self.__client.get_users(client_id)) == 0:
             self.systemSetStatus(client_id, "-B")
             return True
         return False
@@ -706,20 +809,63 @@ class ClientService(Plugin):
                 self.log.debug("sending screen resolution: %sx%s for user %s to client %s" % (config["resolution"][0], config["resolution"][1], uid, client_id))
                 self.queuedClientDispatch(client_id, "dbus_configureUserScreen", uid, config["resolution"][0], config["resolution"][1])
 
+    @Command(__help__=N_("Get statistics of the user configuration cache and the latency of the configuration requests"), type="READONLY")
+    def getSessionConfigStatistics(self):
+        """
+        ``Return:`` dict with cache hits/misses and the latency percentiles (ms)
+        """
+        return self.__session_config.get_statistics()
+
     def __collect_user_configuration(self, client_id, users):
         """
         :param client_id: deviceUUID or hostname
         :param users: list of currently logged in users on the client
         """
+        start = time.time()
+        key = client_id.dn if isinstance(client_id, ObjectProxy) else self.get_client_uuid(client_id)
+
+        config = {}
+        missing = []
+        for uid in users:
+            user_config = self.__session_config.get(key, uid)
+            if user_config is None:
+                missing.append(uid)
+            else:
+                config[uid] = user_config
+
+        if len(missing):
+            build = self.__session_config.begin()
+            try:
+                dependencies = set()
+                for uid, user_config in self.__build_user_configuration(client_id, missing, dependencies).items():
+                    self.__session_config.put(key, uid, user_config, dependencies, build)
+                    config[uid] = user_config
+            finally:
+                self.__session_config.end(build)
+
+        duration = time.time() - start
+        self.__session_config.record(duration, not len(missing))
+        self.log.debug("collected configuration of %s for client %s in %.3fs (%s cached)" %
+                       (users, key, duration, len(users) - len(missing)))
+        return config
+
+    def __build_user_configuration(self, client_id, users, dependencies):
+        """
+        :param client_id: deviceUUID or hostname
+        :param users: list of currently logged in users on the client
+        :param dependencies: set that gets the DNs and UUIDs of all objects the configuration depends on
+        """
         if isinstance(client_id, ObjectProxy):
             client = client_id
         else:
             client = self.__open_device(client_id, read_only=True)
+        dependencies.update([client.dn, client.uuid])
         group = None
         index = PluginRegistry.getInstance("ObjectIndex")
         res = index.search({"_type": "GroupOfNames", "member": client.dn}, {"dn": 1})
         if len(res) > 0:
             group = ObjectProxy(res[0]["dn"], read_only=True)
+            dependencies.add(group.dn)
         config = {}
 
         resolution = None
@@ -741,6 +887,7 @@ class ClientService(Plugin):
                     break
                 else:
                     parent_group = ObjectProxy(res[0]["dn"], read_only=True)
+                    dependencies.add(parent_group.dn)
                     release = parent_group.getReleaseName()
 
         if release is None:
@@ -751,10 +898,8 @@ class ClientService(Plugin):
         if hasattr(client, "gotoMenu") and client.gotoMenu is not None:
             client_menu = loads(client.gotoMenu)
 
-        # collect users DNs
-        query_result = index.search({"_type": "User", "uid": {"in_": users}}, {"dn": 1})
-        for entry in query_result:
-            user = ObjectProxy(entry["dn"], read_only=True)
+        for user in ObjectSnapshot.query({"_type": "User", "uid": {"in_": users}}, attributes=["uid", "gosaDefaultPrinter"]):
+            dependencies.add(user.dn)
             config[user.uid] = {}
 
             if release is not None:
@@ -765,7 +910,8 @@ class ClientService(Plugin):
                 # get all groups the user is member of which have a menu for the given release
                 query = {'_type': 'GroupOfNames', "member": user.dn, "extension": "GotoMenu", "gotoLsbName": release}
 
-                for res in index.search(query, {"gotoMenu": 1}):
+                for res in index.search(query, {"dn": 1, "gotoMenu": 1}):
+                    dependencies.add(res["dn"])
                     # collect user menus
                     for m in res.get("gotoMenu", []):
                         menus.append(loads(m))
@@ -773,6 +919,7 @@ class ClientService(Plugin):
                 if len(menus):
                     user_menu = None
                     for menu_entry in menus:
+                        self.__collect_menu_dependencies(menu_entry, dependencies)
                         if user_menu is None:
                             user_menu = self.get_submenu(menu_entry)
                         else:
@@ -780,16 +927,16 @@ class ClientService(Plugin):
                     config[user.uid]["menu"] = user_menu
 
             # collect printer settings for user, starting with the clients printers
-            settings = self.__collect_printer_settings(group)
+            settings = self.__collect_printer_settings(group, dependencies)
             printer_names = [x["cn"] for x in settings["printers"]]
             # get all GroupOfNames with GotoEnvironment the user or client is member of
-            for res in index.search({'_type': 'GroupOfNames', "member": {"in_": [user.dn, client.dn]}, "extension": "GotoEnvironment"},
-                                    {"dn": 1}):
-                user_group = ObjectProxy(res["dn"], read_only=True)
+            for user_group in ObjectSnapshot.query({'_type': 'GroupOfNames', "member": {"in_": [user.dn, client.dn]}, "extension": "GotoEnvironment"},
+                                                   attributes=["gotoXResolution", "gotoPrinters", "gotoDefaultPrinter"]):
                 if group is not None and user_group.dn == group.dn:
                     # this group has already been handled
                     continue
-                s = self.__collect_printer_settings(user_group)
+                dependencies.add(user_group.dn)
+                s = self.__collect_printer_settings(user_group, dependencies)
 
                 if user_group.gotoXResolution is not None:
                     resolution = user_group.gotoXResolution
@@ -803,7 +950,7 @@ class ClientService(Plugin):
                     settings["defaultPrinter"] = s["defaultPrinter"]
 
             # override group environment settings if the client has one
-            s = self.__collect_printer_settings(client)
+            s = self.__collect_printer_settings(client, dependencies)
             if len(s["printers"]) > 0:
                 settings["printers"] = s["printers"]
                 settings["defaultPrinter"] = s["defaultPrinter"]
@@ -822,24 +969,26 @@ class ClientService(Plugin):
                         return None
                     elif len(res) == 1:
                         # add this one to the result set
-                        printer = ObjectProxy(res[0]["dn"], read_only=True)
+                        printer = res[0]
+                        dependencies.add(printer.dn)
                         p_conf = {}
                         for attr in self.printer_attributes:
-                            p_conf[attr] = getattr(printer, attr)
+                            p_conf[attr] = printer.get(attr)
                         return p_conf
                     return False
 
                 if found is False:
                     # find the printer and add it to the settings
-                    res = index.search({"_type": "GotoPrinter", "cn": user.gosaDefaultPrinter}, {"dn": 1})
+                    res = ObjectSnapshot.query({"_type": "GotoPrinter", "cn": user.gosaDefaultPrinter},
+                                               attributes=self.printer_attributes)
                     printer_config = process(res)
                     if printer_config is False:
                         # more than 1 printers found by this CN, try to look in the users subtree
-                        res = index.search({
+                        res = ObjectSnapshot.query({
                             "_type": "GotoPrinter",
                             "cn": user.gosaDefaultPrinter,
                             "_adjusted_parent_dn": user.get_adjusted_parent_dn()
-                        }, {"dn": 1})
+                        }, attributes=self.printer_attributes)
                         printer_config = process(res)
 
                     if isinstance(printer_config, dict):
@@ -859,6 +1008,13 @@ class ClientService(Plugin):
             # TODO: collect and send login scripts to client
         return config
 
+    def __collect_menu_dependencies(self, entries, dependencies):
+        for entry in entries:
+            if 'children' in entry:
+                self.__collect_menu_dependencies(entry['children'], dependencies)
+            elif 'dn' in entry:
+                dependencies.add(entry['dn'])
+
     def merge_submenu(self, menu1, menu2):
         for cn, app in menu2.get('apps', {}).items():
             if cn in menu1['apps']:
@@ -925,8 +1081,8 @@ class ClientService(Plugin):
         """
         :param client_id: deviceUUID or hostname
         """
-        if client_id in self.__user_session:
-            self.configureUsers(client_id, self.__user_session[client_id])
+        if self.__client.has_session(client_id):
+            self.configureUsers(client_id, self.__client.get_users(client_id))
         else:
             self.log.debug("no active user found for client %s" % client_id)
 
@@ -943,18 +1099,23 @@ class ClientService(Plugin):
         if "defaultPrinter" in config and config["defaultPrinter"] is not None:
             self.queuedClientDispatch(client_id, "dbus_defaultPrinter", config["defaultPrinter"])
 
-    def __collect_printer_settings(self, object):
+    def __collect_printer_settings(self, object, dependencies):
         settings = {"printers": [], "defaultPrinter": None}
         if object is not None and object.is_extended_by("GotoEnvironment") and len(object.gotoPrinters):
             # get default printer
             settings["defaultPrinter"] = object.gotoDefaultPrinter
+            dependencies.update(object.gotoPrinters)
 
             # collect printer PPDs
+            printers = ObjectSnapshot.load(object.gotoPrinters, attributes=self.printer_attributes)
             for printer_dn in object.gotoPrinters:
-                printer = ObjectProxy(printer_dn, read_only=True)
+                if printer_dn not in printers:
+                    self.log.warning("printer not found: %s" % printer_dn)
+                    continue
+                printer = printers[printer_dn]
                 p_conf = {}
                 for attr in self.printer_attributes:
-                    p_conf[attr] = getattr(printer, attr) if getattr(printer, attr) is not None else ""
+                    p_conf[attr] = printer.get(attr) if printer.get(attr) is not None else ""
                     if attr == "gotoPrinterPPD" and p_conf[attr] != "":
                         p_conf[attr] = self.ppd_proxy.getPPDURL(p_conf[attr])
 
@@ -971,7 +1132,7 @@ class ClientService(Plugin):
 
         self.__set_client_online(client)
         if client in self.__client:
-            self.__client[client]['last-seen'] = datetime.datetime.utcnow()
+            self.__client.get(client)['last-seen'] = datetime.datetime.utcnow()
 
     def _handleClientSignature(self, data):
         data = data.ClientSignature
@@ -997,11 +1158,10 @@ class ClientService(Plugin):
             return
 
         # Decide if we need to notify someone about new methods
-        current = copy(self.__client[data.Id.text]['caps'])
-        self.__client[data.Id.text]['caps'] = caps
-        for method in [m for m in current.keys() if not m in caps]:
+        removed, added = self.__client.set_caps(data.Id.text, caps)
+        for method in removed:
             self.notify_listeners(data.Id.text, method, False)
-        for method in [m for m in caps if not m in current.keys()]:
+        for method in added:
             self.notify_listeners(data.Id.text, method, True)
 
     def notify_listeners(self, cid, method, status):
@@ -1029,7 +1189,7 @@ class ClientService(Plugin):
         data = data.ClientAnnounce
         client = data.Id.text
         self.log.info("client '%s' is joining us" % client)
-        self.systemSetStatus(client, "+O-o")
+        self.__set_client_online(client)
 
         # Assemble network information
         network = {}
@@ -1051,30 +1211,19 @@ class ClientService(Plugin):
             'network': network
         }
 
-        self.__client[client] = info
+        self.__client.add(client, info)
 
     def _on_client_caps(self, cid, method, status):
         if status is False:
             return
 
         self.log.debug("client %s provides method %s" % (cid, method))
-        if cid in self.__client_call_queue and method in self.__client_call_queue[cid]:
-            for arg, larg in self.__client_call_queue[cid][method]:
-                self.clientDispatch(cid, method, *arg, **larg)
-            del self.__client_call_queue[cid][method]
-
-            if len(self.__client_call_queue[cid].keys()) == 0:
-                del self.__client_call_queue[cid]
-
-            # check if we still have listeners for that method
-            delete = True
-            for client_id, queue in self.__client_call_queue.items():
-                if method in queue:
-                    delete = False
-                    break
+        for arg, larg in self.__client_call_queue.pop(cid, method):
+            self.clientDispatch(cid, method, *arg, **larg)
 
-            if delete is True:
-                self.unregister_listener(method, self._on_client_caps)
+        # check if we still have listeners for that method
+        if not self.__client_call_queue.has_method(method):
+            self.unregister_listener(method, self._on_client_caps)
 
     def _handleClientLeave(self, data):
         data = data.ClientLeave
@@ -1082,47 +1231,89 @@ class ClientService(Plugin):
         self.log.info("client '%s' is leaving" % client)
         self.__set_client_offline(client, True)
 
+    def __set_presence(self, client, online):
+        """
+        Remember the online state of a client, only changes of the persisted state
+        are written by :meth:`flush_presence`.
+        """
+        with self.__presence_lock:
+            if self.__presence.get(client) == online:
+                self.__presence_pending.pop(client, None)
+            else:
+                self.__presence_pending[client] = online
+
+    def flush_presence(self):
+        """
+        Write the pending online/offline changes of the clients to their devices.
+        """
+        if GlobalLock.exists("scan_index"):
+            # do not update state during index, clients will be polled after index is done
+            return
+
+        with self.__presence_lock:
+            pending = self.__presence_pending
+            self.__presence_pending = {}
+        if not len(pending):
+            return
+
+        devices = {}
+        for device in ObjectSnapshot.query({'_type': 'Device', 'deviceUUID': {'in_': list(pending.keys())}},
+                                           attributes=["deviceUUID", "status_Online", "status_Offline"]):
+            devices[device.deviceUUID] = device
+
+        for client, online in pending.items():
+            if client not in devices:
+                self.log.debug("cannot set status of client '%s': device not found" % client)
+                continue
+
+            try:
+                self.systemSetStatus(devices[client], "+O-o" if online else "-O+o")
+            except Exception as e:
+                self.log.error("failed to set status of client '%s': %s" % (client, str(e)))
+
+                # retry with the next flush, unless the state has changed in the meantime
+                with self.__presence_lock:
+                    if client not in self.__presence_pending:
+                        self.__presence_pending[client] = online
+            else:
+                with self.__presence_lock:
+                    self.__presence[client] = online
+
+        self.log.debug("persisted the online state of %s clients" % len(pending))
+
     def __set_client_online(self, client):
-        self.systemSetStatus(client, "+O-o")
-        if client in self.__client:
-            self.__client[client]['online'] = True
+        self.__set_presence(client, True)
+        self.__client.set_online(client, True)
 
     def __set_client_offline(self, client, purge=False):
-        try:
-            self.systemSetStatus(client, "-O+o")
-        except ValueError as e:
-            id = C.get_error_id(str(e))
-            error = C.getError(None, None, id, keep=True)
-            if error['status_code'] == 404:
-                pass
-            else:
-                raise e
+        self.__set_presence(client, False)
 
         if client in self.__client:
             if purge:
-                del self.__client[client]
+                self.__client.remove(client)
+                self.__client_call_queue.remove(client)
 
                 if client in self.__proxy:
                     self.__proxy[client].close()
                     del self.__proxy[client]
 
-                if client in self.__user_session:
-                    del self.__user_session[client]
-
             else:
-                self.__client[client]['online'] = False
+                self.__client.set_online(client, False)
 
     def __gc(self):
         interval = int(self.env.config.get("goto.timeout", default="600"))
 
-        for client, info in self.__client.items():
-            if not info['online']:
+        for client in self.__client.get_online():
+            info = self.__client.get(client)
+            if info is None:
                 continue
 
             if info['last-seen'] < datetime.datetime.utcnow() - datetime.timedelta(seconds=2 * interval):
                 self.log.info("client '%s' looks dead - setting to 'offline'" % client)
                 self.__set_client_offline(client)
 
+        self.__client_call_queue.expire()
+
     def applyClientRights(self, device_uuid):
         # check rights
         acl = PluginRegistry.getInstance("ACLResolver")
@@ -0,0 +1,197 @@
+# This file is part of the GOsa framework.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+
+"""
+The session configuration cache stores the generated user configurations
+(menus, printers, resolution) of the GOto clients per client and user. Every
+entry knows the objects it has been generated from and is dropped as soon as
+one of them changes.
+
+    >>> cache = SessionConfigCache(ttl=600, volatile_attributes=["deviceStatus"])
+    >>> build = cache.begin()
+    >>> cache.put(client_id, "freich", config, ["cn=Frank Reich,ou=people,dc=example,dc=net"], build)
+    >>> cache.end(build)
+    >>> cache.get(client_id, "freich")
+"""
+import time
+from collections import deque
+from copy import deepcopy
+from threading import RLock
+
+
+class PendingBuild(object):
+    """
+    A configuration that is being generated. Collects the invalidations that
+    happen in the meantime.
+    """
+
+    def __init__(self):
+        self.invalidated = set()
+        self.cleared = False
+
+    def is_outdated(self, dependencies):
+        return self.cleared or not self.invalidated.isdisjoint(dependencies)
+
+
+class SessionConfigCache(object):
+    """
+    Caches user configurations keyed by (client, user).
+
+    :param ttl: lifetime of the entries in seconds (0 disables the cache)
+    :param samples: number of latency samples kept for :meth:`get_statistics`
+    :param volatile_attributes: attributes the configurations do not depend on (e.g. the status of the clients),
+                                updates that only change these attributes do not drop any entry
+    """
+    # object types that can add new objects to the configuration of any user
+    # (e.g. by adding a member to a group or creating a printer)
+    global_types = ["GroupOfNames", "GotoMenu", "GotoEnvironment", "ForemanHostGroup", "GotoPrinter"]
+
+    def __init__(self, ttl, samples=1000, volatile_attributes=None):
+        self.ttl = ttl
+        self.volatile_attributes = set(volatile_attributes) if volatile_attributes is not None else set()
+        self.hits = 0
+        self.misses = 0
+        self.__entries = {}
+        self.__dependents = {}
+        self.__builds = set()
+        self.__latencies = deque(maxlen=samples)
+        self.__lock = RLock()
+
+    def get(self, client_id, uid):
+        """ Return a copy of the cached configuration or None """
+        with self.__lock:
+            entry = self.__entries.get((client_id, uid))
+            if entry is None:
+                return None
+
+            expires, config, dependencies = entry
+            if expires <= time.time():
+                self.__remove((client_id, uid))
+                return None
+
+            return deepcopy(config)
+
+    def begin(self):
+        """
+        Start generating a configuration.
+
+        ``Return``: :class:`PendingBuild` that has to be passed to :meth:`put` and :meth:`end`
+        """
+        build = PendingBuild()
+        with self.__lock:
+            self.__builds.add(build)
+        return build
+
+    def end(self, build):
+        """ Stop collecting the invalidations for a build """
+        with self.__lock:
+            self.__builds.discard(build)
+
+    def put(self, client_id, uid, config, dependencies, build):
+        """
+        Store the configuration of a user.
+
+        :param dependencies: DNs and UUIDs of the objects the configuration has been generated from
+        :param build: the :class:`PendingBuild` returned by :meth:`begin` before generating the configuration,
+                      the configuration is not cached if one of its dependencies has been invalidated in the meantime
+        """
+        if self.ttl <= 0:
+            return
+
+        key = (client_id, uid)
+        dependencies = set(dependencies)
+        with self.__lock:
+            if build.is_outdated(dependencies):
+                return
+
+            self.__remove(key)
+            self.__entries[key] = (time.time() + self.ttl, deepcopy(config), dependencies)
+            for dependency in dependencies:
+                if dependency not in self.__dependents:
+                    self.__dependents[dependency] = set()
+                self.__dependents[dependency].add(key)
+
+    def __remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return
+
+        for dependency in entry[2]:
+            if dependency in self.__dependents:
+                self.__dependents[dependency].discard(key)
+                if not len(self.__dependents[dependency]):
+                    del self.__dependents[dependency]
+
+    def invalidate(self, *dependencies):
+        """ Drop all entries that depend on one of the given DNs or UUIDs """
+        with self.__lock:
+            for build in self.__builds:
+                build.invalidated.update(dependencies)
+            for dependency in dependencies:
+                for key in list(self.__dependents.get(dependency, [])):
+                    self.__remove(key)
+
+    def clear(self):
+        with self.__lock:
+            for build in self.__builds:
+                build.cleared = True
+            self.__entries.clear()
+            self.__dependents.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def handle_event(self, event):
+        """
+        Invalidate the entries affected by an ``ObjectChanged`` event.
+        """
+        if not event.reason.startswith("post"):
+            return
+
+        if event.reason == "post update":
+            # the changed properties are only known by the following "post object update" event
+            return
+
+        if event.reason == "post object update" and set(event.changed_props) <= self.volatile_attributes:
+            # nothing the configurations depend on has changed
+            return
+
+        if event.o_type in self.global_types and not (
+                event.reason.endswith(" remove") or
+                (event.reason.endswith(" update") and len(event.changed_props) and "member" not in event.changed_props)):
+            # new objects or group members can show up in any configuration
+            self.clear()
+        else:
+            self.invalidate(*[x for x in [event.dn, event.orig_dn, event.uuid] if x is not None])
+
+    def record(self, duration, hit):
+        """ Record the time (in seconds) it took to deliver a configuration """
+        with self.__lock:
+            self.__latencies.append(duration)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_statistics(self):
+        """
+        ``Return``: dict with the number of cache entries, hits and misses and
+        the 50th, 90th and 99th percentile of the recorded latencies in milliseconds
+        """
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+            res = {'entries': len(self.__entries), 'hits': self.hits, 'misses': self.misses, 'samples': len(latencies)}
+
+        for percentile in [50, 90, 99]:
+            value = None
+            if len(latencies):
+                # nearest rank
+                value = round(latencies[max(0, -(-percentile * len(latencies) // 100) - 1)] * 1000, 3)
+            res['p%s' % percentile] = value
+        return res
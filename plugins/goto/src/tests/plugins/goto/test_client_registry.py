@@ -0,0 +1,138 @@
+# This file is part of the GOsa project.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+import datetime
+from unittest import TestCase, mock
+
+from gosa.common import Environment
+from gosa.plugins.goto.client_registry import ClientRegistry, ClientCallQueue
+
+
+class ClientRegistryTestCase(TestCase):
+
+    def setUp(self):
+        self.registry = ClientRegistry()
+        self.registry.add("client1", {'name': 'host1', 'online': True, 'caps': {'notify': {}, 'dbus_shutdown': {}}})
+        self.registry.add("client2", {'name': 'host2', 'online': True, 'caps': {}})
+
+    def test_capabilities(self):
+        assert self.registry.get_uuid("host1") == "client1"
+        assert self.registry.get_uuid("unknown") is None
+        assert self.registry.get_capable_clients("notify") == {"client1"}
+        assert self.registry.has_capability("client1", "dbus_shutdown")
+        assert not self.registry.has_capability("client2", "notify")
+
+        removed, added = self.registry.set_caps("client2", {'notify': {}})
+        assert removed == []
+        assert added == ['notify']
+        assert self.registry.get_capable_clients("notify") == {"client1", "client2"}
+
+        removed, added = self.registry.set_caps("client1", {'notify': {}})
+        assert removed == ['dbus_shutdown']
+        assert added == []
+        assert self.registry.get_capable_clients("dbus_shutdown") == set()
+
+        # offline clients provide nothing
+        self.registry.set_online("client2", False)
+        assert self.registry.get_capable_clients("notify") == {"client1"}
+        assert self.registry.get_online() == {"client1"}
+        self.registry.set_online("client2", True)
+        assert self.registry.get_capable_clients("notify") == {"client1", "client2"}
+
+        self.registry.remove("client1")
+        assert "client1" not in self.registry
+        assert self.registry.get_uuid("host1") is None
+        assert self.registry.get_capable_clients("notify") == {"client2"}
+        assert self.registry.set_caps("client1", {}) == ([], [])
+
+    def test_users(self):
+        self.registry.set_users("client1", ["freich", "tester"])
+        self.registry.add_user("client2", "tester")
+        assert self.registry.get_users("client1") == ["freich", "tester"]
+        assert sorted(self.registry.get_user_clients("tester")) == ["client1", "client2"]
+        assert sorted(self.registry.get_session_clients()) == ["client1", "client2"]
+
+        self.registry.remove_user("client1", "tester")
+        assert self.registry.get_user_clients("tester") == ["client2"]
+        assert self.registry.get_user_clients("freich") == ["client1"]
+
+        self.registry.remove("client1")
+        assert self.registry.get_user_clients("freich") == []
+        assert not self.registry.has_session("client1")
+        assert self.registry.has_session("client2")
+
+
+class ClientCallQueueTestCase(TestCase):
+
+    def test_queue(self):
+        queue = ClientCallQueue()
+        queue.put("client1", "notify", ["title"], {'timeout': 10})
+        queue.put("client1", "notify", ["other"], {})
+        queue.put("client2", "notify", [], {})
+        assert queue.has_method("notify")
+        assert not queue.has_method("unknown")
+
+        # calls are loaded from the database
+        restarted = ClientCallQueue()
+        restarted.start()
+        assert len(restarted) == 3
+
+        assert restarted.pop("client1", "notify") == [(["title"], {'timeout': 10}), (["other"], {})]
+        assert restarted.pop("client1", "notify") == []
+        assert restarted.has_method("notify")
+        assert restarted.pop("client2", "notify") == [([], {})]
+        assert not restarted.has_method("notify")
+
+        restarted = ClientCallQueue()
+        restarted.start()
+        assert len(restarted) == 0
+
+    def test_remove_and_expire(self):
+        queue = ClientCallQueue(ttl=60)
+        queue.put("client1", "dbus_configureUserMenu", ["freich", "{}"], {})
+        queue.put("client1", "dbus_configureUserMenu", ["tester", "{}"], {})
+        queue.put("client1", "dbus_addPrinter", [{'cn': "printer"}], {})
+        queue.put("client2", "dbus_addPrinter", [{'cn': "printer"}], {})
+
+        # the user has logged out
+        queue.remove("client1", user="freich")
+        assert len(queue) == 3
+
+        # the client has been purged
+        queue.remove("client1")
+        assert len(queue) == 1
+        assert not queue.has_method("dbus_configureUserMenu")
+
+        # everything queued until now is expired
+        expired = datetime.datetime.now()
+        queue.put("client2", "dbus_addPrinter", [{'cn': "other"}], {})
+        with mock.patch.object(queue, "_ClientCallQueue__get_expiry", return_value=expired):
+            queue.expire()
+            assert len(queue) == 1
+            assert queue.pop("client2", "dbus_addPrinter") == [([{'cn': "other"}], {})]
+
+        restarted = ClientCallQueue()
+        restarted.start()
+        assert len(restarted) == 0
+
+    def test_proxy(self):
+        with mock.patch.object(Environment.getInstance(), "mode", "proxy"), \
+                mock.patch("gosa.plugins.goto.client_registry.make_session") as m_session:
+            queue = ClientCallQueue()
+            queue.start()
+            queue.put("client1", "notify", ["title"], {})
+            queue.put("client1", "notify", ["title"], {})
+            queue.put("client2", "notify", [], {})
+            assert len(queue) == 3
+
+            queue.remove("client2")
+            assert queue.pop("client1", "notify") == [(["title"], {}), (["title"], {})]
+            assert len(queue) == 0
+
+            # nothing is written to the replicated database
+            assert not m_session.called
@@ -6,6 +6,7 @@
 #  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
 #
 # See the LICENSE file in the project's top-level directory for details.
+import logging
 import pytest
 import uuid
 from tornado.concurrent import Future
@@ -152,6 +153,40 @@ class GotoClientServiceTestCase(AsyncTestCase):
         with pytest.raises(JSONRPCException):
             yield self.service.clientDispatch('fake_client_uuid', 'fakeCommand')
 
+    @mock.patch("gosa.plugins.goto.client_service.ClientService.systemSetStatus")
+    @mock.patch("gosa.plugins.goto.client_service.ClientService.systemGetStatus", return_value="")
+    def test_queuedClientDispatch(self, mocked_get_status, mocked_set_status):
+        with pytest.raises(JSONRPCException):
+            self.service.queuedClientDispatch('unknown_client', 'fakeCommand')
+
+        self.__announce_client()
+        with mock.patch("gosa.plugins.goto.client_service.ClientService.clientDispatch") as m:
+            self.service.queuedClientDispatch('fake_client_uuid', 'fakeCommand', 'arg', key='value')
+            assert not m.called
+            assert not self.service.hasCapability('fake_client_uuid', 'fakeCommand')
+
+            # the queued call survives a restart
+            self.service.unregister_listener('fakeCommand', self.service._on_client_caps)
+            self.service = ClientService()
+            self.service.mqtt = MQTTHandlerMock()
+            self.service.serve()
+            self.__announce_client()
+
+            self.__announce_client_caps()
+            m.assert_called_once_with('fake_client_uuid', 'fakeCommand', 'arg', key='value')
+            assert self.service.hasCapability('fake_client_uuid', 'fakeCommand')
+            assert self.service.hasCapability('Testclient', 'fakeCommand')
+
+            # the call is delivered only once
+            m.reset_mock()
+            self.__announce_client()
+            self.__announce_client_caps()
+            assert not m.called
+
+            # the client provides the method now
+            self.service.queuedClientDispatch('fake_client_uuid', 'fakeCommand')
+            m.assert_called_once_with('fake_client_uuid', 'fakeCommand')
+
 
     @mock.patch("gosa.plugins.goto.client_service.ClientService.configureUsers")
     @mock.patch("gosa.plugins.goto.client_service.ClientService.systemSetStatus")
@@ -227,6 +262,51 @@ class GotoClientServiceTestCase(AsyncTestCase):
         self.service.mqtt.simulate_message("net.example/client/fake_client_uuid", etree.tostring(info))
         assert len(self.service.getUserSessions("fake_client_uuid")) == 0
 
+    @mock.patch("gosa.plugins.goto.client_service.ClientService.systemSetStatus")
+    @mock.patch("gosa.plugins.goto.client_service.ClientService.systemGetStatus", return_value="")
+    def test_notifyUser_bulk(self, mocked_get_status, mocked_set_status):
+        self.__announce_client()
+        e = EventMaker()
+        caps = [e.ClientMethod(e.Name(name), e.Path("path"), e.Signature("signature"), e.Documentation("doc"))
+                for name in ["notify", "notify_users", "notify_all"]]
+        info = e.Event(e.ClientSignature(e.Id('fake_client_uuid'), e.Name('Testclient'), e.ClientCapabilities(*caps)))
+        self.service.mqtt.simulate_message("net.example/client/fake_client_uuid", etree.tostring(info))
+
+        registry = self.service._ClientService__client
+        registry.set_users('fake_client_uuid', ['tester', 'freich'])
+        stats = self.service.getNotificationStatistics()
+
+        with mock.patch.object(self.service, "clientDispatch") as m, \
+                mock.patch("gosa.plugins.goto.client_service.JsonRpcHandler.user_sessions_available", return_value=False):
+            # one message for all users of the client
+            res = self.service.notifyUser(['tester', 'freich', 'unknown'], 'Title', 'Message')
+            m.assert_called_once_with('fake_client_uuid', 'notify_users', ['tester', 'freich'], 'Title', 'Message', 10, 'dialog-information')
+            assert res == {'clients': 1, 'messages': 1, 'unreachable': ['unknown']}
+
+            m.reset_mock()
+            res = self.service.notifyUser('tester', 'Title', 'Message')
+            m.assert_called_once_with('fake_client_uuid', 'notify', 'tester', 'Title', 'Message', 10, 'dialog-information')
+            assert res['messages'] == 1
+
+            # all users are notified by a single broadcast
+            m.reset_mock()
+            self.service.mqtt.send_event.reset_mock()
+            res = self.service.notifyUser(None, 'Title', 'Message')
+            assert not m.called
+            assert self.service.mqtt.send_event.call_count == 1
+            args, kwargs = self.service.mqtt.send_event.call_args
+            assert args[1] == "net.example/client/broadcast"
+            assert res == {'clients': 1, 'messages': 1, 'unreachable': []}
+
+            m.side_effect = Exception("test")
+            res = self.service.notifyUser('tester', 'Title', 'Message')
+            assert res['messages'] == 0
+
+        new_stats = self.service.getNotificationStatistics()
+        assert new_stats['sent'] == stats['sent'] + 2
+        assert new_stats['broadcasts'] == stats['broadcasts'] + 1
+        assert new_stats['failed'] == stats['failed'] + 1
+
     @mock.patch("gosa.plugins.goto.client_service.ObjectProxy")
     def test_systemGetStatus(self, mocked_proxy):
         mocked_proxy.return_value.deviceStatus = "O"
@@ -248,9 +328,17 @@ class GotoClientServiceTestCase(AsyncTestCase):
             with pytest.raises(ValueError):
                 self.service.systemSetStatus('some_uuid', "+O")
 
-            mocked_index.return_value.search.return_value = [{'dn': 'some_dn'}]
+            mocked_index.return_value.search.return_value = [{'dn': 'some_dn', '_uuid': 'some_uuid', '_type': 'Device',
+                                                              '_extensions': ['RegisteredDevice'], 'status_Online': ['True']}]
             self.service.systemSetStatus('some_dn', "-O")
-            mocked_proxy.return_value.system_Online is False
+            mocked_proxy.assert_called_once_with('some_dn', from_db_only=True)
+            assert mocked_proxy.return_value.status_Online is False
+            assert mocked_proxy.return_value.commit.called
+
+            # the device already has this status, nothing is written
+            mocked_proxy.reset_mock()
+            self.service.systemSetStatus('some_dn', "+O")
+            assert not mocked_proxy.called
 
             with pytest.raises(ValueError):
                 self.service.systemSetStatus('some_dn', "+X")
@@ -447,3 +535,120 @@ class GotoClientServiceTestCase(AsyncTestCase):
             assert m_user.commit.called
 
 
+class GotoClientPresenceTestCase(AsyncTestCase):
+
+    def setUp(self):
+        super(GotoClientPresenceTestCase, self).setUp()
+        self.service = ClientService()
+        self.service.mqtt = MQTTHandlerMock()
+        self.service.serve()
+
+    def __ping(self, client):
+        e = EventMaker()
+        ping = e.Event(e.ClientPing(e.Id(client)))
+        self.service.mqtt.simulate_message("net.example/client/%s" % client, etree.tostring(ping))
+
+    def __leave(self, client):
+        e = EventMaker()
+        leave = e.Event(e.ClientLeave(e.Id(client)))
+        self.service.mqtt.simulate_message("net.example/client/%s" % client, etree.tostring(leave))
+
+    def __get_index(self, clients):
+        index = mock.MagicMock()
+        index.search.side_effect = lambda query, props: [{'dn': 'cn=%s,dc=example,dc=net' % x, '_uuid': x, '_type': 'Device',
+                                                          '_extensions': ['RegisteredDevice'], 'deviceUUID': [x]}
+                                                         for x in query['deviceUUID']['in_'] if x in clients]
+        return index
+
+    @mock.patch("gosa.plugins.goto.client_service.ObjectProxy")
+    @mock.patch("gosa.plugins.goto.client_service.ClientService.systemSetStatus")
+    def test_presence(self, mocked_set_status, mocked_proxy):
+        index = self.__get_index(["client1", "client2"])
+        with mock.patch.dict("gosa.plugins.goto.client_service.PluginRegistry.modules", {'ObjectIndex': index}):
+            # nothing to write
+            self.service.flush_presence()
+            assert not index.search.called
+
+            for i in range(10):
+                self.__ping("client1")
+                self.__ping("client2")
+                self.__ping("unknown_client")
+            self.service.flush_presence()
+            assert index.search.call_count == 1
+            assert mocked_set_status.call_count == 2
+            assert mocked_set_status.call_args[0][1] == "+O-o"
+
+            # state has not changed
+            mocked_set_status.reset_mock()
+            self.__ping("client1")
+            self.service.flush_presence()
+            assert not mocked_set_status.called
+
+            # changes that are reverted before the flush are not written
+            self.__leave("client1")
+            self.__ping("client1")
+            self.service.flush_presence()
+            assert not mocked_set_status.called
+
+            self.__leave("client2")
+            self.service.flush_presence()
+            assert mocked_set_status.call_count == 1
+            assert mocked_set_status.call_args[0][1] == "-O+o"
+
+            # failed writes are retried
+            mocked_set_status.reset_mock()
+            mocked_set_status.side_effect = Exception("backend not available")
+            self.__ping("client2")
+            self.service.flush_presence()
+            mocked_set_status.side_effect = None
+            self.service.flush_presence()
+            assert mocked_set_status.call_count == 2
+            assert mocked_set_status.call_args[0][1] == "+O-o"
+
+            # nothing is written while the index is running
+            mocked_set_status.reset_mock()
+            self.__leave("client2")
+            with mock.patch("gosa.plugins.goto.client_service.GlobalLock.exists", return_value=True):
+                self.service.flush_presence()
+            assert not mocked_set_status.called
+            self.service.flush_presence()
+            assert mocked_set_status.called
+
+
+@pytest.mark.skipif(not pytest.config.getoption("--runslow"), reason="need --runslow option to run")
+class GotoClientPresenceBenchmarkTestCase(AsyncTestCase):
+    clients = 3000
+    pings = 5
+
+    def setUp(self):
+        super(GotoClientPresenceBenchmarkTestCase, self).setUp()
+        self.service = ClientService()
+        self.service.mqtt = MQTTHandlerMock()
+        self.service.serve()
+
+    @mock.patch("gosa.plugins.goto.client_service.ObjectProxy")
+    @mock.patch("gosa.plugins.goto.client_service.ClientService.systemSetStatus")
+    def test_client_pings(self, mocked_set_status, mocked_proxy):
+        import time
+        e = EventMaker()
+        clients = [str(uuid.uuid4()) for _ in range(self.clients)]
+        messages = [(x, etree.tostring(e.Event(e.ClientPing(e.Id(x))))) for x in clients]
+
+        index = mock.MagicMock()
+        index.search.side_effect = lambda query, props: [{'dn': 'cn=%s,dc=example,dc=net' % x, '_uuid': x, '_type': 'Device',
+                                                          '_extensions': ['RegisteredDevice'], 'deviceUUID': [x]}
+                                                         for x in query['deviceUUID']['in_']]
+
+        with mock.patch.dict("gosa.plugins.goto.client_service.PluginRegistry.modules", {'ObjectIndex': index}):
+            start = time.time()
+            for i in range(self.pings):
+                for client, message in messages:
+                    self.service.mqtt.simulate_message("net.example/client/%s" % client, message)
+                self.service.flush_presence()
+            duration = time.time() - start
+
+        logging.getLogger(__name__).info("handled %s pings of %s clients in %.3fs (%.0f pings/s), %s status writes, %s index queries" %
+                                         (self.clients * self.pings, self.clients, duration, self.clients * self.pings / duration,
+                                          mocked_set_status.call_count, index.search.call_count))
+        assert mocked_set_status.call_count == self.clients
+        assert index.search.call_count == 1
@@ -0,0 +1,127 @@
+# This file is part of the GOsa project.
+#
+#  http://gosa-project.org
+#
+# Copyright:
+#  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
+#
+# See the LICENSE file in the project's top-level directory for details.
+from unittest import TestCase, mock
+
+from gosa.plugins.goto.session_config import SessionConfigCache
+
+
+class Event(object):
+
+    def __init__(self, reason, dn, o_type, changed_props=None, uuid=None):
+        self.reason = reason
+        self.dn = dn
+        self.orig_dn = dn
+        self.uuid = uuid
+        self.o_type = o_type
+        self.changed_props = changed_props or []
+
+
+class SessionConfigCacheTestCase(TestCase):
+    user_dn = "cn=Frank Reich,ou=people,dc=example,dc=net"
+    group_dn = "cn=Group,ou=groups,dc=example,dc=net"
+
+    def setUp(self):
+        self.cache = SessionConfigCache(600)
+
+    def __put(self, client_id, uid, dependencies):
+        build = self.cache.begin()
+        self.cache.put(client_id, uid, {'resolution': None}, dependencies, build)
+        self.cache.end(build)
+
+    def test_get(self):
+        assert self.cache.get("client", "freich") is None
+        self.__put("client", "freich", [self.user_dn])
+        config = self.cache.get("client", "freich")
+        assert config == {'resolution': None}
+
+        # the cached value cannot be changed by the callers
+        config['resolution'] = [1024, 768]
+        assert self.cache.get("client", "freich") == {'resolution': None}
+
+        with mock.patch("gosa.plugins.goto.session_config.time.time", return_value=0):
+            self.__put("client", "expired", [self.user_dn])
+        assert self.cache.get("client", "expired") is None
+
+        # disabled
+        cache = SessionConfigCache(0)
+        cache.put("client", "freich", {}, [], cache.begin())
+        assert cache.get("client", "freich") is None
+
+    def test_invalidate(self):
+        self.__put("client", "freich", [self.user_dn, self.group_dn])
+        self.__put("client", "other", ["cn=Other,ou=people,dc=example,dc=net", self.group_dn])
+        self.__put("client2", "other", ["cn=Other,ou=people,dc=example,dc=net"])
+
+        self.cache.invalidate(self.user_dn)
+        assert self.cache.get("client", "freich") is None
+        assert self.cache.get("client", "other") is not None
+
+        self.cache.handle_event(Event("post object update", self.group_dn, "GroupOfNames", ["description"]))
+        assert self.cache.get("client", "other") is None
+        assert self.cache.get("client2", "other") is not None
+
+        # events before the change do not invalidate anything
+        self.cache.handle_event(Event("pre object update", "cn=Other,ou=people,dc=example,dc=net", "User"))
+        assert self.cache.get("client2", "other") is not None
+
+        # configurations generated while one of their dependencies has been invalidated are not cached
+        build = self.cache.begin()
+        self.cache.invalidate(self.user_dn)
+        self.cache.put("client", "freich", {}, [self.user_dn], build)
+        assert self.cache.get("client", "freich") is None
+
+        # unrelated changes do not matter
+        self.cache.invalidate("cn=unknown,dc=example,dc=net")
+        self.cache.put("client", "other", {}, ["cn=Other,ou=people,dc=example,dc=net"], build)
+        assert self.cache.get("client", "other") is not None
+        self.cache.end(build)
+
+        build = self.cache.begin()
+        self.cache.clear()
+        self.cache.put("client", "freich", {}, [self.user_dn], build)
+        self.cache.end(build)
+        assert self.cache.get("client", "freich") is None
+
+        # new group members can show up in every configuration
+        self.cache.handle_event(Event("post object update", "cn=New,ou=groups,dc=example,dc=net", "GroupOfNames", ["member"]))
+        assert len(self.cache) == 0
+
+        self.__put("client", "freich", [self.user_dn])
+        self.cache.handle_event(Event("post object create", "cn=Printer,ou=printers,dc=example,dc=net", "GotoPrinter"))
+        assert len(self.cache) == 0
+
+    def test_volatile_attributes(self):
+        device_dn = "cn=client,ou=devices,dc=example,dc=net"
+        cache = SessionConfigCache(600, volatile_attributes=["deviceStatus", "status_Online"])
+        build = cache.begin()
+        cache.put("client", "freich", {}, [device_dn], build)
+        cache.end(build)
+
+        # status changes of the client do not affect its configuration
+        cache.handle_event(Event("post update", device_dn, "Device"))
+        cache.handle_event(Event("post object update", device_dn, "Device", ["deviceStatus", "status_Online"]))
+        assert cache.get("client", "freich") is not None
+
+        cache.handle_event(Event("post object update", device_dn, "Device", ["deviceStatus", "gotoXResolution"]))
+        assert cache.get("client", "freich") is None
+
+    def test_statistics(self):
+        stats = self.cache.get_statistics()
+        assert stats['samples'] == 0
+        assert stats['p50'] is None
+
+        for i in range(1, 101):
+            self.cache.record(i / 1000, i % 2 == 0)
+
+        stats = self.cache.get_statistics()
+        assert stats['hits'] == 50
+        assert stats['misses'] == 50
+        assert stats['p50'] == 50
+        assert stats['p90'] == 90
+        assert stats['p99'] == 99
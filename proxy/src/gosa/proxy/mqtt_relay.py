@@ -119,7 +119,8 @@ class MQTTRelayService(object):
 
     def _handle_proxy_message(self, topic, message):
         """ forwards proxy messages to backend MQTT """
-        if message[0:1] != "{":
+        is_event = message[0:1] != "{"
+        if is_event:
             # event received
             try:
                 xml = objectify.fromstring(message)
@@ -134,7 +135,8 @@ class MQTTRelayService(object):
                 self.log.error("Message parsing error: %s" % e)
 
         self.log.debug("forwarding message in topic '%s' to backend MQTT broker: %s" % (topic, message[0:80]))
-        self.backend_mqtt.send_message(message, topic, qos=1, proxied=True)
+        # client events may come in bursts (e.g. inventory updates), RPC messages must not be delayed
+        self.backend_mqtt.send_message(message, topic, qos=1, proxied=True, batched=is_event)
 
     def __handleClientPoll(self):
         """ register proxy-backend again """
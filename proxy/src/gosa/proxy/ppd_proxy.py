@@ -6,8 +6,13 @@
 #  (C) 2016 GONICUS GmbH, Germany, http://www.gonicus.de
 #
 # See the LICENSE file in the project's top-level directory for details.
+import hashlib
 import logging
+import os
+import time
 from os import path, makedirs
+from threading import RLock
+from uuid import uuid4
 
 import requests
 from urllib3.util import parse_url
@@ -15,6 +20,7 @@ from zope.interface import implementer
 
 from gosa.backend.components.httpd import get_server_url
 from gosa.backend.objects.index import RegisteredBackend
+from gosa.backend.plugins.cups.route import PPDHandler
 from gosa.backend.utils import BackendTypes
 from gosa.common import Environment
 from gosa.common.env import make_session
@@ -24,6 +30,14 @@ from gosa.common.error import GosaErrorHandler as C
 
 @implementer(IInterfaceHandler)
 class PPDProxy(object):
+    """
+    Caches the PPD files of the printers locally. The files are stored by the SHA-256 hash
+    of their content, so identical PPDs are stored once and the URLs handed out to the clients
+    change when the content changes. Files that are not used by any source URL anymore are removed.
+
+    A source URL is checked again for changes after ``cups.ppd-refresh`` seconds (default: 600)
+    with a conditional request, until then the local URL is returned without any request.
+    """
     _priority_ = 10
 
     def __init__(self):
@@ -33,6 +47,22 @@ class PPDProxy(object):
         if not path.exists(self.ppd_dir):
             makedirs(self.ppd_dir)
         self.base_url = "%s/ppd-proxy/" % get_server_url()
+        self.refresh = self.env.config.getint("cups.ppd-refresh", default=600)
+
+        # source URL -> {'url': local URL, 'etag': ETag of the source, 'checked': time of the last check}
+        self.__urls = {}
+        self.__lock = RLock()
+
+    def __get_master_url(self):
+        with make_session() as session:
+            # get any other registered backend
+            master_backend = session.query(RegisteredBackend) \
+                .filter(RegisteredBackend.uuid != self.env.core_uuid,
+                        RegisteredBackend.type == BackendTypes.active_master).first()
+            if master_backend is None:
+                return None
+
+            return parse_url(master_backend.url)
 
     def getPPDURL(self, source_url):
         """
@@ -41,41 +71,80 @@ class PPDProxy(object):
         :param source_url: remote PPD URL
         :return: local URL to the cached PPD
         """
+        with self.__lock:
+            cached = self.__urls.get(source_url)
+        if cached is not None and cached['checked'] + self.refresh > time.time():
+            return cached['url']
+
+        request_url = source_url
         source = parse_url(source_url)
-        host = source.host
-        if host is None or host == "localhost":
+        if source.host is None or source.host == "localhost":
             # no host: we assume that the PPD can be found on the current active master backend
-            with make_session() as session:
-                # get any other registered backend
-                master_backend = session.query(RegisteredBackend) \
-                    .filter(RegisteredBackend.uuid != self.env.core_uuid,
-                            RegisteredBackend.type == BackendTypes.active_master).first()
-                if master_backend is None:
-                    self.log.error(C.make_error("NO_MASTER_BACKEND_FOUND"))
-                    return source_url
-
-                # Try to log in with provided credentials
-                url = parse_url(master_backend.url)
-                host = url.host
-
-        # check if file exists locally
-        rel_path = source.path[1:] if source.path.startswith("/") else source.path
-        local_path = path.join(self.ppd_dir, host, rel_path)
+            master = self.__get_master_url()
+            if master is None:
+                self.log.error(C.make_error("NO_MASTER_BACKEND_FOUND"))
+                return cached['url'] if cached is not None else source_url
+            request_url = "%s://%s%s" % (master.scheme or "http", master.netloc, source.request_uri)
+
+        headers = {}
+        if cached is not None and cached['etag'] is not None:
+            headers['If-None-Match'] = cached['etag']
+
+        try:
+            r = requests.get(request_url, headers=headers, timeout=30)
+        except requests.exceptions.RequestException as e:
+            self.log.error("requesting PPD from %s failed with error: %s" % (request_url, str(e)))
+            return cached['url'] if cached is not None else source_url
+
+        if r.status_code == 304 and cached is not None:
+            # unchanged
+            content = None
+        elif r.ok:
+            content = r.content
+        else:
+            self.log.error("requesting PPD from %s failed with status code: %s" % (request_url, r.status_code))
+            return cached['url'] if cached is not None else source_url
+
+        with self.__lock:
+            # the current entry might have been replaced by a concurrent request
+            current = self.__urls.get(source_url)
+            url = current['url'] if content is None else self.__store(content)
+            etag = r.headers.get("ETag", cached['etag'] if cached is not None else None)
+            self.__urls[source_url] = {'url': url, 'etag': etag, 'checked': time.time()}
+            if current is not None and current['url'] != url:
+                self.__remove(current['url'])
+        return url
+
+    def __get_local_path(self, url):
+        return path.join(self.ppd_dir, *url[len(self.base_url):].split("/"))
+
+    def __store(self, content):
+        """ Store the PPD content under its hash value and return the local URL """
+        digest = hashlib.sha256(content).hexdigest()
+        url = "%s%s/%s.ppd" % (self.base_url, digest[0:2], digest)
+        local_path = self.__get_local_path(url)
+
         if not path.exists(local_path):
-            # cache locally
-            try:
-                r = requests.get(source_url)
-                if r.ok:
-                    local_dir = path.dirname(local_path)
-                    if not path.exists(local_dir):
-                        makedirs(local_dir)
-                    with open(local_path, "w") as f:
-                        f.write(r.text)
-                else:
-                    self.log.error("requesting PPD from %s failed with status code: %s" % (source_url, r.status_code))
-                    return source_url
-            except requests.exceptions.ConnectionError as e:
-                self.log.error("requesting PPD from %s failed with error: %s" % (source_url, str(e)))
-                return source_url
-
-        return "%s%s/%s" % (self.base_url, host, rel_path)
+            local_dir = path.dirname(local_path)
+            if not path.exists(local_dir):
+                makedirs(local_dir)
+
+            # write atomically, the file might be requested by a client at any time
+            temp_file = "%s.%s" % (local_path, uuid4().hex)
+            with open(temp_file, "wb") as f:
+                f.write(content)
+            os.replace(temp_file, local_path)
+            PPDHandler.compress(local_path)
+
+        return url
+
+    def __remove(self, url):
+        """ Delete the stored PPD file of the local URL, unless another source URL still uses it """
+        if any(x['url'] == url for x in self.__urls.values()):
+            return
+
+        local_path = self.__get_local_path(url)
+        for file in [local_path, "%s.gz" % local_path]:
+            if path.exists(file):
+                self.log.debug("deleting outdated PPD file: %s" % file)
+                os.unlink(file)
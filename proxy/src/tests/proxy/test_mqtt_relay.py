@@ -62,7 +62,7 @@ class MQTTRelayServiceTestCase(TestCase):
             payload = dumps({"id": "mqttrpc", "result": "test"})
             topic = "%s/client/client_id/request_id/response" % self.env.domain
             self.service._handle_proxy_message(topic, payload)
-            mbs.assert_called_with(payload, topic, qos=1, proxied=True)
+            mbs.assert_called_with(payload, topic, qos=1, proxied=True, batched=False)
 
     def test_handle_user_session(self):
         e = EventMaker()
@@ -81,5 +81,6 @@ class MQTTRelayServiceTestCase(TestCase):
             assert hasattr(xml, "UserSession")
             assert hasattr(xml.UserSession, "Proxied")
             assert xml.UserSession.Proxied.text == "true"
+            assert kwargs["batched"] is True
 
 
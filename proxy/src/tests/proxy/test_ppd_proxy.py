@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import os
 from gosa.proxy.ppd_proxy import PPDProxy
@@ -15,11 +16,17 @@ class PPDProxyTestCase(TestCase):
         super(PPDProxyTestCase, self).tearDown()
 
     def test_getPPDURL(self):
+        digest = hashlib.sha256(b"PPD content").hexdigest()
+        local_url = "http://localhost:8050/ppd-proxy/%s/%s.ppd" % (digest[0:2], digest)
+        local_file = os.path.join(self.proxy.ppd_dir, digest[0:2], "%s.ppd" % digest)
+
         with mock.patch("gosa.proxy.ppd_proxy.make_session") as m,\
                 mock.patch("gosa.proxy.ppd_proxy.requests.get") as m_get:
             m_session = m.return_value.__enter__.return_value
             m_get.return_value.ok = True
-            m_get.return_value.text = "PPD content"
+            m_get.return_value.status_code = 200
+            m_get.return_value.content = b"PPD content"
+            m_get.return_value.headers = {"ETag": '"1"'}
 
             # no master backend -> same url returned
             m_session.query.return_value.filter.return_value.first.return_value = None
@@ -30,26 +37,50 @@ class PPDProxyTestCase(TestCase):
 
             # no valid response
             m_get.return_value.ok = False
-            m_get.return_value.status_code.return_value = 404
+            m_get.return_value.status_code = 404
             assert self.proxy.getPPDURL("http://localhost:8050/ppd/modified/fake.ppd") == "http://localhost:8050/ppd/modified/fake.ppd"
 
             # fake master backend
             m_get.return_value.ok = True
-            m_get.return_value.status_code.return_value = 200
+            m_get.return_value.status_code = 200
 
             res = self.proxy.getPPDURL("http://localhost:8050/ppd/modified/fake.ppd")
-            assert res == "http://localhost:8050/ppd-proxy/master-server/ppd/modified/fake.ppd"
+            assert m_get.call_args[0][0] == "http://master-server:8050/ppd/modified/fake.ppd"
+            assert res == local_url
             # check if the file exists
-            local_file = os.path.join(self.proxy.ppd_dir, "master-server", "ppd", "modified", "fake.ppd")
             assert os.path.exists(local_file) is True
             with open(local_file) as f:
                 assert f.read() == "PPD content"
+            assert os.path.exists("%s.gz" % local_file) is True
+
+            # repeated requests are answered from the cache
+            m_get.reset_mock()
+            assert self.proxy.getPPDURL("http://localhost:8050/ppd/modified/fake.ppd") == local_url
+            assert not m_get.called
 
-            # remote URL
+            # remote URL with the same content is stored once
             res = self.proxy.getPPDURL("http://any-server/ppd/file.ppd")
-            assert res == "http://localhost:8050/ppd-proxy/any-server/ppd/file.ppd"
-            # check if the file exists
-            local_file = os.path.join(self.proxy.ppd_dir, "any-server", "ppd", "file.ppd")
+            assert res == local_url
+            assert sorted(os.listdir(os.path.dirname(local_file))) == ["%s.ppd" % digest, "%s.ppd.gz" % digest]
+
+            # changes are checked with a conditional request after the refresh interval
+            self.proxy.refresh = 0
+            m_get.reset_mock()
+            m_get.return_value.ok = False
+            m_get.return_value.status_code = 304
+            assert self.proxy.getPPDURL("http://any-server/ppd/file.ppd") == local_url
+            assert m_get.call_args[1]['headers'] == {'If-None-Match': '"1"'}
+
+            m_get.return_value.ok = True
+            m_get.return_value.status_code = 200
+            m_get.return_value.content = b"changed PPD content"
+            changed_digest = hashlib.sha256(b"changed PPD content").hexdigest()
+            changed_url = "http://localhost:8050/ppd-proxy/%s/%s.ppd" % (changed_digest[0:2], changed_digest)
+            assert self.proxy.getPPDURL("http://any-server/ppd/file.ppd") == changed_url
+
+            # the old file is still used by the other source URL
             assert os.path.exists(local_file) is True
-            with open(local_file) as f:
-                assert f.read() == "PPD content"
+
+            assert self.proxy.getPPDURL("http://localhost:8050/ppd/modified/fake.ppd") == changed_url
+            assert os.path.exists(local_file) is False
+            assert os.path.exists("%s.gz" % local_file) is False